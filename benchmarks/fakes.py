@@ -0,0 +1,442 @@
+"""Dobles de Discord y YouTube para ejecutar MusicCog sin red.
+
+- `FakeVoiceClient` usa el `AudioPlayer` real de discord.py (mismo hilo, mismo
+  ritmo de 20 ms por frame, mismo callback `after`) pero en vez de enviar por
+  UDP cuenta los paquetes y mide los huecos entre canciones.
+- `ReplayExtractor` sustituye a yt-dlp respondiendo desde un fixture JSON, con
+  la latencia grabada y URLs de stream servidas por un HTTP local.
+- `FakeInteraction`, `FakeGuild`, `FakeMember` y `FakeVoiceChannel` son lo
+  mínimo que leen los comandos del cog.
+"""
+import asyncio
+import itertools
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import discord
+import yt_dlp
+from discord.opus import Encoder, OPUS_SILENCE
+from discord.player import AudioPlayer
+
+from music.Extractor import Extractor, _END
+
+_SEARCH = re.compile(r'^ytsearch(\d*):(.*)$')
+_ids = itertools.count(1)
+
+
+class Recorder:
+    """Muestras compartidas por todos los dobles de una ejecución."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.commands: Dict[str, List[float]] = {}
+        self.command_errors: Dict[str, int] = {}
+        self.transitions: Dict[str, List[float]] = {"natural": [], "skip": []}
+        self.first_audio: List[float] = []
+        self.extractions: Dict[str, int] = {}
+        self.frames = 0
+        self.encoded_frames = 0
+        self.plays = 0
+        self.playing = 0
+        self.peak_playing = 0
+
+    def command(self, name: str, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            self.commands.setdefault(name, []).append(seconds)
+            if error:
+                self.command_errors[name] = self.command_errors.get(name, 0) + 1
+
+    def transition(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            self.transitions[kind].append(seconds)
+
+    def extraction(self, kind: str) -> None:
+        with self._lock:
+            self.extractions[kind] = self.extractions.get(kind, 0) + 1
+
+    def frame(self, encoded: bool) -> None:
+        with self._lock:
+            self.frames += 1
+            if encoded:
+                self.encoded_frames += 1
+
+    def player_started(self) -> None:
+        with self._lock:
+            self.plays += 1
+            self.playing += 1
+            self.peak_playing = max(self.peak_playing, self.playing)
+
+    def player_stopped(self) -> None:
+        with self._lock:
+            self.playing -= 1
+
+
+class _FakeWebSocket:
+    async def speak(self, state: Any) -> None:
+        pass
+
+
+class _PacedAudioPlayer(AudioPlayer):
+    """`AudioPlayer` de discord.py con el reloj acelerado `speed` veces."""
+    speed = 1.0
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.DELAY = AudioPlayer.DELAY / self.speed
+
+
+class FakeVoiceClient:
+    """Imita la parte de `discord.VoiceClient` que usan los reproductores."""
+    timeout = 1.0
+
+    def __init__(self, channel: "FakeVoiceChannel", recorder: Recorder, speed: float, encode: bool) -> None:
+        self.channel = channel
+        self.guild = channel.guild
+        self.recorder = recorder
+        # Igual que discord.py: un codificador Opus por conexión de voz
+        self.encoder = Encoder() if encode else None
+        self.ws = _FakeWebSocket()
+        self.client = channel.guild.bot
+        self._speed = speed
+        self._connected = True
+        self._player: Optional[AudioPlayer] = None
+        self._lock = threading.Lock()
+        # Estado del hueco entre canciones: cuándo salió el último frame y por qué paró
+        self._last_audio_at: Optional[float] = None
+        self._gap_kind: Optional[str] = None
+        self._play_called_at: Optional[float] = None
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def wait_until_connected(self, timeout: Optional[float] = None) -> bool:
+        return self._connected
+
+    def is_playing(self) -> bool:
+        return self._player is not None and self._player.is_playing()
+
+    def is_paused(self) -> bool:
+        return self._player is not None and self._player.is_paused()
+
+    @property
+    def source(self) -> Optional[discord.AudioSource]:
+        return self._player.source if self._player else None
+
+    @source.setter
+    def source(self, value: discord.AudioSource) -> None:
+        if self._player is None:
+            raise ValueError('Not playing anything.')
+        self._player.set_source(value)
+
+    def play(self, source: discord.AudioSource, *, after: Optional[Callable[[Optional[Exception]], Any]] = None, **_: Any) -> None:
+        if not self._connected:
+            raise discord.ClientException('Not connected to voice.')
+        if self.is_playing():
+            raise discord.ClientException('Already playing audio.')
+
+        def finished(error: Optional[Exception]) -> None:
+            with self._lock:
+                if self._gap_kind is None:
+                    self._gap_kind = "natural"
+            self.recorder.player_stopped()
+            if after is not None:
+                after(error)
+
+        with self._lock:
+            self._play_called_at = time.perf_counter()
+        self.recorder.player_started()
+        player_cls = type("PacedAudioPlayer", (_PacedAudioPlayer,), {"speed": self._speed})
+        self._player = player_cls(source, self, after=finished)  # type: ignore[arg-type]
+        self._player.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._gap_kind = "skip"
+        if self._player:
+            self._player.stop()
+            self._player = None
+
+    def pause(self) -> None:
+        if self._player:
+            self._player.pause()
+
+    def resume(self) -> None:
+        if self._player:
+            self._player.resume()
+
+    def send_audio_packet(self, data: bytes, *, encode: bool = True) -> None:
+        if data is OPUS_SILENCE or data == OPUS_SILENCE:
+            return
+        encoded = encode and self.encoder is not None
+        if encoded:
+            self.encoder.encode(data, Encoder.SAMPLES_PER_FRAME)
+        now = time.perf_counter()
+        with self._lock:
+            started, self._play_called_at = self._play_called_at, None
+            gap_kind, self._gap_kind = self._gap_kind, None
+            last, self._last_audio_at = self._last_audio_at, now
+        self.recorder.frame(encoded)
+        if started is not None:
+            self.recorder.first_audio.append(now - started)
+            if gap_kind and last is not None:
+                self.recorder.transition(gap_kind, now - last)
+
+    async def move_to(self, channel: "FakeVoiceChannel", **_: Any) -> None:
+        self.channel = channel
+
+    async def disconnect(self, *, force: bool = False) -> None:
+        self.stop()
+        self._connected = False
+
+    def cleanup(self) -> None:
+        self._connected = False
+
+
+class FakeVoiceChannel(discord.VoiceChannel):
+    """Pasa los `isinstance(..., discord.VoiceChannel)` del cog sin estado de Discord."""
+
+    def __new__(cls, *args: Any, **kwargs: Any) -> "FakeVoiceChannel":
+        return object.__new__(cls)
+
+    def __init__(self, guild: "FakeGuild", recorder: Recorder, speed: float, encode: bool) -> None:
+        self.id = next(_ids)
+        self.name = f"voice-{self.id}"
+        self.guild = guild  # type: ignore[assignment]
+        self._recorder = recorder
+        self._speed = speed
+        self._encode = encode
+
+    def __repr__(self) -> str:
+        return f"<FakeVoiceChannel id={self.id}>"
+
+    async def connect(self, **_: Any) -> FakeVoiceClient:  # type: ignore[override]
+        await asyncio.sleep(0)
+        client = FakeVoiceClient(self, self._recorder, self._speed, self._encode)
+        self.guild.voice_client = client
+        return client
+
+
+@dataclass
+class FakeVoiceState:
+    channel: Optional[FakeVoiceChannel]
+
+
+@dataclass
+class FakeMember:
+    id: int
+    guild: "FakeGuild"
+    voice: Optional[FakeVoiceState] = None
+    display_name: str = "bench"
+
+
+class FakeGuild:
+    def __init__(self, bot: Any, recorder: Recorder, speed: float, encode: bool) -> None:
+        self.id = next(_ids)
+        self.name = f"guild-{self.id}"
+        self.bot = bot
+        self.voice_client: Optional[FakeVoiceClient] = None
+        self.voice_channel = FakeVoiceChannel(self, recorder, speed, encode)
+        self.member = FakeMember(id=next(_ids), guild=self, voice=FakeVoiceState(self.voice_channel))
+        self.me = FakeMember(id=0, guild=self)
+
+    def get_member(self, user_id: int) -> Optional[FakeMember]:
+        return self.member if user_id == self.member.id else None
+
+
+class FakeMessage:
+    def __init__(self, content: Optional[str] = None, view: Optional[discord.ui.View] = None) -> None:
+        self.content = content
+        self.view = view
+
+    async def edit(self, *, content: Optional[str] = None, view: Optional[discord.ui.View] = None, **_: Any) -> "FakeMessage":
+        if content is not None:
+            self.content = content
+        if view is not None:
+            self.view = view
+        return self
+
+    async def delete(self, **_: Any) -> None:
+        pass
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction") -> None:
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, **_: Any) -> None:
+        self._done = True
+
+    async def send_message(self, content: Optional[str] = None, *, view: Optional[discord.ui.View] = None, **_: Any) -> None:
+        self._done = True
+        self._interaction.messages.append(FakeMessage(content, view))
+
+    async def edit_message(self, *, content: Optional[str] = None, view: Optional[discord.ui.View] = None, **_: Any) -> None:
+        self._done = True
+        self._interaction.messages.append(FakeMessage(content, view))
+
+    async def autocomplete(self, choices: Any) -> None:
+        self._done = True
+
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction") -> None:
+        self._interaction = interaction
+
+    async def send(self, content: Optional[str] = None, *, view: Optional[discord.ui.View] = None, wait: bool = False, **_: Any) -> FakeMessage:
+        message = FakeMessage(content, view)
+        self._interaction.messages.append(message)
+        return message
+
+
+class FakeInteraction:
+    def __init__(self, guild: FakeGuild) -> None:
+        self.id = next(_ids)
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = guild.member
+        self.client = guild.bot
+        self.extras: Dict[str, Any] = {}
+        self.created_at = datetime.now(timezone.utc)
+        self.expires_at = self.created_at + timedelta(minutes=15)
+        self.messages: List[FakeMessage] = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    @property
+    def views(self) -> List[discord.ui.View]:
+        return [message.view for message in self.messages if message.view is not None]
+
+    async def edit_original_response(self, **kwargs: Any) -> FakeMessage:
+        message = FakeMessage(kwargs.get("content"), kwargs.get("view"))
+        self.messages.append(message)
+        return message
+
+    async def original_response(self) -> FakeMessage:
+        return self.messages[0] if self.messages else FakeMessage()
+
+
+class ReplayExtractor(Extractor):
+    """`Extractor` real (pool, límites por servidor, timeouts y métricas) cuyo
+    trabajo en el hilo responde desde el fixture en lugar de llamar a yt-dlp.
+
+    El fixture tiene `videos` (título, duración, codec y latencia de
+    extracción), `searches` (consulta -> IDs, con la latencia de la búsqueda
+    completa y la del listado plano; son valores fijados a mano, no medidos)
+    y `playlists` (ID -> IDs). Las URLs de stream apuntan a
+    `<media_url>/<id>.webm`; las descargas copian `<media_dir>/<id>.mp3` a la
+    plantilla de salida.
+    """
+
+    def __init__(self, fixtures: Dict[str, Any], media_url: str, media_dir: str, recorder: Recorder, latency_scale: float = 1.0, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.videos: Dict[str, Dict[str, Any]] = fixtures["videos"]
+        self.searches: Dict[str, Dict[str, Any]] = fixtures.get("searches", {})
+        self.playlists: Dict[str, Dict[str, Any]] = fixtures.get("playlists", {})
+        self.media_url = media_url.rstrip("/")
+        self.media_dir = media_dir
+        self.recorder = recorder
+        self.latency_scale = latency_scale
+
+    @classmethod
+    def load(cls, path: str, *args: Any, **kwargs: Any) -> "ReplayExtractor":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), *args, **kwargs)
+
+    def _sleep(self, seconds: float) -> None:
+        time.sleep(seconds * self.latency_scale)
+
+    def _flat(self, video_id: str) -> Dict[str, Any]:
+        video = self.videos[video_id]
+        return {
+            "_type": "url", "ie_key": "Youtube", "id": video_id, "url": video_id,
+            "title": video["title"], "duration": video["duration"],
+        }
+
+    def _info(self, video_id: str, process: bool) -> Dict[str, Any]:
+        video = self.videos[video_id]
+        info = {
+            "id": video_id,
+            "title": video["title"],
+            "duration": video["duration"],
+            "extractor": "youtube",
+            "extractor_key": "Youtube",
+            "webpage_url": f"https://www.youtube.com/watch?v={video_id}",
+        }
+        if process:
+            info.update({"url": f"{self.media_url}/{video_id}.webm", "acodec": video.get("acodec", "opus"), "ext": "webm"})
+        return info
+
+    @staticmethod
+    def _video_id(url: str) -> Optional[str]:
+        match = re.search(r'(?:v=|youtu\.be/|shorts/)([\w-]{11})', url)
+        return match.group(1) if match else None
+
+    def _run(self, url: str, opts: Dict[str, Any], download: bool, process: bool, cancelled: threading.Event) -> Optional[Dict[str, Any]]:  # type: ignore[override]
+        if cancelled.is_set():
+            return None
+
+        search = _SEARCH.match(url)
+        if search:
+            self.recorder.extraction("search")
+            result = self.searches.get(search.group(2).strip().lower())
+            if result is None:
+                self._sleep(1.0)
+                return {"_type": "playlist", "entries": []}
+            count = int(search.group(1) or 1)
+            flat = opts.get("extract_flat")
+            # Un listado plano es una sola página de resultados, sin resolver formatos
+            self._sleep(result.get("flat_latency", result.get("latency", 1.0)) if flat else result.get("latency", 1.0))
+            entries = [self._flat(i) if flat else self._info(i, process) for i in result["results"][:count]]
+            return {"_type": "playlist", "entries": entries}
+
+        video_id = self._video_id(url)
+        if video_id not in self.videos:
+            self.recorder.extraction("unavailable")
+            self._sleep(0.3)
+            raise yt_dlp.utils.DownloadError(f"ERROR: [youtube] {video_id}: Video unavailable")
+
+        video = self.videos[video_id]
+        self._sleep(video.get("latency", 0.5))
+        info = self._info(video_id, process)
+        if not download:
+            self.recorder.extraction("extract" if process else "probe")
+            return info
+
+        self.recorder.extraction("download")
+        target = opts["outtmpl"] % {"ext": "mp3"} if "%(ext)s" in opts["outtmpl"] else opts["outtmpl"]
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        shutil.copyfile(f"{self.media_dir}/{video_id}.mp3", target)
+        for hook in opts.get("progress_hooks", []):
+            hook({"status": "finished", "filename": target})
+        return info
+
+    def _iterate(self, url: str, opts: Dict[str, Any], limit: Optional[int], cancelled: threading.Event, emit: Callable[[Any], None]) -> None:  # type: ignore[override]
+        try:
+            self.recorder.extraction("playlist")
+            match = re.search(r'list=([\w-]+)', url)
+            playlist = self.playlists.get(match.group(1)) if match else None
+            if playlist is None:
+                emit(self._run(url, opts, False, False, cancelled))
+                return
+            page_size = playlist.get("page_size", 100)
+            for count, video_id in enumerate(playlist["entries"]):
+                if cancelled.is_set() or (limit is not None and count >= limit):
+                    break
+                if count % page_size == 0:
+                    self._sleep(playlist.get("page_latency", 0.5))
+                emit(self._flat(video_id))
+        except Exception as e:
+            emit(e)
+        finally:
+            emit(_END)
@@ -0,0 +1,138 @@
+"""Memoria por servidor de la caché de discord.py según intents y caché de miembros.
+
+Alimenta el ConnectionState de discord.py con GUILD_CREATE sintéticos (y los
+chunks de miembros cuando el perfil los pide) tal como los enviaría el gateway
+con cada combinación de intents, y mide con tracemalloc lo que queda retenido:
+
+- legacy: default + messages + message_content + presences + members, caché de
+  miembros por defecto y chunking al arrancar (la configuración anterior).
+- lean: la de `main.build_intents` / `main.cache_options`.
+
+    python benchmarks/gateway_memory.py [--guilds 50] [--members 1000]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "bot"))
+
+import discord
+from discord.member import Member
+
+from main import build_intents, cache_options
+
+JOINED_AT = datetime(2022, 5, 1, tzinfo=timezone.utc).isoformat()
+BOT_ID = 1
+
+
+def legacy_profile() -> Dict[str, Any]:
+    intents = discord.Intents.default()
+    intents.messages = True
+    intents.message_content = True
+    intents.presences = True
+    intents.members = True
+    return {"intents": intents}
+
+
+def lean_profile() -> Dict[str, Any]:
+    return {"intents": build_intents(), **cache_options()}
+
+
+def member(user_id: int, roles: List[str]) -> Dict[str, Any]:
+    return {
+        "user": {"id": str(user_id), "username": f"user{user_id}", "global_name": f"User {user_id}",
+                 "avatar": "a" * 32, "discriminator": "0"},
+        "roles": roles, "joined_at": JOINED_AT, "deaf": False, "mute": False, "flags": 0,
+    }
+
+
+def presence(user_id: int) -> Dict[str, Any]:
+    return {
+        "user": {"id": str(user_id)}, "status": "online", "client_status": {"desktop": "online"},
+        "activities": [{"name": "Spotify", "type": 2, "id": "spotify:1", "created_at": 0,
+                        "details": "Some song", "state": "Some artist", "assets": {"large_image": "spotify:abc"}}],
+    }
+
+
+def guild_payloads(guild_id: int, members: int, rng: random.Random, intents: discord.Intents) -> Dict[str, Any]:
+    """GUILD_CREATE como lo manda el gateway y, si hace falta, el chunk con todos los miembros."""
+    roles = [{"id": str(guild_id * 100 + i), "name": f"role{i}", "permissions": "0", "position": i,
+              "color": 0, "hoist": False, "managed": False, "mentionable": False} for i in range(10)]
+    role_ids = [role["id"] for role in roles]
+    channels = [{"id": str(guild_id * 1000 + i), "type": 2 if i < 5 else 0, "name": f"channel{i}", "position": i,
+                 "permission_overwrites": [], "bitrate": 64000, "user_limit": 0} for i in range(25)]
+    user_ids = [guild_id * 100000 + i for i in range(members)]
+    all_members = {uid: member(uid, rng.sample(role_ids, 2)) for uid in user_ids}
+    online = [uid for uid in user_ids if rng.random() < 0.2]
+    in_voice = rng.sample(user_ids, 5)
+
+    voice_states = [{
+        "user_id": str(uid), "channel_id": channels[0]["id"], "session_id": "s", "deaf": False, "mute": False,
+        "self_deaf": False, "self_mute": False, "self_video": False, "suppress": False, "member": all_members[uid],
+    } for uid in in_voice] if intents.voice_states else []
+
+    # Servidores grandes: sin el intent de presencias solo llegan el bot y los miembros en voz
+    included = [BOT_ID] + (online if intents.presences else []) + in_voice
+    create = {
+        "id": str(guild_id), "name": f"guild{guild_id}", "member_count": members, "large": members > 250,
+        "owner_id": str(user_ids[0]), "features": [], "emojis": [], "stickers": [], "roles": roles,
+        "channels": channels, "threads": [], "stage_instances": [], "guild_scheduled_events": [],
+        "members": [member(uid, []) if uid == BOT_ID else all_members[uid] for uid in dict.fromkeys(included)],
+        "presences": [presence(uid) for uid in online] if intents.presences else [],
+        "voice_states": voice_states,
+    }
+    chunk = {"guild_id": str(guild_id), "members": list(all_members.values()),
+             "presences": [presence(uid) for uid in online] if intents.presences else []}
+    return {"create": create, "chunk": chunk}
+
+
+def measure(name: str, options: Dict[str, Any], guilds: int, members: int) -> float:
+    client = discord.Client(**options)
+    state = client._connection
+    state.user = discord.ClientUser(state=state, data={"id": str(BOT_ID), "username": "botbot", "discriminator": "0", "avatar": None})
+    chunk = client._connection._chunk_guilds and options["intents"].members
+    rng = random.Random(0)
+    payloads = [guild_payloads(10 + i, members, rng, options["intents"]) for i in range(guilds)]
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for payload in payloads:
+        guild = state._add_guild_from_data(payload["create"])  # type: ignore[arg-type]
+        if chunk and state.member_cache_flags.joined:
+            for data in payload["chunk"]["members"]:
+                guild._add_member(Member(guild=guild, data=data, state=state))
+            for data in payload["chunk"]["presences"]:
+                cached = guild.get_member(int(data["user"]["id"]))
+                if cached:
+                    cached._presence_update(data, data["user"])  # type: ignore[arg-type]
+    payloads.clear()
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    cached_members = sum(len(guild.members) for guild in state.guilds)
+    per_guild = retained / guilds
+    print(f"{name:<7} {per_guild / 1024:8.1f} KB por servidor  ({cached_members / guilds:.0f} miembros en caché, chunking {'sí' if chunk else 'no'})")
+    return per_guild
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--members", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{args.guilds} servidores de {args.members} miembros (20% conectados, 5 en voz)")
+    legacy = measure("legacy", legacy_profile(), args.guilds, args.members)
+    lean = measure("lean", lean_profile(), args.guilds, args.members)
+    print(f"Ahorro: {(legacy - lean) / 1024:.1f} KB por servidor ({(1 - lean / legacy) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
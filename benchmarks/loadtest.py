@@ -0,0 +1,403 @@
+"""Prueba de carga offline de MusicCog: cientos de servidores simulados sin Discord ni YouTube.
+
+Cada servidor simulado lanza comandos del cog (search, stream, playlist, skip,
+queue, volume, pause, fav) con pausas aleatorias entre ellos. Las respuestas de
+yt-dlp se reproducen desde `fixtures/extractor.json` con su latencia, el audio
+se genera en local con FFmpeg y se sirve por HTTP, y la voz la "envía" un
+`FakeVoiceClient` que usa el AudioPlayer real de discord.py (ver fakes.py).
+
+Informa de throughput y latencia por comando, hueco entre canciones (final
+natural y skip), tiempo hasta el primer frame, CPU por stream y memoria.
+`--json` guarda los resultados y `--baseline` los compara con una ejecución
+anterior y sale con código 1 si algo empeora más de `--tolerance`.
+
+    python benchmarks/loadtest.py --guilds 200 --duration 120
+    python benchmarks/loadtest.py --workload skip --json new.json --baseline main.json
+
+Con `--speed N` el audio avanza N veces más rápido y las duraciones del fixture
+se dividen entre N, para que la precarga del reproductor siga cuadrando.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "bot"))
+
+import discord
+from aiohttp import web
+
+from cogs.MusicCog import MusicCog
+from fakes import FakeGuild, FakeInteraction, Recorder, ReplayExtractor
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "extractor.json")
+
+WORKLOADS: Dict[str, Dict[str, float]] = {
+    "search": {"search": 1},
+    "stream": {"stream": 1},
+    "skip": {"stream": 2, "skip": 1},
+    "queue": {"stream": 1, "queue": 2},
+    "playlist": {"playlist": 1, "skip": 2, "queue": 1},
+    "mixed": {"search": 3, "stream": 4, "playlist": 0.3, "skip": 2, "queue": 2, "volume": 1, "pause": 0.5, "fav": 0.2},
+}
+
+# Métricas que se comparan con --baseline: más alto es peor en todas
+GATED = ("command_p95", "transition_natural_p95", "transition_skip_p95", "first_audio_p95", "cpu_per_stream", "rss_per_guild_mb")
+
+
+def generate_media(fixtures: Dict[str, Any], media_dir: str) -> None:
+    """Un webm/Opus (streams) y un mp3 (descargas) por vídeo del fixture, con su duración."""
+    os.makedirs(media_dir, exist_ok=True)
+
+    def encode(item: Tuple[int, Tuple[str, Dict[str, Any]]]) -> None:
+        index, (video_id, video) = item
+        tone = f"sine=frequency={220 + index * 40}:duration={video['duration']}:sample_rate=48000"
+        for ext, codec in (("webm", ["-c:a", "libopus", "-b:a", "128k"]), ("mp3", ["-c:a", "libmp3lame", "-b:a", "192k"])):
+            path = os.path.join(media_dir, f"{video_id}.{ext}")
+            if not os.path.exists(path):
+                subprocess.run(["ffmpeg", "-loglevel", "error", "-y", "-f", "lavfi", "-i", tone, "-ac", "2", *codec, path], check=True)
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+        list(pool.map(encode, enumerate(fixtures["videos"].items())))
+
+
+async def serve_media(media_dir: str) -> Tuple[web.AppRunner, str]:
+    app = web.Application()
+    app.router.add_static("/media", media_dir)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+    return runner, f"http://127.0.0.1:{port}/media"
+
+
+def cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (FileNotFoundError, ProcessLookupError):
+        return 0
+
+
+def children() -> List[int]:
+    me = str(os.getpid())
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # El nombre del proceso va entre paréntesis y puede tener espacios
+                ppid = f.read().rsplit(")", 1)[1].split()[1]
+        except (FileNotFoundError, ProcessLookupError, IndexError):
+            continue
+        if ppid == me:
+            pids.append(int(entry))
+    return pids
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class MemoryMonitor:
+    """Muestrea la RSS del bot y de sus FFmpeg hijos cada `interval` segundos."""
+
+    def __init__(self, interval: float = 1.0) -> None:
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_children_rss = 0
+        self.peak_children = 0
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def sample(self) -> None:
+        pids = children()
+        self.peak_rss = max(self.peak_rss, rss_bytes(os.getpid()))
+        self.peak_children = max(self.peak_children, len(pids))
+        self.peak_children_rss = max(self.peak_children_rss, sum(rss_bytes(pid) for pid in pids))
+
+
+class LoadTest:
+    def __init__(self, cog: MusicCog, fixtures: Dict[str, Any], recorder: Recorder, rng: random.Random) -> None:
+        self.cog = cog
+        self.recorder = recorder
+        self.rng = rng
+        self.video_ids = list(fixtures["videos"])
+        self.titles = {video_id: video["title"] for video_id, video in fixtures["videos"].items()}
+        self.queries = list(fixtures.get("searches", {}))
+        self.playlists = list(fixtures.get("playlists", {}))
+        self.rejected: Dict[str, int] = {}
+        self.ops: Dict[str, Callable[[FakeGuild], Awaitable[None]]] = {
+            "search": self.search, "stream": self.stream, "playlist": self.playlist, "skip": self.skip,
+            "queue": self.queue, "volume": self.volume, "pause": self.pause, "fav": self.fav,
+        }
+
+    async def command(self, name: str, guild: FakeGuild, call: Callable[[FakeInteraction], Awaitable[None]]) -> FakeInteraction:
+        interaction = FakeInteraction(guild)
+        start = time.perf_counter()
+        error = False
+        try:
+            await call(interaction)
+        except Exception:
+            logging.getLogger('loadtest').exception(f"Command {name} failed")
+            error = True
+        self.recorder.command(name, time.perf_counter() - start, error)
+        # Respuestas "❌" esperables (sin reproductor, cola vacía...): no son fallos del bot
+        if any((message.content or "").startswith("❌") for message in interaction.messages):
+            self.rejected[name] = self.rejected.get(name, 0) + 1
+        return interaction
+
+    def video_url(self) -> str:
+        return f"https://www.youtube.com/watch?v={self.rng.choice(self.video_ids)}"
+
+    async def search(self, guild: FakeGuild) -> None:
+        query = self.rng.choice(self.queries)
+        interaction = await self.command("search", guild, lambda i: self.cog.music_search.callback(self.cog, i, query))
+        for view in interaction.views:
+            select = next((item for item in view.children if isinstance(item, discord.ui.Select)), None)
+            if select and select.options:
+                select._values = [self.rng.choice(select.options).value]
+                await self.command("search.select", guild, select.callback)
+                return
+
+    async def stream(self, guild: FakeGuild) -> None:
+        url = self.video_url()
+        await self.command("stream", guild, lambda i: self.cog.music_stream.callback(self.cog, i, url))
+
+    async def playlist(self, guild: FakeGuild) -> None:
+        url = f"https://www.youtube.com/playlist?list={self.rng.choice(self.playlists)}"
+        await self.command("playlist", guild, lambda i: self.cog.music_playlist.callback(self.cog, i, url))
+
+    async def skip(self, guild: FakeGuild) -> None:
+        await self.command("skip", guild, lambda i: self.cog.music_skip.callback(self.cog, i))
+
+    async def queue(self, guild: FakeGuild) -> None:
+        await self.command("queue.list", guild, lambda i: self.cog.queue_list.callback(self.cog, i))
+        if self.rng.random() < 0.3:
+            await self.command("queue.remove", guild, lambda i: self.cog.queue_rm.callback(self.cog, i, 1))
+
+    async def volume(self, guild: FakeGuild) -> None:
+        volume = self.rng.choice((30, 60, 100))
+        await self.command("volume", guild, lambda i: self.cog.music_volume.callback(self.cog, i, volume))
+
+    async def pause(self, guild: FakeGuild) -> None:
+        await self.command("pause", guild, lambda i: self.cog.music_pause.callback(self.cog, i))
+        await asyncio.sleep(self.rng.uniform(0.5, 3.0))
+        await self.command("resume", guild, lambda i: self.cog.music_resume.callback(self.cog, i))
+
+    async def fav(self, guild: FakeGuild) -> None:
+        video_id = self.rng.choice(self.video_ids)
+        title = self.titles[video_id]
+        url = f"https://www.youtube.com/watch?v={video_id}"
+        await self.command("fav.add", guild, lambda i: self.cog.fav_add.callback(self.cog, i, title, url))
+        await self.command("fav.play", guild, lambda i: self.cog.fav_play.callback(self.cog, i, title))
+
+    async def run_guild(self, guild: FakeGuild, weights: Dict[str, float], deadline: float, think: float) -> None:
+        loop = asyncio.get_running_loop()
+        names, values = list(weights), list(weights.values())
+        # Arranque escalonado para no disparar todos los servidores a la vez
+        await asyncio.sleep(self.rng.uniform(0, think))
+        while loop.time() < deadline:
+            await self.ops[self.rng.choices(names, values)[0]](guild)
+            await asyncio.sleep(self.rng.expovariate(1 / think))
+
+
+def summarize(recorder: Recorder, test: LoadTest, guilds: int, elapsed: float, cpu: float, memory: MemoryMonitor, baseline_rss: int) -> Dict[str, Any]:
+    latencies = [value for values in recorder.commands.values() for value in values]
+    audio_seconds = recorder.frames * discord.opus.Encoder.FRAME_LENGTH / 1000
+    return {
+        "guilds": guilds,
+        "elapsed": elapsed,
+        "commands": len(latencies),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "command_p50": percentile(latencies, 50),
+        "command_p95": percentile(latencies, 95),
+        "per_command": {
+            name: {
+                "count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+                "p99": percentile(values, 99), "errors": recorder.command_errors.get(name, 0),
+                "rejected": test.rejected.get(name, 0),
+            }
+            for name, values in sorted(recorder.commands.items())
+        },
+        "plays": recorder.plays,
+        "peak_streams": recorder.peak_playing,
+        "transitions_natural": len(recorder.transitions["natural"]),
+        "transition_natural_p50": percentile(recorder.transitions["natural"], 50),
+        "transition_natural_p95": percentile(recorder.transitions["natural"], 95),
+        "transitions_skip": len(recorder.transitions["skip"]),
+        "transition_skip_p50": percentile(recorder.transitions["skip"], 50),
+        "transition_skip_p95": percentile(recorder.transitions["skip"], 95),
+        "first_audio_p50": percentile(recorder.first_audio, 50),
+        "first_audio_p95": percentile(recorder.first_audio, 95),
+        "audio_seconds": audio_seconds,
+        "encoded_frames": recorder.encoded_frames,
+        "cpu_seconds": cpu,
+        # Fracción de un núcleo por segundo de audio servido (bot + FFmpeg hijos)
+        "cpu_per_stream": cpu / audio_seconds if audio_seconds else 0.0,
+        "extractions": dict(recorder.extractions),
+        "peak_rss_mb": memory.peak_rss / 2**20,
+        "rss_per_guild_mb": (memory.peak_rss - baseline_rss) / 2**20 / guilds,
+        "peak_ffmpeg": memory.peak_children,
+        "peak_ffmpeg_rss_mb": memory.peak_children_rss / 2**20,
+    }
+
+
+def report(results: Dict[str, Any]) -> None:
+    ms = lambda seconds: f"{seconds * 1000:8.1f} ms"
+    print(f"\n{results['guilds']} servidores, {results['elapsed']:.0f}s: {results['commands']} comandos ({results['throughput']:.1f}/s)")
+    print(f"{'comando':<16} {'n':>6} {'p50':>11} {'p95':>11} {'p99':>11} {'errores':>8} {'❌':>6}")
+    for name, stats in results["per_command"].items():
+        print(f"{name:<16} {stats['count']:>6} {ms(stats['p50'])} {ms(stats['p95'])} {ms(stats['p99'])} {stats['errors']:>8} {stats['rejected']:>6}")
+    print(f"\nReproducciones: {results['plays']} (máx. {results['peak_streams']} simultáneas), {results['audio_seconds']:.0f}s de audio")
+    print(f"Hueco entre canciones (fin natural, n={results['transitions_natural']}): p50 {ms(results['transition_natural_p50'])}  p95 {ms(results['transition_natural_p95'])}")
+    print(f"Hueco entre canciones (skip, n={results['transitions_skip']}):       p50 {ms(results['transition_skip_p50'])}  p95 {ms(results['transition_skip_p95'])}")
+    print(f"play() hasta el primer frame:                p50 {ms(results['first_audio_p50'])}  p95 {ms(results['first_audio_p95'])}")
+    print(f"CPU: {results['cpu_seconds']:.1f}s, {results['cpu_per_stream'] * 100:.2f}% de un núcleo por stream ({results['encoded_frames']} frames codificados en Python)")
+    print(f"Memoria: pico {results['peak_rss_mb']:.0f} MB ({results['rss_per_guild_mb'] * 1024:.0f} KB por servidor), "
+          f"FFmpeg: {results['peak_ffmpeg']} procesos, {results['peak_ffmpeg_rss_mb']:.0f} MB")
+    print(f"Extracciones: {results['extractions']}")
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    for key in GATED:
+        old, new = baseline.get(key), results.get(key)
+        if old and new is not None and new > old * (1 + tolerance):
+            regressions.append(f"{key}: {old:.4g} -> {new:.4g} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    with open(args.fixtures, encoding="utf-8") as f:
+        fixtures = json.load(f)
+
+    media_dir = args.media_dir or os.path.join(args.workdir, "media")
+    await asyncio.to_thread(generate_media, fixtures, media_dir)
+    # El reproductor precarga según la duración: se escala con la velocidad del audio
+    for video in fixtures["videos"].values():
+        video["duration"] = max(1, round(video["duration"] / args.speed))
+
+    runner, media_url = await serve_media(media_dir)
+
+    encode = discord.opus.is_loaded() or discord.opus._load_default()
+    if not encode:
+        print("⚠️ libopus no disponible: el PCM no se codifica y el CPU por stream sale por debajo del real")
+
+    recorder = Recorder()
+    # Sin gateway: no hay servidores que restaurar al arrancar
+    bot = SimpleNamespace(loop=asyncio.get_running_loop(), voice_clients=[], user=None,
+                          wait_until_ready=asyncio.sleep, get_guild=lambda guild_id: None)
+    cog = MusicCog(bot)  # type: ignore[arg-type]
+    cog.extractor.shutdown()
+    cog.extractor = cog.downloads.extractor = ReplayExtractor(fixtures, media_url, media_dir, recorder, latency_scale=args.latency_scale)
+    if args.cold_cache:
+        # El fixture tiene pocas consultas: con caché casi ninguna búsqueda llega al extractor
+        cog.search_cache.ttl = cog.stream_cache.ttl = 0
+    await cog.cog_load()
+
+    rng = random.Random(args.seed)
+    test = LoadTest(cog, fixtures, recorder, rng)
+    guilds = [FakeGuild(bot, recorder, args.speed, encode) for _ in range(args.guilds)]
+
+    memory = MemoryMonitor()
+    memory.sample()
+    baseline_rss = memory.peak_rss
+    memory.start()
+    cpu_start, start = cpu_seconds(), time.perf_counter()
+    deadline = asyncio.get_running_loop().time() + args.duration
+    await asyncio.gather(*(test.run_guild(guild, WORKLOADS[args.workload], deadline, args.think) for guild in guilds))
+    elapsed = time.perf_counter() - start
+
+    # Al descargar el cog se paran los reproductores y se recogen los FFmpeg,
+    # así su CPU entra en RUSAGE_CHILDREN
+    await cog.cog_unload()
+    await asyncio.sleep(0.5)
+    cpu = cpu_seconds() - cpu_start
+    await memory.stop()
+    await runner.cleanup()
+    return summarize(recorder, test, args.guilds, elapsed, cpu, memory, baseline_rss)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--guilds", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=120, help="segundos de carga")
+    parser.add_argument("--workload", choices=sorted(WORKLOADS), default="mixed")
+    parser.add_argument("--think", type=float, default=8.0, help="segundos medios entre comandos de un servidor")
+    parser.add_argument("--speed", type=float, default=1.0, help="aceleración del audio")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplica la latencia grabada de yt-dlp")
+    parser.add_argument("--fixtures", default=FIXTURES)
+    parser.add_argument("--media-dir", help="reutiliza el audio generado entre ejecuciones")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cold-cache", action="store_true", help="sin caché de búsquedas ni de streams: cada comando llega a yt-dlp")
+    parser.add_argument("--json", help="guarda los resultados en este fichero")
+    parser.add_argument("--baseline", help="resultados de una ejecución anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    for name in ("fixtures", "media_dir", "json", "baseline"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    # MusicCog usa rutas relativas (data/music.db, data/music): se ejecuta en un directorio temporal
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="botbot-loadtest-") as workdir:
+        args.workdir = workdir
+        os.chdir(workdir)
+        try:
+            results = asyncio.run(run(args))
+        finally:
+            os.chdir(cwd)
+    report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n❌ Regresiones respecto a la línea base:\n  " + "\n  ".join(regressions))
+            return 1
+        print("\n✅ Sin regresiones respecto a la línea base")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""CPU por stream: FFmpegPCMAudio + codificación Opus vs FFmpegOpusAudio con codec copy.
+
+Genera un webm/Opus local (como el formato 251 de YouTube) y lo consume frame a
+frame igual que el AudioPlayer de discord.py, sin red ni Discord. Mide el CPU
+del propio proceso (lectura + codificación en Python) y el de los FFmpeg hijos.
+
+    python benchmarks/opus_passthrough.py [--seconds 120] [--libopus /ruta/libopus.so]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import discord
+from discord.opus import Encoder
+
+
+def make_opus_webm(path: str, seconds: int) -> None:
+    subprocess.run([
+        "ffmpeg", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}:sample_rate=48000",
+        "-ac", "2", "-c:a", "libopus", "-b:a", "128k", path,
+    ], check=True)
+
+
+def cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def drain(source: discord.AudioSource, encoder: Encoder | None) -> int:
+    frames = 0
+    while data := source.read():
+        if encoder is not None:
+            encoder.encode(data, Encoder.SAMPLES_PER_FRAME)
+        frames += 1
+    source.cleanup()
+    return frames
+
+
+def measure(name: str, make_source, encoder: Encoder | None) -> float:
+    start_cpu, start = cpu_seconds(), time.perf_counter()
+    frames = drain(make_source(), encoder)
+    cpu = cpu_seconds() - start_cpu
+    audio_seconds = frames * Encoder.FRAME_LENGTH / 1000
+    print(f"{name:<22} {frames:>7} frames  {cpu:7.2f}s CPU  {cpu / audio_seconds * 100:6.2f}% of one core per stream  ({time.perf_counter() - start:.1f}s wall)")
+    return cpu / audio_seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=int, default=120)
+    parser.add_argument("--libopus", help="libopus a cargar si no está instalada en el sistema")
+    args = parser.parse_args()
+
+    if args.libopus:
+        discord.opus.load_opus(args.libopus)
+    elif not discord.opus.is_loaded():
+        discord.opus._load_default()
+    if not discord.opus.is_loaded():
+        sys.exit("No se encontró libopus: instálala o pásala con --libopus")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "track.webm")
+        make_opus_webm(path, args.seconds)
+
+        pcm = measure("PCM + re-encode", lambda: discord.FFmpegPCMAudio(path), Encoder())
+        opus = measure("Opus passthrough", lambda: discord.FFmpegOpusAudio(path, codec="copy"), None)
+
+    print(f"CPU saved per stream: {(pcm - opus) * 100:.2f}% of one core ({(1 - opus / pcm) * 100:.0f}% less)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,34 +1,89 @@
 import discord
 from discord.ext import commands
 from discord.ext.commands import Context
+import hashlib
+import json
 import logging
+import os
+import time
 
 from cogs.PingCog import PingCog
 from cogs.MusicCog import MusicCog
+from Metrics import COMMAND_LATENCY
+from MetricsServer import MetricsServer
 
-class Botbot(commands.Bot):
-    def __init__(self, *args, dev_guild=None, **kwargs):
-        super().__init__(*args, **kwargs)
+class BotTree(discord.app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras['started'] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: discord.app_commands.AppCommandError) -> None:
+        observe_command(interaction, interaction.command, "error")
+        await super().on_error(interaction, error)
+
+
+def observe_command(interaction: discord.Interaction, command, status: str) -> None:
+    started = interaction.extras.pop('started', None)
+    if started is not None and command is not None:
+        COMMAND_LATENCY.observe(time.perf_counter() - started, command=command.qualified_name, status=status)
+
+
+class Botbot(commands.AutoShardedBot):
+    TREE_HASH_PATH = "data/command_tree.json"
+
+    def __init__(self, *args, dev_guild=None, metrics_host="0.0.0.0", metrics_port=5000, cluster_id=0, cluster_workers=1, **kwargs):
+        super().__init__(*args, tree_cls=BotTree, **kwargs)
         self.dev_guild = dev_guild
+        # En un cluster solo el worker 0 hace las tareas globales (sync de comandos, descargas pendientes)
+        self.cluster_id = cluster_id
+        self.cluster_workers = cluster_workers
         self.logger = logging.getLogger('botbot')
+        self.metrics_server = MetricsServer(self, host=metrics_host, port=metrics_port)
 
     async def setup_hook(self):
+        await self.metrics_server.start()
         await self.add_cog(PingCog(self))
         await self.add_cog(MusicCog(self))
 
-        if self.dev_guild:
-            guild = discord.Object(id=self.dev_guild)
+        if self.cluster_id == 0:
+            await self.sync_commands()
+
+    async def sync_commands(self):
+        # Sincronizar es una llamada con rate limit: solo se hace si la definición
+        # de los comandos cambió desde la última vez (borra el fichero para forzarla)
+        guild = discord.Object(id=self.dev_guild) if self.dev_guild else None
+        if guild:
             self.tree.copy_global_to(guild=guild)
-            await self.tree.sync(guild=guild)
-        else:
-            await self.tree.sync()
+        payload = [command.to_dict(self.tree) for command in self.tree.get_commands(guild=guild)]
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        scope = f"{self.application_id}:{self.dev_guild or 'global'}"
+
+        hashes = {}
+        if os.path.exists(self.TREE_HASH_PATH):
+            with open(self.TREE_HASH_PATH) as f:
+                hashes = json.load(f)
+        if hashes.get(scope) == digest:
+            self.logger.info("✅ Slash commands unchanged, skipping sync.")
+            return
+
+        await self.tree.sync(guild=guild)
+        hashes[scope] = digest
+        os.makedirs(os.path.dirname(self.TREE_HASH_PATH), exist_ok=True)
+        with open(self.TREE_HASH_PATH, 'w') as f:
+            json.dump(hashes, f)
+        self.logger.info(f"✅ Slash commands synchronized ({len(payload)} commands).")
 
     async def on_ready(self):
         if self.user is None:
             self.logger.error("❌ Bot is not ready")
             return
         
-        self.logger.info(f'✅ Logged in as {self.user.name} ({self.user.id})')
+        self.logger.info(f'✅ Logged in as {self.user.name} ({self.user.id}) with shards {sorted(self.shards)}')
         self.logger.info('------')
 
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        observe_command(interaction, command, "ok")
 
+    async def close(self):
+        await self.metrics_server.stop()
+        await super().close()
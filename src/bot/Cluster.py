@@ -0,0 +1,279 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import signal
+import time
+from dataclasses import dataclass, field
+from multiprocessing.process import BaseProcess
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from Metrics import Counter, Gauge, Registry
+
+GATEWAY_BOT_URL = "https://discord.com/api/v10/gateway/bot"
+
+
+@dataclass
+class WorkerConfig:
+    cluster_id: int
+    shard_ids: List[int]
+    shard_count: int
+    metrics_port: int
+    # Workers del cluster: los límites de todo el host se reparten entre ellos
+    workers: int = 1
+
+
+@dataclass
+class Worker:
+    config: WorkerConfig
+    process: Optional[BaseProcess] = None
+    started_at: float = 0.0
+    restarts: int = 0
+    backoff: float = 0.0
+    restart_task: Optional[asyncio.Task[None]] = field(default=None, repr=False)
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+
+async def recommended_shards(token: str) -> int:
+    """Número de shards que recomienda Discord para el bot."""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(GATEWAY_BOT_URL, headers={"Authorization": f"Bot {token}"}) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return int(data["shards"])
+
+
+def split_shards(shard_count: int, workers: int) -> List[List[int]]:
+    # Reparto intercalado: los servidores se asignan a shards por (id >> 22) % total,
+    # así que cualquier reparto equilibra igual y este no depende del orden
+    workers = max(1, min(workers, shard_count))
+    return [list(range(i, shard_count, workers)) for i in range(workers)]
+
+
+def merge_metrics(texts: Dict[int, str]) -> str:
+    """Une las exposiciones Prometheus de varios workers añadiendo la etiqueta
+    `worker` a cada muestra. Cada métrica conserva un único HELP/TYPE."""
+    headers: Dict[str, List[str]] = {}
+    samples: Dict[str, List[str]] = {}
+    for worker_id, text in sorted(texts.items()):
+        family = ""
+        for line in text.splitlines():
+            if not line:
+                continue
+            if line.startswith("#"):
+                parts = line.split(" ", 3)
+                if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                    family = parts[2]
+                    headers.setdefault(family, [])
+                    if len(headers[family]) < 2:
+                        headers[family].append(line)
+                    samples.setdefault(family, [])
+                continue
+            name, _, rest = line.partition(" ")
+            label = f'worker="{worker_id}"'
+            if "{" in name:
+                name = name.replace("{", "{" + label + ",", 1)
+            else:
+                name = name + "{" + label + "}"
+            samples.setdefault(family, []).append(f"{name} {rest}")
+
+    lines: List[str] = []
+    for family, family_samples in samples.items():
+        lines.extend(headers.get(family, []))
+        lines.extend(family_samples)
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+class ClusterSupervisor:
+    """Reparte los shards del bot entre varios procesos y los vigila.
+
+    Cada worker ejecuta su propio `AutoShardedBot` con un subconjunto de shards
+    (y por tanto su propio GIL para la voz y la extracción). Los workers se
+    arrancan de uno en uno, esperando a que el anterior esté listo, para no
+    superar el límite de IDENTIFY de Discord. Si un worker muere se relanza con
+    backoff exponencial. El supervisor sirve `/metrics` y `/health` agregando
+    los de cada worker, que escuchan en localhost.
+    """
+    POLL_INTERVAL = 1.0
+    RESTART_BACKOFF_MIN = 1.0
+    RESTART_BACKOFF_MAX = 60.0
+    # Un worker que aguanta este tiempo vuelve a empezar con el backoff mínimo
+    STABLE_AFTER = 120.0
+    READY_TIMEOUT_BASE = 30.0
+    READY_TIMEOUT_PER_SHARD = 6.0
+    STOP_TIMEOUT = 15.0
+    SCRAPE_TIMEOUT = 2.0
+
+    def __init__(
+        self,
+        target: Callable[[WorkerConfig], None],
+        shard_count: int,
+        workers: int,
+        host: str = "0.0.0.0",
+        port: int = 5000,
+        worker_port_base: int = 5100,
+    ) -> None:
+        self.target = target
+        self.host = host
+        self.port = port
+        self.logger = logging.getLogger('cluster')
+        shards = split_shards(shard_count, workers)
+        self.workers = [
+            Worker(WorkerConfig(
+                cluster_id=i, shard_ids=shard_ids, shard_count=shard_count, metrics_port=worker_port_base + i, workers=len(shards)
+            ))
+            for i, shard_ids in enumerate(shards)
+        ]
+        self._context = multiprocessing.get_context("spawn")
+        self._stopping = asyncio.Event()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._runner: Optional[web.AppRunner] = None
+
+        self.registry = Registry()
+        self.worker_up = self.registry.register(Gauge("botbot_cluster_worker_up", "Whether each worker process is alive", ["worker"]))
+        self.worker_up.set_function(lambda: {(str(w.config.cluster_id),): float(w.alive) for w in self.workers})
+        self.worker_restarts = self.registry.register(Counter("botbot_cluster_worker_restarts_total", "Worker process restarts", ["worker"]))
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stopping.set)
+            except (NotImplementedError, RuntimeError):
+                # Windows: Ctrl+C llega como KeyboardInterrupt
+                pass
+
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.SCRAPE_TIMEOUT))
+        try:
+            await self._start_server()
+            for worker in self.workers:
+                if self._stopping.is_set():
+                    break
+                self._spawn(worker)
+                await self._wait_ready(worker)
+            while not self._stopping.is_set():
+                self._check_workers()
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self._stop_workers()
+            if self._runner:
+                await self._runner.cleanup()
+            await self._session.close()
+
+    def _spawn(self, worker: Worker) -> None:
+        config = worker.config
+        process = self._context.Process(target=self.target, args=(config,), name=f"botbot-worker-{config.cluster_id}")
+        process.start()
+        worker.process = process
+        worker.started_at = time.monotonic()
+        self.logger.info(f"🚀 Worker {config.cluster_id} started (pid {process.pid}, shards {config.shard_ids})")
+
+    async def _wait_ready(self, worker: Worker) -> None:
+        timeout = self.READY_TIMEOUT_BASE + self.READY_TIMEOUT_PER_SHARD * len(worker.config.shard_ids)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and worker.alive and not self._stopping.is_set():
+            status, _ = await self._scrape(worker, "/health")
+            if status == 200:
+                self.logger.info(f"✅ Worker {worker.config.cluster_id} ready")
+                return
+            await asyncio.sleep(self.POLL_INTERVAL)
+        self.logger.warning(f"Worker {worker.config.cluster_id} not ready after {timeout:.0f}s, starting the next one anyway")
+
+    def _check_workers(self) -> None:
+        for worker in self.workers:
+            if worker.alive or worker.restart_task is not None or worker.process is None:
+                continue
+            uptime = time.monotonic() - worker.started_at
+            if uptime >= self.STABLE_AFTER:
+                worker.backoff = 0.0
+            worker.backoff = min(self.RESTART_BACKOFF_MAX, max(self.RESTART_BACKOFF_MIN, worker.backoff * 2))
+            self.logger.error(
+                f"💥 Worker {worker.config.cluster_id} exited with code {worker.process.exitcode} after {uptime:.0f}s, "
+                f"restarting in {worker.backoff:.0f}s"
+            )
+            worker.restart_task = asyncio.create_task(self._restart(worker, worker.backoff))
+
+    async def _restart(self, worker: Worker, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+            if self._stopping.is_set():
+                return
+            worker.restarts += 1
+            self.worker_restarts.inc(worker=str(worker.config.cluster_id))
+            self._spawn(worker)
+        finally:
+            worker.restart_task = None
+
+    async def _stop_workers(self) -> None:
+        for worker in self.workers:
+            if worker.restart_task:
+                worker.restart_task.cancel()
+            if worker.alive:
+                # El worker cierra el bot ordenadamente al recibir SIGTERM
+                worker.process.terminate()  # type: ignore[union-attr]
+        deadline = time.monotonic() + self.STOP_TIMEOUT
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            await asyncio.to_thread(worker.process.join, max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                self.logger.warning(f"Worker {worker.config.cluster_id} did not stop in time, killing it")
+                worker.process.kill()
+                await asyncio.to_thread(worker.process.join)
+        self.logger.info("Cluster stopped")
+
+    async def _scrape(self, worker: Worker, path: str) -> Tuple[Optional[int], str]:
+        assert self._session is not None
+        try:
+            async with self._session.get(f"http://127.0.0.1:{worker.config.metrics_port}{path}") as response:
+                return response.status, await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None, ""
+
+    async def _start_server(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self.metrics)
+        app.router.add_get("/health", self.health)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.logger.info(f"📈 Cluster metrics listening on {self.host}:{self.port}")
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        alive = [worker for worker in self.workers if worker.alive]
+        results = await asyncio.gather(*(self._scrape(worker, "/metrics") for worker in alive))
+        texts = {worker.config.cluster_id: text for worker, (status, text) in zip(alive, results) if status == 200}
+        return web.Response(text=merge_metrics(texts) + self.registry.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    async def health(self, request: web.Request) -> web.Response:
+        results = await asyncio.gather(*(self._scrape(worker, "/health") for worker in self.workers))
+        workers: List[Dict[str, Any]] = []
+        for worker, (status, text) in zip(self.workers, results):
+            try:
+                details = json.loads(text) if text else None
+            except ValueError:
+                details = None
+            workers.append({
+                "id": worker.config.cluster_id,
+                "pid": worker.process.pid if worker.process else None,
+                "alive": worker.alive,
+                "shards": worker.config.shard_ids,
+                "restarts": worker.restarts,
+                "healthy": status == 200,
+                "health": details,
+            })
+        healthy = all(worker["healthy"] for worker in workers)
+        return web.json_response(
+            {"status": "ok" if healthy else "unavailable", "shard_count": self.workers[0].config.shard_count, "workers": workers},
+            status=200 if healthy else 503
+        )
@@ -0,0 +1,183 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self.samples()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_labels(self.label_names, key)} {value}"
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback: Optional[Callable[[], Dict[LabelValues, float]]] = None
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, callback: Callable[[], Dict[LabelValues, float]]) -> None:
+        """Calcula los valores en cada scrape en lugar de mantenerlos al día."""
+        self._callback = callback
+
+    def samples(self) -> Iterator[str]:
+        values = self._callback() if self._callback else self._values
+        for key, value in values.items():
+            yield f"{self.name}{_labels(self.label_names, key)} {value}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[str]:
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}"
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, key)} {self._sums[key]}"
+            yield f"{self.name}_count{_labels(self.label_names, key)} {cumulative}"
+
+
+M = TypeVar('M', bound=Metric)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+COMMAND_LATENCY = REGISTRY.register(Histogram(
+    "botbot_command_latency_seconds", "Slash command handler duration", ["command", "status"]
+))
+EXTRACTION_DURATION = REGISTRY.register(Histogram(
+    "botbot_extraction_duration_seconds", "yt-dlp extraction duration", ["kind", "status"]
+))
+FFMPEG_SPAWN = REGISTRY.register(Histogram(
+    "botbot_ffmpeg_spawn_seconds", "Time to spawn an FFmpeg audio source", ["source"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+))
+VOICE_CONNECTIONS = REGISTRY.register(Gauge(
+    "botbot_voice_connections", "Active voice connections"
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "botbot_queue_depth", "Songs waiting in each guild's queue", ["guild"]
+))
+LOOP_LAG = REGISTRY.register(Gauge(
+    "botbot_event_loop_lag_seconds", "Event loop scheduling delay over the last probe"
+))
+FFMPEG_PROCESSES = REGISTRY.register(Gauge(
+    "botbot_ffmpeg_processes", "FFmpeg audio processes currently running"
+))
+FFMPEG_CPU = REGISTRY.register(Gauge(
+    "botbot_ffmpeg_cpu_cores", "CPU used by FFmpeg audio processes over the last sample, in cores"
+))
+FFMPEG_CAPACITY = REGISTRY.register(Gauge(
+    "botbot_ffmpeg_capacity", "Configured FFmpeg limits", ["limit"]
+))
+FFMPEG_REJECTED = REGISTRY.register(Counter(
+    "botbot_ffmpeg_rejected_total", "FFmpeg spawns refused by admission control", ["reason"]
+))
+FFMPEG_REAPED = REGISTRY.register(Counter(
+    "botbot_ffmpeg_reaped_total", "FFmpeg processes killed by the supervisor", ["reason"]
+))
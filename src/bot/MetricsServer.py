@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import discord
+from aiohttp import web
+from discord.ext import commands
+
+from Metrics import LOOP_LAG, REGISTRY, VOICE_CONNECTIONS
+
+
+class MetricsServer:
+    """Servidor HTTP con `/metrics` (formato Prometheus) y `/health`."""
+    LAG_PROBE_INTERVAL = 0.5
+
+    def __init__(self, bot: commands.Bot, host: str = "0.0.0.0", port: int = 5000) -> None:
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.logger = logging.getLogger('botbot')
+        self._runner: Optional[web.AppRunner] = None
+        self._lag_task: Optional[asyncio.Task[None]] = None
+        VOICE_CONNECTIONS.set_function(lambda: {(): float(sum(1 for vc in bot.voice_clients if vc.is_connected()))})
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self.metrics)
+        app.router.add_get("/health", self.health)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._lag_task = asyncio.create_task(self._probe_loop_lag())
+        self.logger.info(f"📈 Metrics server listening on {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        if self._lag_task:
+            self._lag_task.cancel()
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    async def health(self, request: web.Request) -> web.Response:
+        voice = [
+            {"guild": vc.guild.id, "channel": vc.channel.id, "connected": vc.is_connected(), "playing": vc.is_playing()}
+            for vc in self.bot.voice_clients if isinstance(vc, discord.VoiceClient)
+        ]
+        gateway = {
+            "ready": self.bot.is_ready(),
+            "closed": self.bot.is_closed(),
+            "latency": self.bot.latency if self.bot.latency == self.bot.latency else None,  # NaN antes del primer heartbeat
+            "guilds": len(self.bot.guilds),
+        }
+        if isinstance(self.bot, commands.AutoShardedBot):
+            gateway["shards"] = {
+                shard_id: {"closed": shard.is_closed(), "latency": shard.latency if shard.latency == shard.latency else None}
+                for shard_id, shard in self.bot.shards.items()
+            }
+        healthy = gateway["ready"] and not gateway["closed"]
+        return web.json_response(
+            {"status": "ok" if healthy else "unavailable", "gateway": gateway, "voice": voice},
+            status=200 if healthy else 503
+        )
+
+    async def _probe_loop_lag(self) -> None:
+        # Cuánto más de lo pedido tarda el loop en despertar de un sleep
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.LAG_PROBE_INTERVAL)
+            LOOP_LAG.set(max(0.0, time.perf_counter() - start - self.LAG_PROBE_INTERVAL))
@@ -1,29 +1,46 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
 import os
 from pyclbr import Function
-from typing import Any, Callable, Coroutine, List, Optional, Union
+from typing import Any, Awaitable, Callable, Coroutine, List, Optional, Set, Tuple, Type, TypeVar, Union
 from venv import logger
-from attr import dataclass
+from attr import asdict, dataclass
 import discord
 from discord.ext import commands
 from discord.ui import Button, View
-import sqlite3
-import yt_dlp
-from youtube_dl import YoutubeDL
 
 import logging
 import asyncio
+import time
 
-from collections import deque
 from enum import Enum
 import discord
 
-@dataclass
+from Metrics import FFMPEG_SPAWN, QUEUE_DEPTH
+from music.AudioCache import AudioCache
+from music.Database import Database
+from music.DownloadManager import DownloadJob, DownloadManager
+from music.EffectChain import EffectChain
+from music.Extractor import Extractor, ExtractionError
+from music.FavCatalog import FavCatalog
+from music.FFmpegSupervisor import FFmpegOverloaded, FFmpegSupervisor
+from music.Library import Library, LibraryEntry
+from music.Loudness import Loudness, measure_loudness
+from music.PlayerRegistry import PlayerRegistry
+from music.QueueStore import QueueStore, SavedPlayer
+from music.SongCache import SongCache, normalize_query, stream_expiry, video_key
+from music.SongQueue import SongQueue
+from music.VoiceConnection import VoiceConnection, VoiceConnectionError
+
+# slots: las colas grandes guardan decenas de miles de canciones
+@dataclass(slots=True)
 class Song:
     title: str
     url: str
     path: str|None
     duration: int
+    webpage_url: str|None = None
+    codec: str|None = None
+    gain: float = 1.0
 
 class PlayerState(Enum):
     PLAYING = "playing"
@@ -33,7 +50,111 @@ class PlayerState(Enum):
 import abc
 
 class IMusicPlayer(abc.ABC):
-    @abc.abstractmethod 
+    # Tipo con el que se guarda el reproductor para restaurarlo tras un reinicio
+    KIND = ""
+    queue: SongQueue[Song]
+    current_song: Optional[Song]
+    state: PlayerState
+    voice_client: Optional[discord.VoiceClient]
+    voice: VoiceConnection
+    # Se llama (desde cualquier hilo) cuando cambian la canción, el estado o el canal
+    on_change: Optional[Callable[["IMusicPlayer"], None]] = None
+    # Posición en segundos desde la que arranca la próxima canción
+    _seek = 0.0
+    ffmpeg: Optional[FFmpegSupervisor] = None
+    # Motor del reproductor: una tarea por guild que aplica los comandos de uno
+    # en uno en el event loop. El hilo de audio solo le manda eventos.
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _commands: Optional["asyncio.Queue[Callable[[], None]]"] = None
+    _engine: Optional["asyncio.Task[None]"] = None
+    _closed = False
+    # Sube cada vez que cambia la canción: el `after` de una canción saltada
+    # o parada llega tarde y no debe volver a avanzar la cola
+    _generation = 0
+
+    def play(self) -> None:
+        self._post(self._play)
+
+    def pause(self) -> None:
+        self._post(self._pause)
+
+    def resume(self) -> None:
+        self._post(self._resume)
+
+    def stop(self) -> None:
+        self._post(self._stop)
+
+    def set_volume(self, volume: float) -> None:
+        self._post(lambda: self._set_volume(volume))
+
+    def skip(self) -> None:
+        self._post(self._skip)
+
+    def _skip(self) -> None:
+        if self.voice_client:
+            # `_play_next` cambia de generación: el `after` que dispara stop() se ignora
+            self.voice_client.stop()
+            self._play_next()
+        logger.info("Skipped song")
+
+    def _after(self) -> Callable[[Optional[Exception]], None]:
+        generation = self._generation
+        # Corre en el hilo de audio de discord.py: solo encola el evento
+        return lambda error: self._post(lambda: self._song_finished(generation, error))
+
+    def _song_finished(self, generation: int, error: Optional[Exception]) -> None:
+        if generation != self._generation:
+            return
+        if error:
+            logger.error(f"Error en la reproducción: {error}")
+        self._play_next()
+
+    def _post(self, command: Callable[[], None]) -> None:
+        """Encola un comando para el motor. Seguro desde cualquier hilo."""
+        try:
+            running: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self._loop is None:
+            self._loop = running
+        if self._loop is None or self._closed:
+            return
+        if running is self._loop:
+            self._enqueue(command)
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._enqueue, command)
+        except RuntimeError:
+            # El loop ya se cerró: el bot se está apagando
+            pass
+
+    def _enqueue(self, command: Callable[[], None]) -> None:
+        if self._closed:
+            return
+        if self._commands is None:
+            self._commands = asyncio.Queue()
+        self._commands.put_nowait(command)
+        if self._engine is None or self._engine.done():
+            assert self._loop is not None
+            self._engine = self._loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        assert self._commands is not None
+        while True:
+            command = await self._commands.get()
+            try:
+                command()
+            except Exception as e:
+                logger.exception(f"Player command failed: {e}")
+
+    def _close_engine(self) -> None:
+        self._closed = True
+        if self._engine and not self._engine.done():
+            self._engine.cancel()
+        self._engine = None
+        self._commands = None
+
+    @abc.abstractmethod
     async def connect(self, voice_channel: discord.VoiceChannel) -> None: pass
 
     @abc.abstractmethod
@@ -44,27 +165,30 @@ class IMusicPlayer(abc.ABC):
     
     @abc.abstractmethod
     def remove_from_queue(self, index: int) -> Song|None: pass
-    
+
     @abc.abstractmethod
-    def play(self) -> None: pass
+    def insert_in_queue(self, index: int, song: Song) -> None: pass
 
     @abc.abstractmethod
-    def pause(self) -> None: pass
+    def move_in_queue(self, source: int, destination: int) -> Song|None: pass
 
     @abc.abstractmethod
-    def resume(self) -> None: pass
+    def shuffle_queue(self) -> None: pass
+    
+    @abc.abstractmethod
+    def _play(self) -> None: pass
 
     @abc.abstractmethod
-    def stop(self) -> None: pass
+    def _pause(self) -> None: pass
 
     @abc.abstractmethod
-    def set_volume(self, volume: float) -> None: pass
+    def _resume(self) -> None: pass
 
     @abc.abstractmethod
-    def skip(self) -> None: pass
+    def _stop(self) -> None: pass
 
     @abc.abstractmethod
-    def _song_finished(self, error: Optional[Exception]) -> None: pass
+    def _set_volume(self, volume: float) -> None: pass
 
     @abc.abstractmethod
     def _play_next(self) -> None: pass
@@ -72,13 +196,42 @@ class IMusicPlayer(abc.ABC):
     @abc.abstractmethod
     def destroy(self) -> None: pass
 
+    @abc.abstractmethod
+    def position(self) -> float: pass
+
+    def restore(self, songs: List[Song], current: Optional[Song], position: float) -> None:
+        for song in songs:
+            self.queue.append(song)
+        if current:
+            self.queue.insert(0, current)
+            self._seek = position
+        logger.debug(f"Restored {len(self.queue)} songs")
+
+    def _changed(self) -> None:
+        if self.on_change:
+            self.on_change(self)
+
+    def _spawn(self, factory: Callable[[], Any]) -> Any:
+        # Sin supervisor (reproductor suelto) el FFmpeg arranca sin límites
+        return self.ffmpeg.spawn(factory, self) if self.ffmpeg else factory()
+
+    def _release(self) -> None:
+        if self.ffmpeg:
+            self.ffmpeg.release(self)
+
 class DowloadedMusicPlayer(IMusicPlayer):
-    def __init__(self) -> None:
-        self.queue: deque[Song] = deque()
+    KIND = "download"
+
+    def __init__(self, ffmpeg: Optional[FFmpegSupervisor] = None) -> None:
+        self.queue: SongQueue[Song] = SongQueue()
         self.current_song: Optional[Song] = None
         self.state = PlayerState.STOPPED
         self.volume = 1.0
         self.voice_client: Optional[discord.VoiceClient] = None
+        self.voice = VoiceConnection()
+        self.ffmpeg = ffmpeg
+        self._started_at = 0.0
+        self._paused_at: Optional[float] = None
         logger.debug("DowloadedMusicPlayer initialized")
 
     def __del__(self) -> None:
@@ -86,11 +239,9 @@ class DowloadedMusicPlayer(IMusicPlayer):
 
     async def connect(self, voice_channel: discord.VoiceChannel) -> None:
         logger.debug(f"Connecting to voice channel: {voice_channel}")
-        if self.voice_client:
-            await self.voice_client.disconnect()
-            
-        self.voice_client = await voice_channel.connect()
-        logger.info("Connected to voice channel")
+        # Reutiliza la conexión viva (o la mueve de canal) sin cortar la canción
+        self.voice_client = await self.voice.connect(voice_channel)
+        self._changed()
 
     def add_to_queue(self, song: Song) -> None:
         self.queue.append(song)
@@ -100,92 +251,157 @@ class DowloadedMusicPlayer(IMusicPlayer):
         return list(self.queue)
     
     def remove_from_queue(self, index: int) -> Song|None:
-        if 0 <= index < len(self.queue):
-            song = self.queue[index]
-            self.queue.remove(song)
+        # Por posición: dos canciones iguales en la cola son entradas distintas
+        song = self.queue.pop(index)
+        if song:
             logger.debug(f"Removed from queue: {song.title}")
-            return song
-        return None
+        return song
 
-    def play(self) -> None:
+    def insert_in_queue(self, index: int, song: Song) -> None:
+        self.queue.insert(index, song)
+        logger.debug(f"Inserted in queue at {index}: {song.title}")
+
+    def move_in_queue(self, source: int, destination: int) -> Song|None:
+        song = self.queue.move(source, destination)
+        if song:
+            logger.debug(f"Moved in queue from {source} to {destination}: {song.title}")
+        return song
+
+    def shuffle_queue(self) -> None:
+        self.queue.shuffle()
+        logger.debug("Shuffled queue")
+
+    def _play(self) -> None:
         if not self.voice_client or not self.queue:
             logger.warning("No voice client or queue is empty")
             return
 
         if self.state == PlayerState.STOPPED:
-            self.current_song = self.queue.popleft()
-            if self.voice_client and self.current_song and self.current_song.path:
-                self.voice_client.play(
-                    discord.FFmpegPCMAudio(self.current_song.path),
-                    after=self._song_finished
-                )
-            self.state = PlayerState.PLAYING
-            logger.info(f"Playing song: {self.current_song.title}")
+            seek, self._seek = self._seek, 0.0
+            self._start_next(seek)
 
-    def pause(self) -> None:
+    def _pause(self) -> None:
         if self.voice_client and self.state == PlayerState.PLAYING:
             self.voice_client.pause()
             self.state = PlayerState.PAUSED
+            self._paused_at = time.monotonic()
             logger.info("Paused song")
+            self._changed()
 
-    def resume(self) -> None:
+    def _resume(self) -> None:
         if self.voice_client and self.state == PlayerState.PAUSED:
             self.voice_client.resume()
             self.state = PlayerState.PLAYING
+            if self._paused_at is not None:
+                self._started_at += time.monotonic() - self._paused_at
+                self._paused_at = None
             logger.info("Resumed song")
+            self._changed()
 
-    def stop(self) -> None:
+    def _stop(self) -> None:
         if self.voice_client and self.voice_client:
+            self._generation += 1
             self.voice_client.stop()
             self.state = PlayerState.STOPPED
             self.current_song = None
             logger.info("Stopped song")
+            self._changed()
 
-    def set_volume(self, volume: float) -> None:
+    def _set_volume(self, volume: float) -> None:
         self.volume = max(0.0, min(1.0, volume))
-        if self.voice_client and self.voice_client.source:
-            self.voice_client.source = discord.PCMVolumeTransformer(self.voice_client.source, volume=self.volume)
+        if self.voice_client and isinstance(self.voice_client.source, EffectChain):
+            gain = self.current_song.gain if self.current_song else 1.0
+            self.voice_client.source.fade_to(self.volume * gain)
         logger.debug(f"Set volume to: {self.volume}")
 
-    def skip(self) -> None:
-        if self.voice_client:
-            self.voice_client.stop()
-            self._play_next()
-        logger.info("Skipped song")
-
-    def _song_finished(self, error: Optional[Exception]) -> None:
-        if error:
-            logger.error(f"Error en la reproducción: {error}")
-        self._play_next()
-
     def _play_next(self) -> None:
         if len(self.queue) > 0:
-            self.current_song = self.queue.popleft()
-            if self.voice_client and self.current_song and self.current_song.path:
-                self.voice_client.play(
-                    discord.FFmpegPCMAudio(self.current_song.path),
-                    after=self._song_finished
-                )
-            self.state = PlayerState.PLAYING
-            logger.info(f"Playing next song: {self.current_song.title}")
-        else:
+            self._start_next(0.0)
+            return
+        self._generation += 1
+        self.state = PlayerState.STOPPED
+        self.current_song = None
+        logger.info("Queue is empty, stopped playing")
+        self._changed()
+
+    def _start_next(self, seek: float) -> None:
+        # La canción sale de la cola solo cuando ya suena: si no arranca, sigue la primera
+        song = self.queue.peek()
+        assert song is not None
+        self._generation += 1
+        if self.voice_client and song.path and not self._open(song, seek):
+            self._seek = seek
             self.state = PlayerState.STOPPED
             self.current_song = None
-            logger.info("Queue is empty, stopped playing")
+            self._changed()
+            return
+        self.queue.popleft()
+        self.current_song = song
+        self.state = PlayerState.PLAYING
+        self._started_at = time.monotonic() - seek
+        self._paused_at = None
+        logger.info(f"Playing song: {song.title}")
+        self._changed()
+
+    def position(self) -> float:
+        return (self._paused_at or time.monotonic()) - self._started_at
+
+    def _open(self, song: Song, seek: float) -> bool:
+        assert self.voice_client and song.path
+        path = song.path
+        before_options = f"-ss {seek:.2f}" if seek > 0 else None
+        try:
+            with FFMPEG_SPAWN.time(source="file"):
+                source = self._spawn(lambda: EffectChain(discord.FFmpegPCMAudio(path, before_options=before_options), volume=self.volume * song.gain))
+        except FFmpegOverloaded as e:
+            # Sonará con el siguiente comando que arranque el reproductor
+            logger.warning(f"Not playing {song.title}: {e}")
+            return False
+        try:
+            self.voice_client.play(source, after=self._after())
+        except Exception as e:
+            logger.exception(f"Error al reproducir canción: {str(e)}")
+            source.cleanup()
+            return False
+        return True
 
     def destroy(self) -> None:
-        if self.voice_client:
-            self.voice_client.cleanup()
-            self.voice_client = None
+        self._close_engine()
+        self._release()
+        self.voice.close()
+        self.voice_client = None
         logger.debug("Destroyed DowloadedMusicPlayer")
 
 class StreamMusicPlayer(IMusicPlayer):
-    def __init__(self) -> None:
-        self.queue: deque[Song] = deque()
+    KIND = "stream"
+    FFMPEG_BEFORE_OPTIONS = '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5'
+    # Cuánto antes del final de la canción actual se re-resuelve la siguiente URL
+    # y cuánto antes se arranca su FFmpeg, para que el cambio sea inmediato
+    RESOLVE_AHEAD = 30.0
+    WARMUP_AHEAD = 5.0
+    ADMISSION_TIMEOUT = 15.0
+
+    def __init__(
+        self, resolver: Optional[Callable[[Song], Awaitable[Song]]] = None, ffmpeg: Optional[FFmpegSupervisor] = None,
+        on_play: Optional[Callable[[Song], None]] = None,
+    ) -> None:
+        self.queue: SongQueue[Song] = SongQueue()
         self.current_song: Optional[Song] = None
         self.state = PlayerState.STOPPED
         self.volume = 1.0
         self.voice_client: Optional[discord.VoiceClient] = None
+        self.voice = VoiceConnection()
+        self.resolver = resolver
+        self.ffmpeg = ffmpeg
+        # Se llama una vez por canción que llega a sonar (la precarga no cuenta)
+        self.on_play = on_play
+        self._loop = asyncio.get_running_loop()
+        self._started_at = 0.0
+        self._paused_at: Optional[float] = None
+        self._prepared: Optional[Tuple[Song, Song, discord.AudioSource]] = None
+        self._prefetch_task: Optional[asyncio.Task[None]] = None
+        self._prefetch_target: Optional[Song] = None
+        self._start_task: Optional[asyncio.Task[None]] = None
         logger.debug("StreamMusicPlayer initialized")
 
     def __del__(self) -> None:
@@ -195,168 +411,547 @@ class StreamMusicPlayer(IMusicPlayer):
         return list(self.queue)
     
     def remove_from_queue(self, index: int) -> Song|None:
-        if 0 <= index < len(self.queue):
-            song = self.queue[index]
-            self.queue.remove(song)
+        # Por posición: dos canciones iguales en la cola son entradas distintas
+        song = self.queue.pop(index)
+        if song:
             logger.debug(f"Removed from queue: {song.title}")
-            return song
-        return None
+            self._loop.call_soon_threadsafe(self._schedule_prefetch)
+        return song
+
+    def insert_in_queue(self, index: int, song: Song) -> None:
+        self.queue.insert(index, song)
+        logger.debug(f"Inserted in queue at {index}: {song.title}")
+        self._loop.call_soon_threadsafe(self._schedule_prefetch)
+
+    def move_in_queue(self, source: int, destination: int) -> Song|None:
+        song = self.queue.move(source, destination)
+        if song:
+            logger.debug(f"Moved in queue from {source} to {destination}: {song.title}")
+            self._loop.call_soon_threadsafe(self._schedule_prefetch)
+        return song
+
+    def shuffle_queue(self) -> None:
+        self.queue.shuffle()
+        logger.debug("Shuffled queue")
+        self._loop.call_soon_threadsafe(self._schedule_prefetch)
 
     def destroy(self) -> None:
-        if self.voice_client:
-            self.voice_client.cleanup()
-            self.voice_client = None
+        self._close_engine()
+        self._cancel_start()
+        self._cancel_prefetch()
+        self._release()
+        self.voice.close()
+        self.voice_client = None
         logger.debug("Destroyed StreamMusicPlayer")
 
     async def connect(self, voice_channel: discord.VoiceChannel) -> None:
         logger.debug(f"Connecting to voice channel: {voice_channel}")
-        if self.voice_client:
-            await self.voice_client.disconnect()
-            
-        self.voice_client = await voice_channel.connect()
-        logger.info("Connected to voice channel")
+        # Reutiliza la conexión viva (o la mueve de canal) sin cortar la canción
+        self.voice_client = await self.voice.connect(voice_channel)
+        self._changed()
 
     def add_to_queue(self, song: Song) -> None:
         self.queue.append(song)
         logger.debug(f"Added to queue: {song.title}")
+        self._loop.call_soon_threadsafe(self._schedule_prefetch)
 
-    def play(self) -> None:
+    def _play(self) -> None:
         if not self.voice_client or not self.queue:
             logger.warning("No voice client or queue is empty")
             return
 
         if self.state == PlayerState.STOPPED:
-            try:
-                self.current_song = self.queue.popleft()
-                if not self.voice_client or not self.voice_client.is_connected():
-                    logger.error("Voice client no está conectado o inicializado")
-                    return
-                
-                ffmpeg_options = {
-                    'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
-                    'options': '-vn'
-                }
-                audio_source = discord.FFmpegPCMAudio(self.current_song.url, before_options=ffmpeg_options['before_options'])
-
-                
-                def after_callback(error):
-                    if error:
-                        logger.error(f"Error en reproducción: {error}")
-                    self._song_finished()
-
-                try:
-                    if self.voice_client.is_playing():
-                        self.voice_client.stop()
-                    self.voice_client.play(audio_source, after=after_callback)
-                except Exception as e:
-                    logger.exception(f"Error al reproducir canción: {str(e)}")
-                    self.state = PlayerState.STOPPED
-                    self._song_finished()
-                
-                self.state = PlayerState.PLAYING
-                logger.info(f"Playing song: {self.current_song.title}")
-                
-            except Exception as e:
-                logger.exception(f"Error al reproducir canción: {str(e)}")
-                self.state = PlayerState.STOPPED
-                self._song_finished()
+            if not self.voice_client.is_connected():
+                logger.error("Voice client no está conectado o inicializado")
+                return
+            self._play_next()
 
-    def pause(self) -> None:
+    def _pause(self) -> None:
         if self.voice_client and self.state == PlayerState.PLAYING:
             self.voice_client.pause()
             self.state = PlayerState.PAUSED
+            self._paused_at = time.monotonic()
             logger.info("Paused song")
+            self._changed()
 
-    def resume(self) -> None:
+    def _resume(self) -> None:
         if self.voice_client and self.state == PlayerState.PAUSED:
             self.voice_client.resume()
             self.state = PlayerState.PLAYING
+            if self._paused_at is not None:
+                self._started_at += time.monotonic() - self._paused_at
+                self._paused_at = None
             logger.info("Resumed song")
+            self._changed()
 
-    def stop(self) -> None:
+    def _stop(self) -> None:
         if self.voice_client and self.voice_client:
+            self._generation += 1
+            self._cancel_start()
+            self._cancel_prefetch()
             self.voice_client.stop()
             self.state = PlayerState.STOPPED
             self.current_song = None
             logger.info("Stopped song")
+            self._changed()
 
-    def set_volume(self, volume: float) -> None:
+    def _set_volume(self, volume: float) -> None:
         self.volume = max(0.0, min(1.0, volume))
-        if self.voice_client and self.voice_client.source:
-            self.voice_client.source = discord.PCMVolumeTransformer(self.voice_client.source, volume=self.volume)
+        # La siguiente canción preparada se creó con el volumen anterior
+        self._cancel_prefetch()
+        source = self.voice_client.source if self.voice_client else None
+        if self.voice_client and source:
+            if isinstance(source, EffectChain):
+                source.fade_to(self.volume)
+            elif self.volume != 1.0 and self.current_song:
+                # Un stream Opus copiado no se puede escalar: se reabre en PCM
+                # desde la posición actual
+                try:
+                    self.voice_client.source = self._create_source(self.current_song, self.position())
+                    source.cleanup()
+                except FFmpegOverloaded as e:
+                    logger.warning(f"Volume change needs a new FFmpeg: {e}")
+        self._loop.call_soon_threadsafe(self._schedule_prefetch)
         logger.debug(f"Set volume to: {self.volume}")
 
-    def skip(self) -> None:
-        if self.voice_client:
-            self.voice_client.stop()
-            self._play_next()
-        logger.info("Skipped song")
+    def _play_next(self) -> None:
+        # Lo ejecuta el motor: aquí no se resuelve ni se espera nada. Si la
+        # siguiente canción ya está preparada, el cambio es inmediato; si no, se
+        # resuelve en otra tarea y el motor sigue atendiendo comandos mientras.
+        if self.voice_client is None:
+            # Reproductor destruido: el callback de la última canción no sigue
+            return
+        self._cancel_start()
+        prepared, self._prepared = self._prepared, None
+        song = self.queue.popleft()
+        seek, self._seek = self._seek, 0.0
+        self.current_song = song
+        self.state = PlayerState.PLAYING if song else PlayerState.STOPPED
+        self._generation += 1
+
+        if song is None:
+            if prepared:
+                prepared[2].cleanup()
+            logger.info("Queue is empty, stopped playing")
+            self._changed()
+            return
 
-    def _song_finished(self, error: Optional[Exception] = None) -> None:
-        if error:
-            logger.error(f"Error en la reproducción: {error}")
-        self._play_next()
+        if prepared and prepared[0] is song and not seek:
+            self._start(song, prepared[1], prepared[2])
+            return
 
-    def _play_next(self) -> None:
-        if self.queue and len(self.queue) > 0:
-            self.current_song = self.queue.popleft()
-            if self.voice_client:
-                self.voice_client.play(
-                    discord.FFmpegPCMAudio(self.current_song.url),
-                    after=lambda e: self._song_finished(e)
-                )
-            self.state = PlayerState.PLAYING
-            logger.info(f"Playing next song: {self.current_song.title}")
+        if prepared:
+            prepared[2].cleanup()
+        self._start_task = self._loop.create_task(self._resolve_and_start(song, seek))
+
+    async def _resolve_and_start(self, song: Song, position: float = 0.0) -> None:
+        try:
+            resolved = await self.resolver(song) if self.resolver else song
+            # Si el host está al límite, la canción espera su turno un rato
+            if self.ffmpeg:
+                await self.ffmpeg.admit(self.ADMISSION_TIMEOUT)
+            source = self._create_source(resolved, position)
+        except asyncio.CancelledError:
+            # Al saltar o parar, la canción ya no es la actual; si lo sigue siendo,
+            # la cancelación vino de otro sitio y no puede dejarla colgada
+            if self.current_song is song:
+                logger.warning(f"Start of {song.title} was cancelled, requeueing it")
+                self._requeue(song, position)
+            raise
+        except FFmpegOverloaded as e:
+            logger.warning(f"Not playing {song.title}: {e}")
+            if self.current_song is song:
+                # Vuelve a la cola: sonará con el siguiente comando que arranque el reproductor
+                self._requeue(song, position)
+            return
+        except Exception as e:
+            logger.exception(f"Error al reproducir canción: {str(e)}")
+            if self.current_song is song:
+                self._play_next()
+            return
+        self._start(song, resolved, source, position)
+
+    def _start(self, song: Song, resolved: Song, source: discord.AudioSource, position: float = 0.0) -> None:
+        # La canción pudo saltarse o pararse mientras se resolvía
+        if self.current_song is not song:
+            source.cleanup()
+            return
+        if not self.voice_client or not self.voice_client.is_connected():
+            # La voz se cayó o está reconectando: la canción espera en la cola
+            logger.warning(f"Voice client disconnected before {song.title} could start")
+            source.cleanup()
+            self._requeue(song, position)
+            return
+        try:
+            self.voice_client.play(source, after=self._after())
+        except Exception as e:
+            logger.exception(f"Error al reproducir canción: {str(e)}")
+            source.cleanup()
+            # Vuelve a la cola en vez de perderse
+            self._requeue(song, position)
+            return
+        self.current_song = resolved
+        self._started_at = time.monotonic() - position
+        self._paused_at = None
+        logger.info(f"Playing song: {resolved.title}")
+        self._changed()
+        if self.on_play and not position:
+            self.on_play(resolved)
+        self._loop.call_soon_threadsafe(self._schedule_prefetch)
+
+    def _requeue(self, song: Song, position: float) -> None:
+        self.queue.insert(0, song)
+        self._seek = position
+        self.state = PlayerState.STOPPED
+        self.current_song = None
+        self._changed()
+
+    def _create_source(self, song: Song, position: float = 0.0) -> discord.AudioSource:
+        with FFMPEG_SPAWN.time(source="file" if song.path else "stream"):
+            return self._spawn(lambda: self._spawn_source(song, position))
+
+    def _spawn_source(self, song: Song, position: float) -> discord.AudioSource:
+        before_options = self.FFMPEG_BEFORE_OPTIONS
+        if position > 0:
+            before_options = f"-ss {position:.2f} {before_options}"
+        # Los streams Opus (webm de YouTube) se copian tal cual: ni FFmpeg decodifica
+        # ni discord.py vuelve a codificar cada frame. Solo se pasa a PCM cuando
+        # hay que transformar las muestras, como al cambiar el volumen.
+        if song.path:
+            # Copia local de la caché de audio: sin opciones de reconexión HTTP
+            before_options = f"-ss {position:.2f}" if position > 0 else None
+            return EffectChain(discord.FFmpegPCMAudio(song.path, before_options=before_options), volume=self.volume)
+        if song.codec == "opus" and self.volume == 1.0:
+            return discord.FFmpegOpusAudio(song.url, before_options=before_options, codec="copy")
+        return EffectChain(discord.FFmpegPCMAudio(song.url, before_options=before_options), volume=self.volume)
+
+    def position(self) -> float:
+        return (self._paused_at or time.monotonic()) - self._started_at
+
+    def _schedule_prefetch(self) -> None:
+        target = self.queue.peek()
+        stale = None
+        if self._prepared and self._prepared[0] is not target:
+            stale, self._prepared = self._prepared, None
+        if stale:
+            stale[2].cleanup()
+
+        if self._prefetch_task and not self._prefetch_task.done():
+            if self._prefetch_target is target:
+                return
+            self._prefetch_task.cancel()
+        self._prefetch_task = None
+        self._prefetch_target = target
+        if target is None or self.current_song is None or self._prepared:
+            return
+        self._prefetch_task = self._loop.create_task(self._prefetch(target))
+
+    async def _prefetch(self, song: Song) -> None:
+        current = self.current_song
+        # Sin duración conocida no se puede calcular cuándo acaba: se prepara ya
+        ends_at = self._started_at + current.duration if current and current.duration else 0.0
+        try:
+            await asyncio.sleep(max(0.0, ends_at - self.RESOLVE_AHEAD - time.monotonic()))
+            resolved = await self.resolver(song) if self.resolver else song
+            await asyncio.sleep(max(0.0, ends_at - self.WARMUP_AHEAD - time.monotonic()))
+            # Con el host al límite no se reserva un FFmpeg por adelantado
+            if self.ffmpeg and not self.ffmpeg.has_capacity():
+                return
+            source = self._create_source(resolved)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Could not prefetch {song.title}: {e}")
+            return
+
+        if self.queue.peek() is song and self._prepared is None:
+            self._prepared = (song, resolved, source)
+            source = None
+        if source:
+            source.cleanup()
         else:
-            self.state = PlayerState.STOPPED
-            self.current_song = None
-            logger.info("Queue is empty, stopped playing")
+            logger.debug(f"Prefetched next song: {resolved.title}")
+
+    def _cancel_prefetch(self) -> None:
+        if self._prefetch_task and not self._prefetch_task.done():
+            self._prefetch_task.cancel()
+        self._prefetch_task = None
+        self._prefetch_target = None
+        prepared, self._prepared = self._prepared, None
+        if prepared:
+            prepared[2].cleanup()
+
+    def _cancel_start(self) -> None:
+        # La canción que se estaba resolviendo ya no es la actual
+        if self._start_task and not self._start_task.done() and self._start_task is not asyncio.current_task():
+            self._start_task.cancel()
+        self._start_task = None
+
+def format_duration(seconds: int) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+class QueueView(discord.ui.View):
+    """Cola paginada: cada página lee de la SongQueue solo sus entradas, así que
+    cambiar de página cuesta lo mismo con 20 canciones que con 20.000."""
+    PAGE_SIZE = 10
+    TIMEOUT = 300
+
+    def __init__(self, player: IMusicPlayer) -> None:
+        super().__init__(timeout=self.TIMEOUT)
+        self.player = player
+        self.page = 0
+
+    def pages(self) -> int:
+        return max(1, -(-len(self.player.queue) // self.PAGE_SIZE))
+
+    def render(self) -> str:
+        queue = self.player.queue
+        # La cola puede haber cambiado desde la última página mostrada
+        self.page = max(0, min(self.page, self.pages() - 1))
+        start = self.page * self.PAGE_SIZE
+        lines = [f"🎵 Cola: {len(queue)} canciones · {format_duration(queue.total_duration)} en total"]
+        if self.player.current_song:
+            lines.append(f"▶️ {self.player.current_song.title[:80]} ({format_duration(self.player.current_song.duration)})")
+        for index, entry in enumerate(queue.entries(start, start + self.PAGE_SIZE), start + 1):
+            lines.append(f"{index}. {entry.item.title[:80]} ({format_duration(entry.item.duration)})")
+        lines.append(f"Página {self.page + 1}/{self.pages()}")
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.pages() - 1
+        return "\n".join(lines)
+
+    @discord.ui.button(emoji="⬅️", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        self.page -= 1
+        await interaction.response.edit_message(content=self.render(), view=self)
+
+    @discord.ui.button(emoji="➡️", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        self.page += 1
+        await interaction.response.edit_message(content=self.render(), view=self)
+
+PlayerT = TypeVar('PlayerT', bound=IMusicPlayer)
 
 class MusicCog(commands.Cog):
     LIBRARY_DIR = "data/music"
     DB_PATH = "data/music.db"
+    MAX_SELECT_OPTIONS = 25
+    MAX_PLAYLIST_ENTRIES = 1000
+    PLAYLIST_TIMEOUT = 300
+    AUDIO_CACHE_QUOTA = 2 * 1024 ** 3
+    SEARCH_CACHE_SIZE = 256
+    SEARCH_CACHE_TTL = 1800
+    STREAM_CACHE_SIZE = 1024
+    STREAM_CACHE_TTL = 3 * 3600
+    CHECKPOINT_INTERVAL = 10.0
+    VOICE_ERROR_MESSAGE = "❌ No se pudo conectar al canal de voz, inténtalo de nuevo."
+    OVERLOADED_MESSAGE = "❌ Hay demasiadas reproducciones en curso, inténtalo en un momento."
 
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
         self.logger = logging.getLogger('musiccog')
-        self.music_player : IMusicPlayer | None = None
+        self.players: PlayerRegistry[IMusicPlayer] = PlayerRegistry()
+        QUEUE_DEPTH.set_function(lambda: {(str(guild_id),): float(len(player.queue)) for guild_id, player in self.players.items()})
+        self.extractor = Extractor()
+        self.search_cache: SongCache[List[Song]] = SongCache(max_entries=self.SEARCH_CACHE_SIZE, ttl=self.SEARCH_CACHE_TTL)
+        self.stream_cache: SongCache[Song] = SongCache(max_entries=self.STREAM_CACHE_SIZE, ttl=self.STREAM_CACHE_TTL)
         self.ensuse_db()
-        self.create_tables()
+        self.db = Database(self.DB_PATH)
+        self.fav_catalog = FavCatalog(self.db)
+        self.library = Library(self.db, self.LIBRARY_DIR)
+        self.downloads = DownloadManager(self.db, self.extractor, self.library, self._on_download_complete)
+        self.audio_cache = AudioCache(self.db, self.library, self.downloads, quota=self.AUDIO_CACHE_QUOTA)
+        self.queue_store = QueueStore(self.db, asdict)
+        # Cada worker del cluster admite su parte de los FFmpeg del host
+        self.ffmpeg = FFmpegSupervisor(share=1 / getattr(bot, "cluster_workers", 1))
+        self._restore_task: Optional[asyncio.Task[None]] = None
+        self._checkpoint_task: Optional[asyncio.Task[None]] = None
+        self._background: Set[asyncio.Task[None]] = set()
         logger.debug("MusicCog initialized")
 
     def ensuse_db(self) -> None:
         if not os.path.exists(self.LIBRARY_DIR):
             self.logger.warning("📁 Library directory not found. Creating library directory...")
             os.makedirs(self.LIBRARY_DIR)
-        if not os.path.exists(self.DB_PATH):
-            self.logger.warning("📁 Database file not found. Creating database file...")
-            os.open(self.DB_PATH, os.O_CREAT)
+        db_dir = os.path.dirname(self.DB_PATH)
+        if db_dir and not os.path.exists(db_dir):
+            self.logger.warning("📁 Database directory not found. Creating database directory...")
+            os.makedirs(db_dir)
         self.logger.info("✅ Database and library directories ensured.")
 
-    def create_tables(self) -> None:
-        with sqlite3.connect(self.DB_PATH) as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS fav (
-                    id INTEGER PRIMARY KEY,
-                    title TEXT NOT NULL,
-                    url TEXT NOT NULL,
-                    path TEXT NOT NULL,
-                    duration INTEGER NOT NULL,
-                    UNIQUE(title)
-                )
-            """)
-        self.logger.info("✅ Tables created or ensured.")
-
-    def get_song(self, title: str) -> Optional[Song]:
-        with sqlite3.connect(self.DB_PATH) as conn:
-            cursor = conn.execute("SELECT * FROM fav WHERE title = ?", (title,))
-            row = cursor.fetchone()
-            if row:
-                logger.debug(f"Song found in database: {title}")
-                return Song(title=row[1], url=row[2], path=row[3], duration=row[4])
+    async def cog_load(self) -> None:
+        # Abre la conexión compartida y aplica las migraciones pendientes
+        await self.db.open()
+        self.logger.info("✅ Database opened and schema migrated.")
+        # yt-dlp se importa en segundo plano para que el primer comando no lo espere
+        self.extractor.warm_up()
+        # Con varios workers compartiendo la base de datos, solo uno reanuda las descargas
+        if getattr(self.bot, "cluster_id", 0) == 0:
+            await self.downloads.resume()
+        # Cada worker restaura los reproductores de sus propios servidores
+        self._restore_task = asyncio.create_task(self.restore_players())
+        self.ffmpeg.start()
+        self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+
+    def _player(self, guild_id: int, player_type: Type[PlayerT], *args: Any) -> PlayerT:
+        existing = self.players.get(guild_id)
+        if existing is not None and type(existing) is not player_type:
+            # El reproductor sustituido no debe seguir escribiendo en el log del guild
+            existing.on_change = None
+            self.queue_store.detach(guild_id, existing.queue)
+            # La conexión de voz sigue viva para el nuevo reproductor: cerrarla
+            # desconectaría la que este va a reutilizar
+            existing.voice.detach()
+        player = self.players.get_or_create(guild_id, player_type, *args)
+        if player.on_change is None:
+            player.on_change = lambda player: self._checkpoint(guild_id, player)
+            self.queue_store.attach(guild_id, player.queue)
+            self._checkpoint(guild_id, player)
+        return player
+
+    def _remove_player(self, guild_id: Optional[int]) -> bool:
+        player = self.players.get(guild_id)
+        if guild_id is None or player is None:
+            return False
+        player.on_change = None
+        self.queue_store.detach(guild_id, player.queue)
+        self.queue_store.forget(guild_id)
+        return self.players.remove(guild_id)
+
+    def _checkpoint(self, guild_id: int, player: IMusicPlayer) -> None:
+        channel = player.voice_client.channel if player.voice_client else None
+        self.queue_store.checkpoint(
+            guild_id, player.KIND, getattr(channel, "id", None), player.state.value, player.position(), player.current_song
+        )
+
+    async def _checkpoint_loop(self) -> None:
+        # La posición avanza sin que cambie nada más: se guarda cada pocos segundos
+        while True:
+            await asyncio.sleep(self.CHECKPOINT_INTERVAL)
+            for guild_id, player in self.players.items():
+                if player.state == PlayerState.PLAYING:
+                    self._checkpoint(guild_id, player)
+
+    async def restore_players(self) -> None:
+        """Tras un reinicio, vuelve a los canales de voz y sigue donde se quedó cada reproductor.
+
+        Las canciones se restauran sin su URL de stream resuelta: el reproductor
+        las vuelve a resolver cuando llega su turno."""
+        await self.bot.wait_until_ready()
+        restored = 0
+        for saved in await self.queue_store.load():
+            guild = self.bot.get_guild(saved.guild_id)
+            if guild is None:
+                # Servidor de otro worker del cluster
+                continue
+            try:
+                restored += await self._restore_player(guild, saved)
+            except Exception as e:
+                logger.exception(f"Could not restore player for guild {saved.guild_id}: {e}")
+        if restored:
+            self.logger.info(f"♻️ Restored {restored} players")
+
+    async def _restore_player(self, guild: discord.Guild, saved: SavedPlayer) -> bool:
+        if not saved.queue and saved.current is None:
+            self.queue_store.forget(guild.id)
+            return False
+        player: IMusicPlayer
+        if saved.kind == StreamMusicPlayer.KIND:
+            player = self._player(guild.id, StreamMusicPlayer, self.resolve_stream, self.ffmpeg, self.record_play)
+        else:
+            player = self._player(guild.id, DowloadedMusicPlayer, self.ffmpeg)
+        current = Song(**saved.current) if saved.current else None
+        player.restore([Song(**song) for song in saved.queue], current, saved.position)
+
+        # Un reproductor pausado o parado conserva la cola (y la posición de la
+        # canción actual) para el siguiente comando que lo arranque
+        channel = guild.get_channel(saved.channel_id) if saved.channel_id else None
+        if saved.state != PlayerState.PLAYING.value or not isinstance(channel, discord.VoiceChannel):
+            return True
+        await player.connect(channel)
+        player.play()
+        logger.info(f"Resumed playback in guild {guild.id} at {saved.position:.0f}s")
+        return True
+
+    @staticmethod
+    def entry_url(entry: dict) -> Optional[str]:
+        # Las entradas planas de YouTube a veces traen solo el ID del vídeo
+        url = entry.get("webpage_url") or entry.get("url")
+        if url and not url.startswith("http") and entry.get("ie_key") == "Youtube":
+            url = f"https://www.youtube.com/watch?v={url}"
+        return url
+
+    @staticmethod
+    def caller_voice_channel(interaction: discord.Interaction) -> Optional[discord.VoiceChannel]:
+        # El estado de voz sale de la caché de voice_states del servidor, así que
+        # no hace falta tener al miembro en caché ni el intent de miembros
+        voice = getattr(interaction.user, "voice", None)
+        channel = voice.channel if voice else None
+        return channel if isinstance(channel, discord.VoiceChannel) else None
+
+    async def get_song(self, title: str) -> Optional[Song]:
+        row = await self.db.fetchone("SELECT * FROM fav WHERE title = ?", (title,))
+        if row:
+            logger.debug(f"Song found in database: {title}")
+            loudness = Loudness(row["loudness"], row["peak"]) if row["loudness"] is not None else None
+            return Song(
+                title=row["title"], url=row["url"], path=row["path"], duration=row["duration"],
+                gain=loudness.gain() if loudness else 1.0
+            )
         logger.debug(f"Song not found in database: {title}")
         return None
 
+    async def resolve_url(self, url: str, guild_id: Optional[int] = None, expires_at: Optional[datetime] = None) -> Optional[Song]:
+        # Preferir Opus para poder reproducirlo sin recodificar
+        ydl_opts = {"format": "bestaudio[acodec=opus]/bestaudio/best", "quiet": True}
+
+        async def resolve() -> Optional[Song]:
+            info = await self.extractor.extract(url, ydl_opts, guild_id=guild_id, expires_at=expires_at)
+            if not info or 'url' not in info or 'title' not in info or 'duration' not in info:
+                return None
+            return Song(
+                title=info['title'], url = info['url'], path = None, duration = info.get('duration', 0),
+                webpage_url=info.get('webpage_url', url), codec=info.get('acodec')
+            )
+
+        return await self.stream_cache.get_or_load(video_key(url), resolve, lambda song: stream_expiry(song.url))
+
+    def record_play(self, song: Song) -> None:
+        if not song.webpage_url:
+            return
+        extractor_key, _, video_id = video_key(song.webpage_url).partition(":")
+        if not video_id:
+            return
+        task = asyncio.create_task(self._record_play(extractor_key, video_id, song.webpage_url))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _record_play(self, extractor_key: str, video_id: str, url: str) -> None:
+        try:
+            await self.audio_cache.record_play(extractor_key, video_id, url)
+        except Exception as e:
+            logger.warning(f"Could not record play of {extractor_key}:{video_id}: {e}")
+
+    async def resolve_stream(self, song: Song) -> Song:
+        # Las URLs de googlevideo caducan: se vuelve a resolver desde la página
+        # del vídeo (la caché devuelve la misma si aún es válida)
+        if not song.webpage_url:
+            return song
+        # Las canciones más escuchadas se sirven desde la caché en disco
+        extractor_key, _, video_id = video_key(song.webpage_url).partition(":")
+        if video_id:
+            entry = await self.audio_cache.lookup(extractor_key, video_id)
+            if entry:
+                return Song(
+                    title=song.title, url=song.webpage_url, path=entry.path,
+                    duration=entry.duration or song.duration, webpage_url=song.webpage_url
+                )
+        resolved = await self.resolve_url(song.webpage_url)
+        if not resolved:
+            raise ExtractionError(f"No se pudo resolver {song.webpage_url}")
+        return resolved
+
     # Grupos de comandos
     music_group = discord.app_commands.Group(name="music", description="Music commands")
     fav_group = discord.app_commands.Group(name="fav", description="Favorite songs commands", parent=music_group)
@@ -364,40 +959,44 @@ class MusicCog(commands.Cog):
 
     @music_group.command(name="pause", description="Pause the current song")
     async def music_pause(self, interaction: discord.Interaction) -> None:
-        if not self.music_player:
+        player = self.players.get(interaction.guild_id)
+        if not player:
             await interaction.response.send_message("❌ Reproductor no activo", ephemeral=True)
             return
         
-        self.music_player.pause()
+        player.pause()
         await interaction.response.send_message("⏸️ Canción pausada.", ephemeral=True)
         logger.info("Paused song via command")
 
     @music_group.command(name="resume", description="Resume the paused song")
     async def music_resume(self, interaction: discord.Interaction) -> None:
-        if not self.music_player:
+        player = self.players.get(interaction.guild_id)
+        if not player:
             await interaction.response.send_message("❌ Reproductor no activo", ephemeral=True)
             return
-        self.music_player.resume()
+        player.resume()
         await interaction.response.send_message("▶️ Canción resumida.", ephemeral=True)
         logger.info("Resumed song via command")
 
     @music_group.command(name="stop", description="Stop the current song")
     async def music_stop(self, interaction: discord.Interaction) -> None:
-        if not self.music_player:
+        player = self.players.get(interaction.guild_id)
+        if not player:
             await interaction.response.send_message("❌ Reproductor no activo", ephemeral=True)
             return
         
-        self.music_player.stop()
+        player.stop()
         await interaction.response.send_message("⏹️ Canción detenida.", ephemeral=True)
         logger.info("Stopped song via command")
 
     @music_group.command(name="skip", description="Skip the current song")
     async def music_skip(self, interaction: discord.Interaction) -> None:
-        if not self.music_player:
+        player = self.players.get(interaction.guild_id)
+        if not player:
             await interaction.response.send_message("❌ Reproductor no activo", ephemeral=True)
             return
         
-        self.music_player.skip()
+        player.skip()
         await interaction.response.send_message("⏭️ Canción saltada.", ephemeral=True)
         logger.info("Skipped song via command")
 
@@ -406,33 +1005,51 @@ class MusicCog(commands.Cog):
         MAX = 100
         MIN = 0
         volume_01 = max(MIN, min(MAX, volume)) / 100
-        if not self.music_player:
+        player = self.players.get(interaction.guild_id)
+        if not player:
             await interaction.response.send_message("❌ Reproductor no activo", ephemeral=True)
             return
         
-        self.music_player.set_volume(volume_01)
+        player.set_volume(volume_01)
         await interaction.response.send_message(f"🔊 Volumen ajustado a {volume}%.", ephemeral=True)
         logger.info(f"Set volume to {volume}% via command")
         
     @music_group.command(name="leave", description="Leave the voice channel")
     async def music_leave(self, interaction: discord.Interaction) -> None:
-        if not self.music_player:
+        player = self.players.get(interaction.guild_id)
+        if not player:
             await interaction.response.send_message("❌ Reproductor no activo", ephemeral=True)
             return
         
-        self.music_player.destroy()
+        self._remove_player(interaction.guild_id)
         await interaction.response.send_message("👋 Saliendo del canal de voz.", ephemeral=True)
         logger.info("Left voice channel via command")
         
         
+    @music_group.command(name="cache", description="Show search and stream cache statistics")
+    async def music_cache(self, interaction: discord.Interaction) -> None:
+        lines = []
+        for name, cache in (("Búsquedas", self.search_cache), ("Streams", self.stream_cache)):
+            stats = cache.stats()
+            lookups = stats["hits"] + stats["misses"]
+            hit_rate = stats["hits"] / lookups * 100 if lookups else 0.0
+            lines.append(
+                f"{name}: {stats['entries']}/{stats['max_entries']} entradas, "
+                f"{stats['hits']} aciertos, {stats['misses']} fallos, "
+                f"{stats['coalesced']} agrupadas ({hit_rate:.0f}% aciertos)"
+            )
+        await interaction.response.send_message("🗃️ " + "\n".join(lines), ephemeral=True)
+
     @fav_group.command(name="play", description="Play a favorite song")
-    async def fav_play(self, interaction: discord.Interaction) -> None:
-        # Obtener canciones favoritas de la base de datos
-        titles: List[str] = []
-        with sqlite3.connect(self.DB_PATH) as conn:
-            cursor = conn.execute("SELECT title FROM fav")
-            for row in cursor:
-                titles.append(row[0])
+    @discord.app_commands.describe(title="Título de la canción favorita")
+    async def fav_play(self, interaction: discord.Interaction, title: Optional[str] = None) -> None:
+        if title:
+            await interaction.response.defer(ephemeral=True)
+            await self._play_favorite(interaction, title)
+            return
+
+        # Sin título: menú con los primeros favoritos (Discord admite 25 opciones)
+        titles = (await self.fav_catalog.titles())[:self.MAX_SELECT_OPTIONS]
 
         # Si no hay canciones favoritas
         if not titles:
@@ -445,7 +1062,7 @@ class MusicCog(commands.Cog):
                 super().__init__()
                 self.select = discord.ui.Select(
                     placeholder="Selecciona una canción favorita",
-                    options=[discord.SelectOption(label=title, value=title) for title in options]
+                    options=[discord.SelectOption(label=title[:100], value=title[:100]) for title in options]
                 )
                 self.select.callback = self.select_callback
                 self.callback = callback
@@ -457,82 +1074,173 @@ class MusicCog(commands.Cog):
                     await interaction.response.defer(ephemeral=True)
                     await self.callback(interaction, selected_value)
 
-        async def on_title_selected(interaction: discord.Interaction, title: str) -> None:
-            song = self.get_song(title)
-            if not self.music_player:
-                    self.music_player = DowloadedMusicPlayer()
-                    
-            if not song:
-                await interaction.followup.send("❌ No se encontró la canción seleccionada.", ephemeral=True)
-                return
-            
-            await interaction.followup.send(f"🎵 Reproduciendo: {title}", ephemeral=True)
-            if interaction.guild is None:
-                await interaction.followup.send("❌ No estás en un servidor.", ephemeral=True)
-                return
-            
-            member = interaction.guild.get_member(interaction.user.id)
-            if member is None or member.voice is None or member.voice.channel is None or not isinstance(member.voice.channel, discord.VoiceChannel):
-                await interaction.followup.send("❌ No estás en un canal de voz.", ephemeral=True)
-                return
-            await self.music_player.connect(member.voice.channel)
+        await interaction.response.send_message("🎶 Aquí están las canciones favoritas:", view=favMenu(titles, self._play_favorite), ephemeral=True)
 
-            self.music_player.add_to_queue(song)
-            self.music_player.play()
-            logger.info(f"Playing favorite song: {title}")
+    @fav_play.autocomplete("title")
+    async def fav_play_title_autocomplete(self, interaction: discord.Interaction, current: str) -> List[discord.app_commands.Choice[str]]:
+        titles = await self.fav_catalog.search(current, limit=self.MAX_SELECT_OPTIONS)
+        return [discord.app_commands.Choice(name=title[:100], value=title[:100]) for title in titles]
 
-        await interaction.response.send_message("🎶 Aquí están las canciones favoritas:", view=favMenu(titles, on_title_selected), ephemeral=True)
+    async def _play_favorite(self, interaction: discord.Interaction, title: str) -> None:
+        song = await self.get_song(title)
+        if not song:
+            # Texto libre o título truncado a 100 caracteres: mejor coincidencia del índice
+            matches = await self.fav_catalog.search(title, limit=1)
+            song = await self.get_song(matches[0]) if matches else None
+        if not song:
+            await interaction.followup.send("❌ No se encontró la canción seleccionada.", ephemeral=True)
+            return
+        
+        await interaction.followup.send(f"🎵 Reproduciendo: {song.title}", ephemeral=True)
+        if interaction.guild is None:
+            await interaction.followup.send("❌ No estás en un servidor.", ephemeral=True)
+            return
+        
+        voice_channel = self.caller_voice_channel(interaction)
+        if voice_channel is None:
+            await interaction.followup.send("❌ No estás en un canal de voz.", ephemeral=True)
+            return
+        if not self.ffmpeg.has_capacity():
+            await interaction.followup.send(self.OVERLOADED_MESSAGE, ephemeral=True)
+            return
+        player = self._player(interaction.guild.id, DowloadedMusicPlayer, self.ffmpeg)
+        try:
+            await player.connect(voice_channel)
+        except VoiceConnectionError:
+            await interaction.followup.send(self.VOICE_ERROR_MESSAGE, ephemeral=True)
+            return
+
+        player.add_to_queue(song)
+        player.play()
+        logger.info(f"Playing favorite song: {song.title}")
 
     @fav_group.command(name="add", description="Add a song to the fav")
     async def fav_add(self, interaction: discord.Interaction, title: str, url: str) -> None:
         # Enviar una respuesta diferida
         await interaction.response.defer(ephemeral=True)
 
-        # Buscar si la canción ya está en la base de datos
-        with sqlite3.connect(self.DB_PATH) as conn:
-            cursor = conn.execute("SELECT * FROM fav WHERE title = ?", (title,))
-            if cursor.fetchone():
-                await interaction.followup.send("❌ Ya tienes una canción favorita en la base de datos.", ephemeral=True)
-                return
-        # Descargar la canción
-        path = os.path.join(self.LIBRARY_DIR, title)
-        if not path.endswith(".mp3"):
-            path += ".mp3"
-
-        duration = 0
-
-        try: 
-            ydl_opts = {
-                "format": "bestaudio/best",
-                # FIXME: Esto es feo de pelotas, pero el cachondo de yt_dlp pone la extensión al final del path
-                # así que si ya la tiene, se la quitamos. Porque si no, se descarga como "cancion.mp3.mp3"
-                "outtmpl": path if not path.endswith(".mp3") else path[:-4], 
-                "postprocessors": [{
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": "mp3",
-                    "preferredquality": "192",
-                }],
-            }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                if info: 
-                    duration = info.get("duration", 0)
+        # Buscar si la canción ya está en la base de datos o pendiente de descarga
+        if await self.db.fetchone("SELECT 1 FROM fav WHERE title = ? UNION SELECT 1 FROM download_favs WHERE title = ?", (title, title)):
+            await interaction.followup.send("❌ Ya tienes una canción favorita en la base de datos.", ephemeral=True)
+            return
+        # Identificar el vídeo sin descargarlo: si ya está en la biblioteca se reutiliza
+        try:
+            probe = await self.extractor.extract(
+                url, {"quiet": True, "noplaylist": True}, guild_id=interaction.guild_id,
+                process=False, expires_at=interaction.expires_at
+            )
         except Exception as e:
             self.logger.error(f"❌ Error al descargar la canción: {e}")
             await interaction.followup.send(f"❌ Error al descargar la canción: {e}", ephemeral=True)
             return
-        
-        # Insertar la canción en la base de datos
-        try: 
-            with sqlite3.connect(self.DB_PATH) as conn:
-                conn.execute("INSERT INTO fav (title, url, path, duration) VALUES (?, ?, ?, ?)", (title, url, path, duration))
+        if not probe or "id" not in probe:
+            await interaction.followup.send("❌ No se encontró la canción en la URL indicada.", ephemeral=True)
+            return
+        extractor_key = probe.get("extractor_key") or probe.get("ie_key") or "generic"
+        video_id = probe["id"]
+
+        entry = await self.library.lookup(extractor_key, video_id)
+        if entry is not None:
+            self.logger.info(f"♻️ {extractor_key}:{video_id} ya está en la biblioteca: {entry.path}")
+            try: 
+                await self.save_favorite(title, url, entry)
+            except Exception as e:
+                self.logger.error(f"❌ Error al añadir la canción a la base de datos: {e}")
+                await interaction.followup.send(f"❌ Error al añadir la canción a la base de datos: {e}", ephemeral=True)
+                return
+            await interaction.followup.send("✅ Canción favorita añadida correctamente.", ephemeral=True)
+            return
+
+        # Descargar la canción en segundo plano; el mensaje muestra el progreso
+        message = await interaction.followup.send("⏳ En cola para descargar...", ephemeral=True, wait=True)
+        try:
+            await self.downloads.submit(extractor_key, video_id, url, title, message)
         except Exception as e:
+            # P. ej. otro /music fav add con el mismo título mientras se identificaba el vídeo
             self.logger.error(f"❌ Error al añadir la canción a la base de datos: {e}")
-            await interaction.followup.send(f"❌ Error al añadir la canción a la base de datos: {e}", ephemeral=True)
-            return
+            await message.edit(content=f"❌ Error al añadir la canción a la base de datos: {e}")
 
+    async def save_favorite(self, title: str, url: str, entry: LibraryEntry) -> None:
+        # Medir la sonoridad una sola vez por fichero para normalizar al reproducir
+        loudness = await self.get_loudness(entry.path)
+        
+        # Insertar la canción en la base de datos
+        await self.db.execute(
+            "INSERT INTO fav (title, url, path, duration, library_id, loudness, peak) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (title, url, entry.path, entry.duration, entry.id,
+             loudness.integrated if loudness else None, loudness.peak if loudness else None)
+        )
+        self.fav_catalog.invalidate()
         self.logger.info(f"✅ Canción favorita añadida: {title}")
-        await interaction.followup.send("✅ Canción favorita añadida correctamente.", ephemeral=True)
+
+    async def _on_download_complete(self, job: DownloadJob, entry: LibraryEntry) -> None:
+        failed = []
+        for title, url in job.requests:
+            try:
+                await self.save_favorite(title, url, entry)
+            except Exception as e:
+                self.logger.error(f"❌ Error al añadir la canción a la base de datos: {e}")
+                failed.append(title)
+        await self.audio_cache.enforce_quota()
+        for message in job.messages:
+            try:
+                if failed:
+                    await message.edit(content=f"❌ Error al añadir a la base de datos: {', '.join(failed)}")
+                else:
+                    await message.edit(content="✅ Canción favorita añadida correctamente.")
+            except discord.HTTPException:
+                pass
+
+    async def get_loudness(self, path: str) -> Optional[Loudness]:
+        # Otro favorito que comparte el fichero ya lo tiene medido
+        row = await self.db.fetchone(
+            "SELECT loudness, peak FROM fav WHERE path = ? AND loudness IS NOT NULL LIMIT 1", (path,)
+        )
+        if row:
+            return Loudness(row["loudness"], row["peak"])
+        return await measure_loudness(path)
+
+    @fav_group.command(name="analyze", description="Measure loudness for favorites that have not been analyzed")
+    async def fav_analyze(self, interaction: discord.Interaction) -> None:
+        await interaction.response.defer(ephemeral=True)
+        rows = await self.db.fetchall("SELECT DISTINCT path FROM fav WHERE loudness IS NULL")
+        if not rows:
+            await interaction.followup.send("✅ Todas las canciones favoritas están analizadas.", ephemeral=True)
+            return
+
+        message = await interaction.followup.send(f"📊 Analizando {len(rows)} canciones...", ephemeral=True, wait=True)
+        analyzed = failed = 0
+        for row in rows:
+            path = row["path"]
+            loudness = await measure_loudness(path) if os.path.exists(path) else None
+            if loudness:
+                await self.db.execute(
+                    "UPDATE fav SET loudness = ?, peak = ? WHERE path = ?", (loudness.integrated, loudness.peak, path)
+                )
+                analyzed += 1
+            else:
+                failed += 1
+            if (analyzed + failed) % 10 == 0:
+                await message.edit(content=f"📊 Analizando... {analyzed + failed}/{len(rows)}")
+
+        await message.edit(content=f"✅ Análisis completado: {analyzed} analizadas, {failed} con errores.")
+        self.logger.info(f"Loudness backfill: {analyzed} analyzed, {failed} failed")
+
+    @fav_group.command(name="check", description="Check the favorites library for missing or orphaned files")
+    @discord.app_commands.describe(scan="Recorrer también el disco buscando ficheros huérfanos (lento)")
+    async def fav_check(self, interaction: discord.Interaction, scan: bool = False) -> None:
+        await interaction.response.defer(ephemeral=True)
+        report = await self.library.check(scan=scan)
+        orphaned = str(len(report.orphaned)) if report.scanned else "sin comprobar (usa `scan`)"
+        lines = [
+            f"❓ Ficheros perdidos: {len(report.missing)}",
+            f"🗑️ Ficheros huérfanos: {orphaned}",
+            f"⚠️ Ficheros modificados: {len(report.changed)}",
+        ]
+        for path in (report.missing + report.orphaned + report.changed)[:10]:
+            lines.append(f"• `{path}`")
+        await interaction.followup.send("\n".join(lines), ephemeral=True)
+        self.logger.info(f"Library check: {len(report.missing)} missing, {len(report.orphaned)} orphaned, {len(report.changed)} changed")
 
     @music_group.command(name="search", description="Play a song")
     async def music_search(self, interaction: discord.Interaction, query: str) -> None:
@@ -543,9 +1251,10 @@ class MusicCog(commands.Cog):
         # Enviar una respuesta diferida
         await interaction.response.defer(ephemeral=True)
 
-        # Buscar la canción en YouTube. Recogemos los 5 primeros resultados
+        # Buscar la canción en YouTube. Recogemos los 5 primeros resultados en
+        # plano (título, ID y duración, sin formatos): solo se resuelve el elegido
         ydl_opts = {
-            "format": "bestaudio/best",
+            "extract_flat": "in_playlist",
             "noplaylist": True,
             "quiet": True,
             "no_warnings": True,
@@ -553,167 +1262,321 @@ class MusicCog(commands.Cog):
         }
 
         TITLE_KEY = "title"
-        URL_KEY = "webpage_url"
         DURATION_KEY = "duration"
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            await interaction.followup.send("🔍 Buscando...", ephemeral=True)
-            loop = asyncio.get_event_loop()
+        await interaction.followup.send("🔍 Buscando...", ephemeral=True)
+
+        async def load_results() -> Optional[List[Song]]:
+            info = await self.extractor.extract(
+                f"ytsearch{MAX_RESULTS}:{query}", ydl_opts,
+                guild_id=interaction.guild_id, expires_at=interaction.expires_at
+            )
+            if not info:
+                return None
+
+            songs = []
+            entries = info.get('entries', [info])
+
+            for entry in entries:
+                url = self.entry_url(entry) if entry else None
+                if not url or not entry.get(TITLE_KEY) or not entry.get(DURATION_KEY):
+                    continue
+
+                duration = int(entry[DURATION_KEY])
+                if duration > MAX_DURATION:
+                    continue
+
+                songs.append(Song(
+                    title=entry[TITLE_KEY],
+                    url=url,
+                    path=None,
+                    duration=duration,
+                    webpage_url=url
+                ))
+                logger.debug(f"🎵 Canción encontrada: {entry[TITLE_KEY]} [{url}]")
+            return songs
+
+        try:
+            songs = await self.search_cache.get_or_load(normalize_query(query), load_results)
+            if songs is None:
+                await interaction.followup.send("❌ No se encontraron resultados.", ephemeral=True)
+                return
+
+            if not songs:
+                await interaction.followup.send("❌ No se encontraron canciones válidas.", ephemeral=True)
+                return
+
+            # Crear el menú interactivo con un Select
+            class SearchMenu(discord.ui.View):
+                def __init__(self, songs: List[Song], callback: Callable[[discord.Interaction, str, List[Song]], Coroutine[Any, Any, None]]) -> None:
+                    super().__init__(timeout=TIMEOUT)
+                    self.select = discord.ui.Select(
+                        placeholder="Selecciona una canción",
+                        options=[discord.SelectOption(
+                            label=f"{option.title[:80]}...", 
+                            value=f"{option.title}_{i}",
+                            description=f"Duración: {option.duration//60:02d}:{option.duration%60:02d}"
+                        ) for i, option in enumerate(songs)]
+                    )
+                    self.select.callback = self.select_callback
+                    self.callback = callback
+                    self.songs = songs
+                    self.add_item(self.select)
+
+                async def select_callback(self, interaction: discord.Interaction) -> None:
+                    if not self.select.values:
+                        await interaction.response.send_message("❌ No se seleccionó ninguna canción.", ephemeral=True)
+                        return
+                        
+                    selected_value = self.select.values[0]
+                    title = selected_value.rsplit('_', 1)[0]
+                    await interaction.response.defer(ephemeral=True)
+                    await self.callback(interaction, title, self.songs)
+
+        except ExtractionError as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
+        except Exception as e:
+            logger.error(f"Error al buscar canciones: {e}")
+            await interaction.followup.send("❌ Ocurrió un error al buscar canciones.", ephemeral=True)
+            return
+
+        async def on_song_selected(interaction: discord.Interaction, title: str, songs: List[Song]) -> None:
+            song = next((song for song in songs if song.title == title), None)
+            if not song:
+                await interaction.followup.send("❌ No se encontró la canción seleccionada.", ephemeral=True)
+                return
+
+            # Solo ahora se resuelven los formatos, y solo los de la canción elegida
             try:
-                info = await loop.run_in_executor(None, lambda: ydl.extract_info(f"ytsearch{MAX_RESULTS}:{query}", download=False))
-                if not info:
-                    await interaction.followup.send("❌ No se encontraron resultados.", ephemeral=True)
-                    return
-
-                songs = []
-                entries = info.get('entries', [info])
-
-                for entry in entries:
-                    if not all(key in entry for key in [TITLE_KEY, URL_KEY, DURATION_KEY]):
-                        continue
-
-                    duration = entry[DURATION_KEY]
-                    if duration > MAX_DURATION:
-                        continue
-
-                    songs.append(Song(
-                        title=entry[TITLE_KEY],
-                        url=entry[URL_KEY],
-                        path=None,
-                        duration=duration
-                    ))
-                    logger.debug(f"🎵 Canción encontrada: {entry[TITLE_KEY]} [{entry[URL_KEY]}]")
-
-                if not songs:
-                    await interaction.followup.send("❌ No se encontraron canciones válidas.", ephemeral=True)
-                    return
-
-                # Crear el menú interactivo con un Select
-                class SearchMenu(discord.ui.View):
-                    def __init__(self, songs: List[Song], callback: Callable[[discord.Interaction, str, List[Song]], Coroutine[Any, Any, None]]) -> None:
-                        super().__init__(timeout=TIMEOUT)
-                        self.select = discord.ui.Select(
-                            placeholder="Selecciona una canción",
-                            options=[discord.SelectOption(
-                                label=f"{option.title[:80]}...", 
-                                value=f"{option.title}_{i}",
-                                description=f"Duración: {option.duration//60:02d}:{option.duration%60:02d}"
-                            ) for i, option in enumerate(songs)]
-                        )
-                        self.select.callback = self.select_callback
-                        self.callback = callback
-                        self.songs = songs
-                        self.add_item(self.select)
-
-                    async def select_callback(self, interaction: discord.Interaction) -> None:
-                        if not self.select.values:
-                            await interaction.response.send_message("❌ No se seleccionó ninguna canción.", ephemeral=True)
-                            return
-                            
-                        selected_value = self.select.values[0]
-                        title = selected_value.rsplit('_', 1)[0]
-                        await interaction.response.defer(ephemeral=True)
-                        await self.callback(interaction, title, self.songs)
+                resolved = await self.resolve_url(song.url, guild_id=interaction.guild_id, expires_at=interaction.expires_at)
+            except ExtractionError as e:
+                await interaction.followup.send(f"❌ {e}", ephemeral=True)
+                return
+            if not resolved:
+                await interaction.followup.send("❌ No se encontró la URL de la canción.", ephemeral=True)
+                return
+            song = resolved
 
-            except Exception as e:
-                logger.error(f"Error al buscar canciones: {e}")
-                await interaction.followup.send("❌ Ocurrió un error al buscar canciones.", ephemeral=True)
-
-            async def on_song_selected(interaction: discord.Interaction, title: str, songs: List[Song]) -> None:
-                song = next((song for song in songs if song.title == title), None)
-                if not song:
-                    await interaction.followup.send("❌ No se encontró la canción seleccionada.", ephemeral=True)
-                    return
-
-                if not self.music_player or not isinstance(self.music_player, StreamMusicPlayer):
-                    self.music_player = StreamMusicPlayer()
-
-                await interaction.followup.send(f"🎵 Reproduciendo: {title}", ephemeral=True)
-                if interaction.guild is None:
-                    await interaction.followup.send("❌ No estás en un servidor.", ephemeral=True)
-                    return
-                
-                member = interaction.guild.get_member(interaction.user.id)
-                if member is None or member.voice is None or member.voice.channel is None or not isinstance(member.voice.channel, discord.VoiceChannel):
-                    await interaction.followup.send("❌ No estás en un canal de voz.", ephemeral=True)
-                    return
-                await self.music_player.connect(member.voice.channel)
-
-                # Añadir la canción a la cola
-                self.music_player.add_to_queue(song)
-
-                # Si no se está reproduciendo, reproducir
-                if self.music_player.state != PlayerState.PLAYING:
-                    self.music_player.play()
-                    logger.info(f"Playing song: {title}")
-
-            await interaction.followup.send("🎶 Aquí están los resultados:", view=SearchMenu(songs, on_song_selected), ephemeral=True)
+            await interaction.followup.send(f"🎵 Reproduciendo: {title}", ephemeral=True)
+            if interaction.guild is None:
+                await interaction.followup.send("❌ No estás en un servidor.", ephemeral=True)
+                return
+            
+            voice_channel = self.caller_voice_channel(interaction)
+            if voice_channel is None:
+                await interaction.followup.send("❌ No estás en un canal de voz.", ephemeral=True)
+                return
+            player = self._player(interaction.guild.id, StreamMusicPlayer, self.resolve_stream, self.ffmpeg, self.record_play)
+            if player.state != PlayerState.PLAYING and not self.ffmpeg.has_capacity():
+                await interaction.followup.send(self.OVERLOADED_MESSAGE, ephemeral=True)
+                return
+            try:
+                await player.connect(voice_channel)
+            except VoiceConnectionError:
+                await interaction.followup.send(self.VOICE_ERROR_MESSAGE, ephemeral=True)
+                return
+
+            # Añadir la canción a la cola
+            player.add_to_queue(song)
+
+            # Si no se está reproduciendo, reproducir
+            if player.state != PlayerState.PLAYING:
+                player.play()
+                logger.info(f"Playing song: {title}")
+
+        await interaction.followup.send("🎶 Aquí están los resultados:", view=SearchMenu(songs, on_song_selected), ephemeral=True)
             
     @music_group.command(name="stream", description="Reproduce una canción en streaming")
     async def music_stream(self, interaction: discord.Interaction, url: str) -> None:
         await interaction.response.defer(ephemeral=True)
         
-        if not self.music_player or not isinstance(self.music_player, StreamMusicPlayer):
-            self.music_player = StreamMusicPlayer()
+        if interaction.guild is None:
+            await interaction.followup.send("❌ No estás en un servidor.", ephemeral=True)
+            return
+        player = self._player(interaction.guild.id, StreamMusicPlayer, self.resolve_stream, self.ffmpeg, self.record_play)
         
-        ydl_opts = {"format": "bestaudio/best", "quiet": True}
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            if not info or 'url' not in info or 'title' not in info or 'duration' not in info:
-                await interaction.followup.send("❌ No se encontró la URL de la canción.", ephemeral=True)
+        try:
+            song = await self.resolve_url(url, guild_id=interaction.guild_id, expires_at=interaction.expires_at)
+        except ExtractionError as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
+        if not song:
+            await interaction.followup.send("❌ No se encontró la URL de la canción.", ephemeral=True)
+            return
+        
+        player.add_to_queue(song)
+        
+        if player.state != PlayerState.PLAYING:
+            voice_channel = self.caller_voice_channel(interaction)
+            if voice_channel is None:
+                await interaction.followup.send("❌ No estás en un canal de voz.", ephemeral=True)
                 return
-            
-            song = Song(title=info['title'], url = info['url'], path = None, duration = info.get('duration', 0))
-            self.music_player.add_to_queue(song)
-            
-            if self.music_player.state != PlayerState.PLAYING:
-                if interaction.guild is None:
-                    await interaction.followup.send("❌ No estás en un servidor.", ephemeral=True)
-                    return
-                
-                member = interaction.guild.get_member(interaction.user.id)
-                if member is None or member.voice is None or member.voice.channel is None or not isinstance(member.voice.channel, discord.VoiceChannel):
-                    await interaction.followup.send("❌ No estás en un canal de voz.", ephemeral=True)
-                    return
-                await self.music_player.connect(member.voice.channel)
-                self.music_player.play()
-                await interaction.followup.send(f"🎵 Reproduciendo {song.title}", ephemeral=True)
-                logger.info(f"Playing song from URL: {url}")
-            else: 
-                await interaction.followup.send("🎵 Canción añadida a la cola.", ephemeral=True)
-                logger.info(f"Added song to queue from URL: {url}")
+            if not self.ffmpeg.has_capacity():
+                # La canción queda en la cola para cuando haya sitio
+                await interaction.followup.send(self.OVERLOADED_MESSAGE, ephemeral=True)
+                return
+            try:
+                await player.connect(voice_channel)
+            except VoiceConnectionError:
+                await interaction.followup.send(self.VOICE_ERROR_MESSAGE, ephemeral=True)
+                return
+            player.play()
+            await interaction.followup.send(f"🎵 Reproduciendo {song.title}", ephemeral=True)
+            logger.info(f"Playing song from URL: {url}")
+        else: 
+            await interaction.followup.send("🎵 Canción añadida a la cola.", ephemeral=True)
+            logger.info(f"Added song to queue from URL: {url}")
     
     
+    @music_group.command(name="playlist", description="Reproduce una lista de reproducción o mix en streaming")
+    async def music_playlist(self, interaction: discord.Interaction, url: str) -> None:
+        await interaction.response.defer(ephemeral=True)
+
+        if interaction.guild is None:
+            await interaction.followup.send("❌ No estás en un servidor.", ephemeral=True)
+            return
+        voice_channel = self.caller_voice_channel(interaction)
+        if voice_channel is None:
+            await interaction.followup.send("❌ No estás en un canal de voz.", ephemeral=True)
+            return
+        player = self._player(interaction.guild.id, StreamMusicPlayer, self.resolve_stream, self.ffmpeg, self.record_play)
+        if player.state != PlayerState.PLAYING and not self.ffmpeg.has_capacity():
+            await interaction.followup.send(self.OVERLOADED_MESSAGE, ephemeral=True)
+            return
+
+        # Las entradas llegan planas (título, ID, duración) según se listan; cada
+        # URL de stream la resuelve el reproductor cuando se acerca al principio de la cola
+        added = 0
+        try:
+            async for entry in self.extractor.iter_entries(
+                url, {"quiet": True, "ignoreerrors": True}, guild_id=interaction.guild.id,
+                limit=self.MAX_PLAYLIST_ENTRIES, timeout=self.PLAYLIST_TIMEOUT, expires_at=interaction.expires_at
+            ):
+                entry_url = self.entry_url(entry)
+                if not entry_url:
+                    continue
+                player.add_to_queue(Song(
+                    title=entry.get("title") or entry_url, url=entry_url, path=None,
+                    duration=int(entry.get("duration") or 0), webpage_url=entry_url
+                ))
+                added += 1
+
+                # La primera canción empieza a sonar mientras se lista el resto
+                if added == 1 and player.state != PlayerState.PLAYING:
+                    try:
+                        await player.connect(voice_channel)
+                    except VoiceConnectionError:
+                        await interaction.followup.send(self.VOICE_ERROR_MESSAGE, ephemeral=True)
+                        return
+                    player.play()
+                    await interaction.followup.send(f"🎵 Reproduciendo {entry.get('title') or entry_url}. Cargando el resto de la lista...", ephemeral=True)
+        except ExtractionError as e:
+            await interaction.followup.send(f"❌ {e} ({added} canciones añadidas)", ephemeral=True)
+            return
+
+        if not added:
+            await interaction.followup.send("❌ No se encontraron canciones en la lista.", ephemeral=True)
+            return
+        await interaction.followup.send(f"✅ {added} canciones añadidas a la cola.", ephemeral=True)
+        logger.info(f"Imported {added} songs from playlist: {url}")
+
     @queue_group.command(name="list", description="List the songs in the queue")
     async def queue_list(self, interaction: discord.Interaction) -> None:
-        if not self.music_player:
+        player = self.players.get(interaction.guild_id)
+        if not player:
             await interaction.response.send_message("❌ Reproductor no activo", ephemeral=True)
             return
-        q = self.music_player.get_queue()
-        if not q or len(q) == 0:
+        if not player.queue:
             await interaction.response.send_message("❌ La cola está vacía.", ephemeral=True)
             return
 
-        songs = [f"{index + 1}. {song.title}" for index, song in enumerate(q)]
-        await interaction.response.send_message(f"🎵 Canciones en la cola:\n" + "\n".join(songs), ephemeral=True)
+        view = QueueView(player)
+        await interaction.response.send_message(view.render(), view=view, ephemeral=True)
         logger.info("Listed queue via command")
     
     @queue_group.command(name="remove", description="Remove a song from the queue")
     async def queue_rm(self, interaction: discord.Interaction, index: int) -> None:
-        if not self.music_player:
+        player = self.players.get(interaction.guild_id)
+        if not player:
             await interaction.response.send_message("❌ Reproductor no activo", ephemeral=True)
             return
         
-        song = self.music_player.remove_from_queue(index - 1)
+        song = player.remove_from_queue(index - 1)
         if not song:
             await interaction.response.send_message("❌ No se encontró la canción en la cola.", ephemeral=True)
             return
 
         await interaction.response.send_message(f"✅ Canción eliminada de la cola: {song.title}", ephemeral=True)
         logger.info(f"Removed song from queue via command: {song.title}")
-    
+
+    @queue_group.command(name="move", description="Move a song to another position in the queue")
+    async def queue_move(self, interaction: discord.Interaction, index: int, position: int) -> None:
+        player = self.players.get(interaction.guild_id)
+        if not player:
+            await interaction.response.send_message("❌ Reproductor no activo", ephemeral=True)
+            return
+
+        song = player.move_in_queue(index - 1, position - 1)
+        if not song:
+            await interaction.response.send_message("❌ No se encontró la canción en la cola.", ephemeral=True)
+            return
+
+        await interaction.response.send_message(f"↕️ {song.title} movida a la posición {max(1, min(position, len(player.queue)))}.", ephemeral=True)
+        logger.info(f"Moved song in queue via command: {song.title}")
+
+    @queue_group.command(name="next", description="Play a song right after the current one")
+    async def queue_next(self, interaction: discord.Interaction, url: str) -> None:
+        player = self.players.get(interaction.guild_id)
+        if not isinstance(player, StreamMusicPlayer):
+            await interaction.response.send_message("❌ Reproductor no activo", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            song = await self.resolve_url(url, guild_id=interaction.guild_id, expires_at=interaction.expires_at)
+        except ExtractionError as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
+        if not song:
+            await interaction.followup.send("❌ No se encontró la URL de la canción.", ephemeral=True)
+            return
+
+        player.insert_in_queue(0, song)
+        await interaction.followup.send(f"⏭️ {song.title} sonará a continuación.", ephemeral=True)
+        logger.info(f"Queued song next via command: {url}")
+
+    @queue_group.command(name="shuffle", description="Shuffle the queue")
+    async def queue_shuffle(self, interaction: discord.Interaction) -> None:
+        player = self.players.get(interaction.guild_id)
+        if not player:
+            await interaction.response.send_message("❌ Reproductor no activo", ephemeral=True)
+            return
+        if not player.queue:
+            await interaction.response.send_message("❌ La cola está vacía.", ephemeral=True)
+            return
+
+        player.shuffle_queue()
+        await interaction.response.send_message(f"🔀 Cola mezclada ({len(player.queue)} canciones).", ephemeral=True)
+        logger.info("Shuffled queue via command")
+
+    async def cog_unload(self) -> None:
+        for task in (self._restore_task, self._checkpoint_task):
+            if task:
+                task.cancel()
+        # Se guarda el estado antes de desconectar: al cerrar la voz, el
+        # reproductor pasaría a la siguiente canción y la sacaría de la cola
+        for guild_id, player in self.players.items():
+            self._checkpoint(guild_id, player)
+            player.on_change = None
+            self.queue_store.detach(guild_id, player.queue)
+        await self.queue_store.close()
+        self.players.destroy_all()
+        await self.ffmpeg.stop()
+        await self.downloads.shutdown()
+        self.extractor.shutdown()
+        await self.db.close()
+
     @commands.Cog.listener()
-    async def on_ready(self) -> None:
-        # Sincronizar los comandos de barra
-        await self.bot.tree.sync()
-        self.logger.info("✅ Slash commands synchronized.")
\ No newline at end of file
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self._remove_player(guild.id)
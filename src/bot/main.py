@@ -1,11 +1,71 @@
 from math import e
 import os
+import signal
 import discord
 import logging
 import asyncio
+from typing import List, Optional
 from discord.ext import commands
 from dotenv import load_dotenv
 from Botbot import Botbot
+from Cluster import ClusterSupervisor, WorkerConfig, recommended_shards
+
+def build_intents() -> discord.Intents:
+    # Los comandos de barra no necesitan mensajes, presencias ni la lista de
+    # miembros: solo servidores/canales y estados de voz (para saber dónde está
+    # quien ejecuta el comando)
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.voice_states = True
+    return intents
+
+def cache_options() -> dict:
+    # Solo se guardan en caché los miembros conectados a voz, sin pedir la lista
+    # completa al arrancar ni guardar mensajes
+    member_cache_flags = discord.MemberCacheFlags.none()
+    member_cache_flags.voice = True
+    return dict(member_cache_flags=member_cache_flags, chunk_guilds_at_startup=False, max_messages=None)
+
+async def run_bot(
+    token: str,
+    dev_guild: int,
+    metrics_host: str,
+    metrics_port: int,
+    shard_ids: Optional[List[int]] = None,
+    shard_count: Optional[int] = None,
+    cluster_id: int = 0,
+    cluster_workers: int = 1,
+) -> None:
+    bot = Botbot(
+        command_prefix="/", intents=build_intents(), **cache_options(), dev_guild=dev_guild,
+        metrics_host=metrics_host, metrics_port=metrics_port,
+        shard_ids=shard_ids, shard_count=shard_count, cluster_id=cluster_id, cluster_workers=cluster_workers
+    )
+
+    # El supervisor del cluster para los workers con SIGTERM
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+    except (NotImplementedError, RuntimeError):
+        pass
+
+    logging.info('Bot initialized')
+    try:
+        await bot.start(token)
+    finally:
+        await bot.close()
+
+def run_worker(config: WorkerConfig) -> None:
+    # Punto de entrada de cada proceso del cluster
+    discord.utils.setup_logging()
+    load_dotenv()
+    try:
+        asyncio.run(run_bot(
+            os.environ['BOT_TOKEN'], int(os.environ['DEV_GUILD']), "127.0.0.1", config.metrics_port,
+            shard_ids=config.shard_ids, shard_count=config.shard_count, cluster_id=config.cluster_id,
+            cluster_workers=config.workers
+        ))
+    except KeyboardInterrupt:
+        pass
 
 async def main():
     try:
@@ -27,18 +87,24 @@ async def main():
             exit(1)
         DEV_GUILD = int(DEV_GUILD)
 
-        # Initialize the bot with a command prefix
-        intents = discord.Intents.default()
-        intents.messages = True  # To listen to messages.
-        intents.message_content = True  # Required if you use Message Content Intent.
-        intents.presences = True  # For presence updates, if needed.
-        intents.members = True  # For member information.
-
-        bot = Botbot(command_prefix="/", intents=intents, dev_guild=DEV_GUILD)
+        # Puerto del servidor de métricas y health check (el que expone el Dockerfile)
+        METRICS_PORT = int(os.getenv('METRICS_PORT', '5000'))
 
-        logging.info('Bot initialized')
+        # Con CLUSTER_WORKERS > 1 los shards se reparten entre procesos; sin
+        # SHARD_COUNT se usa el número que recomienda Discord
+        CLUSTER_WORKERS = int(os.getenv('CLUSTER_WORKERS', '1'))
+        SHARD_COUNT = os.getenv('SHARD_COUNT')
 
-        await bot.start(BOT_TOKEN)
+        if CLUSTER_WORKERS > 1:
+            shard_count = int(SHARD_COUNT) if SHARD_COUNT else await recommended_shards(BOT_TOKEN)
+            supervisor = ClusterSupervisor(
+                run_worker, shard_count=max(shard_count, CLUSTER_WORKERS), workers=CLUSTER_WORKERS,
+                port=METRICS_PORT, worker_port_base=int(os.getenv('CLUSTER_WORKER_PORT_BASE', '5100'))
+            )
+            logging.info(f'Starting cluster with {len(supervisor.workers)} workers')
+            await supervisor.run()
+        else:
+            await run_bot(BOT_TOKEN, DEV_GUILD, "0.0.0.0", METRICS_PORT, shard_count=int(SHARD_COUNT) if SHARD_COUNT else None)
     except discord.LoginFailure:
         logging.critical('Invalid token')
         exit(1)
@@ -51,9 +117,8 @@ async def main():
         logging.critical(f'An error occurred: {e}')
         exit(1)
     finally:
-        await bot.close()
         logging.info('Bot shut down')
         exit(0)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
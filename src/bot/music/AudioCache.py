@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from music.Database import Database
+from music.DownloadManager import DownloadManager
+from music.Library import Library, LibraryEntry
+
+logger = logging.getLogger('music')
+
+
+class AudioCache:
+    """Caché en disco de las canciones que más se escuchan en streaming.
+
+    Cada reproducción (no las precargas) suma en `play_stats`; al pasar de `promote_after`
+    reproducciones el vídeo se descarga en segundo plano a la biblioteca y las
+    siguientes veces suena desde el fichero local. Las entradas de la biblioteca
+    que no respalda ningún favorito forman la caché: si ocupan más de `quota`
+    bytes se desalojan las menos reproducidas (y, a igualdad, las más antiguas).
+    Los favoritos nunca se desalojan.
+    """
+    PROMOTE_AFTER = 3
+    QUOTA_BYTES = 2 * 1024 ** 3
+
+    def __init__(
+        self, db: Database, library: Library, downloads: DownloadManager,
+        quota: int = QUOTA_BYTES, promote_after: int = PROMOTE_AFTER,
+    ) -> None:
+        self.db = db
+        self.library = library
+        self.downloads = downloads
+        self.quota = quota
+        self.promote_after = promote_after
+
+    async def lookup(self, extractor: str, video_id: str) -> Optional[LibraryEntry]:
+        """La entrada local del vídeo si ya está en disco. No cuenta como reproducción."""
+        return await self.library.lookup(extractor.lower(), video_id)
+
+    async def record_play(self, extractor: str, video_id: str, url: str) -> None:
+        """Anota una reproducción real y promociona el vídeo si ya se ha escuchado bastante."""
+        extractor = extractor.lower()
+        await self.db.execute(
+            "INSERT INTO play_stats (extractor, video_id, plays, last_played) VALUES (?, ?, 1, ?) "
+            "ON CONFLICT(extractor, video_id) DO UPDATE SET plays = plays + 1, last_played = excluded.last_played",
+            (extractor, video_id, time.time())
+        )
+        if await self.library.lookup(extractor, video_id) is not None:
+            return
+
+        row = await self.db.fetchone(
+            "SELECT plays FROM play_stats WHERE extractor = ? AND video_id = ?", (extractor, video_id)
+        )
+        if row and row["plays"] >= self.promote_after and self.downloads.get(extractor, video_id) is None:
+            logger.info(f"Promoting {extractor}:{video_id} to the local cache after {row['plays']} plays")
+            try:
+                await self.downloads.submit(extractor, video_id, url)
+            except Exception as e:
+                # Otro worker del clúster puede haberlo promocionado a la vez: se
+                # reintentará en la siguiente reproducción
+                logger.warning(f"Could not promote {extractor}:{video_id}: {e}")
+
+    async def enforce_quota(self) -> int:
+        """Desaloja entradas no fijadas hasta caber en la cuota. Devuelve los bytes liberados."""
+        row = await self.db.fetchone(
+            "SELECT COALESCE(SUM(size), 0) AS used FROM library l "
+            "WHERE NOT EXISTS (SELECT 1 FROM fav f WHERE f.library_id = l.id OR f.path = l.path)"
+        )
+        used = row["used"] if row else 0
+        if used <= self.quota:
+            return 0
+
+        candidates = await self.db.fetchall(
+            "SELECT l.id, l.path, l.size FROM library l "
+            "LEFT JOIN play_stats p ON p.extractor = l.extractor AND p.video_id = l.video_id "
+            "WHERE NOT EXISTS (SELECT 1 FROM fav f WHERE f.library_id = l.id OR f.path = l.path) "
+            "ORDER BY COALESCE(p.plays, 0), COALESCE(p.last_played, 0)"
+        )
+        freed = 0
+        for candidate in candidates:
+            if used - freed <= self.quota:
+                break
+            await self.db.execute("DELETE FROM library WHERE id = ?", (candidate["id"],))
+            # Varias entradas pueden compartir fichero (mismo contenido)
+            if not await self.db.fetchone("SELECT 1 FROM library WHERE path = ?", (candidate["path"],)):
+                try:
+                    await asyncio.to_thread(os.remove, candidate["path"])
+                except FileNotFoundError:
+                    pass
+            freed += candidate["size"]
+            logger.debug(f"Evicted {candidate['path']} from the audio cache")
+
+        logger.info(f"Audio cache: evicted {freed / 1e6:.1f} MB ({(used - freed) / 1e6:.1f}/{self.quota / 1e6:.0f} MB used)")
+        return freed
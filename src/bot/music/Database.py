@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence, Tuple, TypeVar
+
+from music.Migrations import MIGRATIONS
+
+logger = logging.getLogger('music')
+
+T = TypeVar('T')
+Params = Sequence[Any]
+
+
+class Database:
+    """Conexión SQLite única servida por un hilo dedicado.
+
+    Las lecturas se ejecutan en ese hilo en orden de llegada. Las escrituras se
+    acumulan y se confirman juntas en una sola transacción cada `BATCH_DELAY`
+    segundos; `execute` devuelve cuando su lote se ha confirmado.
+    """
+    BATCH_DELAY = 0.05
+    STATEMENT_CACHE = 128
+
+    def __init__(self, path: str, migrations: Sequence[str] = MIGRATIONS) -> None:
+        self.path = path
+        self.migrations = migrations
+        self._conn: Optional[sqlite3.Connection] = None
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+        self._pending: List[Tuple[str, Params, asyncio.Future[int]]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    async def open(self) -> None:
+        await self._run(self._open)
+
+    async def close(self) -> None:
+        await self.flush()
+        await self._run(self._close)
+        self._thread.shutdown(wait=True)
+
+    async def fetchone(self, sql: str, params: Params = ()) -> Optional[sqlite3.Row]:
+        return await self._run(lambda: self._connection().execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params: Params = ()) -> List[sqlite3.Row]:
+        return await self._run(lambda: self._connection().execute(sql, params).fetchall())
+
+    async def execute(self, sql: str, params: Params = ()) -> int:
+        """Encola una escritura y espera a que su lote se confirme. Devuelve el lastrowid."""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[int] = loop.create_future()
+        self._pending.append((sql, params, future))
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.BATCH_DELAY, lambda: asyncio.ensure_future(self.flush()))
+        return await future
+
+    async def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        def run() -> List[Any]:
+            # Cada escritura lleva su propio savepoint: si una falla, solo ella se
+            # deshace y el resto del lote se confirma igualmente
+            conn = self._connection()
+            results: List[Any] = []
+            conn.execute("BEGIN")
+            try:
+                for sql, params, _ in batch:
+                    conn.execute("SAVEPOINT write")
+                    try:
+                        results.append(conn.execute(sql, params).lastrowid)
+                        conn.execute("RELEASE write")
+                    except sqlite3.Error as e:
+                        conn.execute("ROLLBACK TO write")
+                        conn.execute("RELEASE write")
+                        results.append(e)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            return results
+
+        try:
+            results = await self._run(run)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _run(self, fn: Callable[[], T]) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._thread, fn)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Database is not open")
+        return self._conn
+
+    def _open(self) -> None:
+        # check_same_thread=False solo porque el hilo del pool no es el que importa
+        # el módulo; todas las operaciones pasan por ese único hilo
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=self.STATEMENT_CACHE)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        self._conn = conn
+        self._migrate()
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _migrate(self) -> None:
+        conn = self._connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, script in enumerate(self.migrations[version:], start=version + 1):
+            logger.info(f"Migrating {self.path} to schema version {target}")
+            # executescript confirma cualquier transacción abierta; la migración y
+            # el cambio de versión van juntos en la misma transacción explícita
+            try:
+                conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {target};\nCOMMIT;")
+            except sqlite3.Error:
+                conn.rollback()
+                raise
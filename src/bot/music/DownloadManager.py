@@ -0,0 +1,267 @@
+import asyncio
+import glob
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import discord
+
+from music.Database import Database
+from music.Extractor import Extractor
+from music.Library import Library, LibraryEntry
+
+logger = logging.getLogger('music')
+
+
+@dataclass
+class DownloadJob:
+    id: int
+    extractor: str
+    video_id: str
+    url: str
+    path: str
+    # (título, url) de cada favorito que espera a esta descarga
+    requests: List[Tuple[str, str]] = field(default_factory=list)
+    messages: List[discord.WebhookMessage] = field(default_factory=list)
+    status: str = "queued"
+    downloaded_bytes: int = 0
+    total_bytes: int = 0
+    task: Optional[asyncio.Task[None]] = None
+    # La descarga la hace otro worker del cluster; este solo espera su resultado
+    remote: bool = False
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.extractor, self.video_id)
+
+    def describe(self) -> str:
+        if self.status == "downloading" and self.total_bytes:
+            percent = self.downloaded_bytes / self.total_bytes * 100
+            return f"⬇️ Descargando... {percent:.0f}% ({self.downloaded_bytes / 1e6:.1f}/{self.total_bytes / 1e6:.1f} MB)"
+        return {
+            "queued": "⏳ En cola para descargar...",
+            "downloading": "⬇️ Descargando...",
+            "converting": "🎛️ Convirtiendo a MP3...",
+            "remote": "⬇️ Descargando en otro proceso...",
+        }.get(self.status, self.status)
+
+
+class DownloadManager:
+    """Descargas de favoritos en segundo plano con límite de concurrencia.
+
+    Las peticiones del mismo vídeo se unen a la descarga en curso. Cada trabajo
+    se guarda en la tabla `downloads` hasta terminar: al arrancar, `resume`
+    relanza los pendientes (yt-dlp continúa los `.part`) y si una descarga
+    falla se borran sus ficheros parciales. Si el vídeo ya lo está descargando
+    otro worker del cluster, se espera a que termine y el trabajo se completa
+    desde la entrada que deja en la biblioteca.
+    """
+    MAX_CONCURRENT = 2
+    PROGRESS_INTERVAL = 3.0
+    DOWNLOAD_TIMEOUT = 600
+
+    def __init__(
+        self,
+        db: Database,
+        extractor: Extractor,
+        library: Library,
+        on_complete: Callable[[DownloadJob, LibraryEntry], Awaitable[None]],
+        max_concurrent: int = MAX_CONCURRENT,
+    ) -> None:
+        self.db = db
+        self.extractor = extractor
+        self.library = library
+        self.on_complete = on_complete
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._submit_lock = asyncio.Lock()
+        self._jobs: Dict[Tuple[str, str], DownloadJob] = {}
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def get(self, extractor: str, video_id: str) -> Optional[DownloadJob]:
+        return self._jobs.get((extractor.lower(), video_id))
+
+    async def submit(
+        self, extractor: str, video_id: str, url: str, title: Optional[str] = None,
+        message: Optional[discord.WebhookMessage] = None,
+    ) -> DownloadJob:
+        """Encola la descarga de un vídeo. Sin `title` solo se guarda en la
+        biblioteca, sin crear ningún favorito."""
+        # Si se cancela quien llama (un comando o la promoción de la caché al
+        # descargar el cog) con la fila ya insertada, el trabajo tiene que
+        # registrarse igualmente: si no, la fila huérfana bloquea ese vídeo
+        return await asyncio.shield(self._submit(extractor.lower(), video_id, url, title, message))
+
+    async def _submit(
+        self, extractor: str, video_id: str, url: str, title: Optional[str], message: Optional[discord.WebhookMessage],
+    ) -> DownloadJob:
+        async with self._submit_lock:
+            job = self._jobs.get((extractor, video_id))
+            if job is None:
+                path = self.library.path_for(extractor, video_id)
+                try:
+                    job_id = await self.db.execute(
+                        "INSERT INTO downloads (extractor, video_id, url, path, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (extractor, video_id, url, path, time.time())
+                    )
+                except sqlite3.IntegrityError:
+                    # La fila es de otro worker del cluster, que ya está descargando el vídeo
+                    logger.info(f"{extractor}:{video_id} is being downloaded by another worker")
+                    job = DownloadJob(id=0, extractor=extractor, video_id=video_id, url=url, path=path, remote=True)
+                else:
+                    job = DownloadJob(id=job_id, extractor=extractor, video_id=video_id, url=url, path=path)
+                self._jobs[job.key] = job
+            elif title is not None:
+                logger.info(f"Joined in-flight download of {extractor}:{video_id} for '{title}'")
+
+            if title is not None:
+                # Las peticiones que esperan a otro worker no se guardan: su descarga
+                # la reanuda ese worker, que no sabe de ellas
+                if not job.remote:
+                    try:
+                        await self.db.execute("INSERT INTO download_favs (download_id, title, url) VALUES (?, ?, ?)", (job.id, title, url))
+                    except Exception:
+                        if job.task is None:
+                            # Nadie más espera a esta descarga: no se deja la fila colgada
+                            self._jobs.pop(job.key, None)
+                            await self.db.execute("DELETE FROM downloads WHERE id = ?", (job.id,))
+                        raise
+                job.requests.append((title, url))
+            if message:
+                job.messages.append(message)
+            if job.task is None:
+                job.task = asyncio.create_task(self._follow(job) if job.remote else self._run(job))
+        return job
+
+    async def resume(self) -> None:
+        rows = await self.db.fetchall("SELECT * FROM downloads")
+        for row in rows:
+            requests = await self.db.fetchall("SELECT title, url FROM download_favs WHERE download_id = ?", (row["id"],))
+            job = DownloadJob(
+                id=row["id"], extractor=row["extractor"], video_id=row["video_id"], url=row["url"], path=row["path"],
+                requests=[(r["title"], r["url"]) for r in requests]
+            )
+            self._jobs[job.key] = job
+            job.task = asyncio.create_task(self._run(job))
+        if rows:
+            logger.info(f"Resuming {len(rows)} pending downloads")
+
+    async def shutdown(self) -> None:
+        # Los trabajos quedan en la base de datos y los .part en disco para reanudar
+        tasks = [job.task for job in self._jobs.values() if job.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job: DownloadJob) -> None:
+        reporter: Optional[asyncio.Task[None]] = None
+        try:
+            async with self._slots:
+                job.status = "downloading"
+                reporter = asyncio.create_task(self._report_progress(job))
+                info = await self.extractor.extract(
+                    job.url, self._ydl_opts(job), download=True, timeout=self.DOWNLOAD_TIMEOUT
+                )
+                entry = await self.library.add(job.extractor, job.video_id, job.path, info.get("duration", 0) if info else 0)
+        except asyncio.CancelledError:
+            self._jobs.pop(job.key, None)
+            raise
+        except Exception as e:
+            logger.error(f"❌ Error al descargar {job.url}: {e}")
+            await asyncio.to_thread(self._remove_partial_files, job)
+            await self.db.execute("DELETE FROM downloads WHERE id = ?", (job.id,))
+            self._jobs.pop(job.key, None)
+            await self._edit_messages(job, f"❌ Error al descargar la canción: {e}")
+            return
+        finally:
+            if reporter:
+                reporter.cancel()
+
+        try:
+            await self.on_complete(job, entry)
+            logger.info(f"Downloaded {job.extractor}:{job.video_id} for {len(job.requests)} favorites")
+        finally:
+            await self.db.execute("DELETE FROM downloads WHERE id = ?", (job.id,))
+            self._jobs.pop(job.key, None)
+
+    async def _follow(self, job: DownloadJob) -> None:
+        job.status = "remote"
+        await self._edit_messages(job, job.describe())
+        deadline = time.monotonic() + self.DOWNLOAD_TIMEOUT
+        try:
+            while True:
+                # La fila se borra después de añadir el fichero a la biblioteca: si ya
+                # no está y tampoco hay entrada, la descarga del otro worker falló
+                pending = await self.db.fetchone(
+                    "SELECT 1 FROM downloads WHERE extractor = ? AND video_id = ?", (job.extractor, job.video_id)
+                )
+                entry = await self.library.lookup(job.extractor, job.video_id)
+                if entry is not None or pending is None or time.monotonic() > deadline:
+                    break
+                await asyncio.sleep(self.PROGRESS_INTERVAL)
+        except asyncio.CancelledError:
+            self._jobs.pop(job.key, None)
+            raise
+
+        if entry is None:
+            logger.error(f"❌ Another worker failed to download {job.url}")
+            self._jobs.pop(job.key, None)
+            await self._edit_messages(job, "❌ Error al descargar la canción en otro proceso.")
+            return
+        try:
+            await self.on_complete(job, entry)
+            logger.info(f"Completed {job.extractor}:{job.video_id} from another worker's download")
+        finally:
+            self._jobs.pop(job.key, None)
+
+    def _ydl_opts(self, job: DownloadJob) -> Dict[str, Any]:
+        def on_progress(progress: Dict[str, Any]) -> None:
+            # Se ejecuta en el hilo de yt-dlp: solo se actualizan contadores
+            if progress["status"] == "downloading":
+                job.downloaded_bytes = progress.get("downloaded_bytes") or 0
+                job.total_bytes = progress.get("total_bytes") or progress.get("total_bytes_estimate") or 0
+            elif progress["status"] == "finished":
+                job.status = "converting"
+
+        return {
+            "format": "bestaudio/best",
+            "quiet": True,
+            "noplaylist": True,
+            "continuedl": True,
+            # Se descarga como <id>.<ext> y el postprocesador lo deja en <id>.mp3
+            "outtmpl": job.path[:-len(Library.EXTENSION)] + ".%(ext)s",
+            "progress_hooks": [on_progress],
+            "postprocessors": [{
+                "key": "FFmpegExtractAudio",
+                "preferredcodec": "mp3",
+                "preferredquality": "192",
+            }],
+        }
+
+    async def _report_progress(self, job: DownloadJob) -> None:
+        last = ""
+        while True:
+            text = job.describe()
+            if text != last:
+                await self._edit_messages(job, text)
+                last = text
+            await asyncio.sleep(self.PROGRESS_INTERVAL)
+
+    async def _edit_messages(self, job: DownloadJob, content: str) -> None:
+        for message in list(job.messages):
+            try:
+                await message.edit(content=content)
+            except discord.HTTPException:
+                # El token de la interacción caduca a los 15 minutos
+                job.messages.remove(message)
+
+    @staticmethod
+    def _remove_partial_files(job: DownloadJob) -> None:
+        stem = job.path[:-len(Library.EXTENSION)]
+        for path in glob.glob(glob.escape(stem) + ".*"):
+            logger.debug(f"Removing partial download {path}")
+            os.remove(path)
@@ -0,0 +1,125 @@
+import ctypes
+
+import discord
+import numpy as np
+from discord.opus import Encoder
+
+SAMPLES = Encoder.SAMPLES_PER_FRAME * Encoder.CHANNELS  # muestras intercaladas por frame de 20 ms
+INT16_MIN, INT16_MAX = -32768, 32767
+
+
+class EffectChain(discord.AudioSource):
+    """Volumen, fundidos y limitador sobre PCM s16le estéreo en una sola pasada.
+
+    Todos los buffers se reservan al crear la fuente: cada frame se copia en
+    ellos, se procesa in situ con numpy y se devuelve el mismo buffer ctypes
+    (que `Encoder.encode` acepta igual que `bytes`). Los parámetros se cambian
+    en caliente desde el event loop; el hilo de audio los lee en cada frame.
+
+    El limitador solo actúa mientras la ganancia pasa de 1 (volumen alto o
+    normalización que sube una canción floja): por debajo no puede saturar.
+    """
+    LIMITER_THRESHOLD = 0.89 * INT16_MAX  # ~ -1 dBFS
+    LIMITER_RELEASE = 0.05  # recuperación de ganancia por frame, repartida por muestra
+
+    def __init__(self, source: discord.AudioSource, volume: float = 1.0) -> None:
+        self.original = source
+        self._gain = volume
+        self._target = volume
+        self._ramp_frames = 0
+        self._limiter_gain = 1.0
+
+        self._in = np.zeros(SAMPLES, dtype=np.int16)
+        self._in_bytes = memoryview(self._in).cast('B')
+        self._work = np.zeros(SAMPLES, dtype=np.float32)
+        self._ramp = np.zeros(SAMPLES, dtype=np.float32)
+        # Rampa 0..1 por muestra; ambos canales de un mismo instante comparten valor
+        self._slope = np.repeat(np.arange(1, Encoder.SAMPLES_PER_FRAME + 1, dtype=np.float32) / Encoder.SAMPLES_PER_FRAME, Encoder.CHANNELS)
+        self._buffer = (ctypes.c_char * Encoder.FRAME_SIZE)()
+        self._out = np.frombuffer(self._buffer, dtype=np.int16)
+
+        # Buffers del limitador: una ganancia por instante, común a ambos canales
+        self._frames = self._work.reshape(Encoder.SAMPLES_PER_FRAME, Encoder.CHANNELS)
+        self._abs = np.zeros((Encoder.SAMPLES_PER_FRAME, Encoder.CHANNELS), dtype=np.float32)
+        self._envelope = np.zeros(Encoder.SAMPLES_PER_FRAME, dtype=np.float32)
+        self._release = np.arange(Encoder.SAMPLES_PER_FRAME, dtype=np.float32) * (self.LIMITER_RELEASE / Encoder.SAMPLES_PER_FRAME)
+
+    @property
+    def volume(self) -> float:
+        return self._target
+
+    @volume.setter
+    def volume(self, value: float) -> None:
+        self.fade_to(value, 0)
+
+    def fade_to(self, volume: float, duration_ms: int = 100) -> None:
+        """Lleva la ganancia a `volume` en `duration_ms` con una rampa lineal por muestra."""
+        self._target = max(0.0, volume)
+        self._ramp_frames = max(1, duration_ms // Encoder.FRAME_LENGTH) if duration_ms > 0 else 0
+        if not self._ramp_frames:
+            self._gain = self._target
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self) -> None:
+        self.original.cleanup()
+
+    def read(self) -> bytes:
+        data = self.original.read()
+        if len(data) != Encoder.FRAME_SIZE:
+            return data
+
+        start = self._gain
+        if self._ramp_frames:
+            end = start + (self._target - start) / self._ramp_frames
+            self._ramp_frames -= 1
+        else:
+            end = start
+
+        boost = max(start, end) > 1.0
+        # Al bajar de 1 el limitador deja de atacar, pero se recupera poco a poco
+        limit = boost or self._limiter_gain < 1.0
+        if start == end == 1.0 and not limit:
+            return data
+
+        self._in_bytes[:] = data
+        if start == end:
+            np.multiply(self._in, start, out=self._work)
+        else:
+            np.multiply(self._slope, end - start, out=self._ramp)
+            self._ramp += start
+            np.multiply(self._in, self._ramp, out=self._work)
+        self._gain = end
+
+        if limit:
+            self._limit(boost)
+
+        np.clip(self._work, INT16_MIN, INT16_MAX, out=self._work)
+        np.copyto(self._out, self._work, casting='unsafe')
+        return self._buffer  # type: ignore[return-value]
+
+    def _limit(self, attack: bool) -> None:
+        # Se limita sobre las muestras ya escaladas por el fundido, con una ganancia
+        # por muestra: ataque instantáneo y recuperación lineal lenta, sin saltos
+        # en los bordes de frame. La recurrencia g[n] = min(necesaria[n], g[n-1] + r)
+        # se resuelve sin bucle como r*n + mínimo acumulado de (necesaria[k] - r*k).
+        step = self.LIMITER_RELEASE / Encoder.SAMPLES_PER_FRAME
+        if attack:
+            np.abs(self._frames, out=self._abs)
+            peaks = np.max(self._abs, axis=1, out=self._envelope)
+            if self._limiter_gain >= 1.0 and float(peaks.max()) <= self.LIMITER_THRESHOLD:
+                return
+            np.maximum(peaks, 1.0, out=peaks)
+            np.divide(self.LIMITER_THRESHOLD, peaks, out=self._envelope)
+            np.minimum(self._envelope, 1.0, out=self._envelope)
+        else:
+            self._envelope.fill(1.0)
+        self._envelope -= self._release
+        self._envelope[0] = min(float(self._envelope[0]), self._limiter_gain + step)
+        np.minimum.accumulate(self._envelope, out=self._envelope)
+        self._envelope += self._release
+        np.minimum(self._envelope, 1.0, out=self._envelope)
+
+        self._limiter_gain = float(self._envelope[-1])
+        self._frames *= self._envelope[:, np.newaxis]
@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from Metrics import EXTRACTION_DURATION
+
+logger = logging.getLogger('music')
+
+
+# Marca de fin de iteración enviada desde el hilo de yt-dlp
+_END = object()
+
+
+def _load_yt_dlp() -> Any:
+    import yt_dlp
+    return yt_dlp
+
+
+class ExtractionError(Exception):
+    pass
+
+
+class ExtractionTimeout(ExtractionError):
+    pass
+
+
+class ExtractionLimitReached(ExtractionError):
+    pass
+
+
+class Extractor:
+    """Ejecuta yt-dlp en pools de hilos acotados, fuera del event loop.
+
+    Las búsquedas y la resolución de streams tienen su propio pool: las
+    descargas (hasta 10 minutos) y los listados de playlists (hasta 5) van a
+    otros dos y nunca ocupan los hilos que espera un /music play.
+    """
+    MAX_WORKERS = 4
+    # Tantos como descargas simultáneas permite DownloadManager
+    DOWNLOAD_WORKERS = 2
+    PLAYLIST_WORKERS = 2
+    MAX_PER_GUILD = 2
+    TIMEOUT = 60.0
+
+    def __init__(
+        self, max_workers: int = MAX_WORKERS, max_per_guild: int = MAX_PER_GUILD, timeout: float = TIMEOUT,
+        download_workers: int = DOWNLOAD_WORKERS, playlist_workers: int = PLAYLIST_WORKERS,
+    ) -> None:
+        self.max_per_guild = max_per_guild
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='yt-dlp')
+        self._download_pool = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix='yt-dlp-download')
+        self._playlist_pool = ThreadPoolExecutor(max_workers=playlist_workers, thread_name_prefix='yt-dlp-playlist')
+        self._per_guild: Dict[int, int] = {}
+
+    def warm_up(self) -> None:
+        """Importa yt-dlp en un hilo del pool sin esperar: tarda más de 100 ms y
+        no se hace al importar el módulo para no retrasar el arranque."""
+        self._pool.submit(_load_yt_dlp)
+
+    def shutdown(self) -> None:
+        for pool in (self._pool, self._download_pool, self._playlist_pool):
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def extract(
+        self,
+        url: str,
+        opts: Dict[str, Any],
+        *,
+        guild_id: Optional[int] = None,
+        download: bool = False,
+        process: bool = True,
+        timeout: Optional[float] = None,
+        expires_at: Optional[datetime] = None,
+    ) -> Optional[Dict[str, Any]]:
+        timeout = self._effective_timeout(timeout, expires_at)
+        if timeout <= 0:
+            raise ExtractionTimeout("La interacción ha expirado")
+
+        self._acquire_guild(guild_id)
+
+        # yt-dlp no se puede interrumpir desde fuera; las descargas comprueban
+        # este evento en cada progress hook y abortan en cuanto se activa.
+        cancelled = threading.Event()
+        loop = asyncio.get_running_loop()
+        kind = "download" if download else "extract" if process else "probe"
+        status = "error"
+        start = time.perf_counter()
+        try:
+            pool = self._download_pool if download else self._pool
+            future = loop.run_in_executor(pool, self._run, url, opts, download, process, cancelled)
+            info = await asyncio.wait_for(future, timeout)
+            status = "ok"
+            return info
+        except asyncio.TimeoutError:
+            status = "timeout"
+            cancelled.set()
+            logger.warning(f"Extraction timed out after {timeout:.0f}s: {url}")
+            raise ExtractionTimeout(f"La extracción tardó más de {timeout:.0f}s")
+        except asyncio.CancelledError:
+            status = "cancelled"
+            cancelled.set()
+            raise
+        finally:
+            EXTRACTION_DURATION.observe(time.perf_counter() - start, kind=kind, status=status)
+            self._release_guild(guild_id)
+
+    async def iter_entries(
+        self,
+        url: str,
+        opts: Dict[str, Any],
+        *,
+        guild_id: Optional[int] = None,
+        limit: Optional[int] = None,
+        timeout: Optional[float] = None,
+        expires_at: Optional[datetime] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Entradas planas de una playlist a medida que yt-dlp las va listando.
+
+        Solo se obtiene título, ID y duración de cada entrada; los formatos se
+        resuelven después, cuando se vayan a reproducir. Una URL que no es una
+        playlist produce una única entrada.
+        """
+        deadline = time.monotonic() + self._effective_timeout(timeout, expires_at)
+        self._acquire_guild(guild_id)
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[Any] = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def emit(item: Any) -> None:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        future = loop.run_in_executor(self._playlist_pool, self._iterate, url, opts, limit, cancelled, emit)
+        status = "error"
+        start = time.perf_counter()
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ExtractionTimeout("La lista de reproducción tardó demasiado en cargarse")
+                try:
+                    item = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    raise ExtractionTimeout("La lista de reproducción tardó demasiado en cargarse")
+                if item is _END:
+                    status = "ok"
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            EXTRACTION_DURATION.observe(time.perf_counter() - start, kind="playlist", status=status)
+            cancelled.set()
+            self._release_guild(guild_id)
+            future.cancel()
+
+    def _acquire_guild(self, guild_id: Optional[int]) -> None:
+        if guild_id is None:
+            return
+        if self._per_guild.get(guild_id, 0) >= self.max_per_guild:
+            raise ExtractionLimitReached(f"Máximo de {self.max_per_guild} extracciones simultáneas por servidor")
+        self._per_guild[guild_id] = self._per_guild.get(guild_id, 0) + 1
+
+    def _release_guild(self, guild_id: Optional[int]) -> None:
+        if guild_id is None:
+            return
+        remaining = self._per_guild[guild_id] - 1
+        if remaining:
+            self._per_guild[guild_id] = remaining
+        else:
+            del self._per_guild[guild_id]
+
+    def _effective_timeout(self, timeout: Optional[float], expires_at: Optional[datetime]) -> float:
+        timeout = self.timeout if timeout is None else timeout
+        if expires_at is not None:
+            timeout = min(timeout, (expires_at - datetime.now(timezone.utc)).total_seconds())
+        return timeout
+
+    @staticmethod
+    def _run(url: str, opts: Dict[str, Any], download: bool, process: bool, cancelled: threading.Event) -> Optional[Dict[str, Any]]:
+        if cancelled.is_set():
+            return None
+        yt_dlp = _load_yt_dlp()
+
+        def check_cancelled(_: Dict[str, Any]) -> None:
+            if cancelled.is_set():
+                raise yt_dlp.utils.DownloadCancelled()
+
+        opts = {**opts, "progress_hooks": [*opts.get("progress_hooks", []), check_cancelled]}
+        # YoutubeDL no es thread-safe: una instancia por trabajo
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            return ydl.extract_info(url, download=download, process=process)
+
+    @staticmethod
+    def _iterate(url: str, opts: Dict[str, Any], limit: Optional[int], cancelled: threading.Event, emit: Callable[[Any], None]) -> None:
+        opts = {**opts, "extract_flat": "in_playlist", "lazy_playlist": True}
+        try:
+            yt_dlp = _load_yt_dlp()
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                # process=False deja `entries` como generador: cada página de la
+                # playlist se pide solo cuando se consume
+                info = ydl.extract_info(url, download=False, process=False)
+                entries = info.get("entries") if info else None
+                if entries is None:
+                    if info:
+                        emit(info)
+                    return
+                for count, entry in enumerate(entries):
+                    if cancelled.is_set() or (limit is not None and count >= limit):
+                        break
+                    if entry:
+                        emit(entry)
+        except Exception as e:
+            emit(e)
+        finally:
+            emit(_END)
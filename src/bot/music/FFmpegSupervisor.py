@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+import subprocess
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from subprocess import Popen
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+import discord
+
+from Metrics import FFMPEG_CAPACITY, FFMPEG_CPU, FFMPEG_PROCESSES, FFMPEG_REAPED, FFMPEG_REJECTED
+
+logger = logging.getLogger('music')
+
+S = TypeVar('S', bound=discord.AudioSource)
+
+
+class FFmpegOverloaded(Exception):
+    pass
+
+
+@dataclass
+class _Tracked:
+    process: Popen
+    source: "weakref.ref[discord.AudioSource]"
+    owner: "weakref.ref[Any]"
+    cpu_ticks: int = 0
+    killed: bool = False
+
+
+def _cpu_ticks(pid: int) -> Optional[int]:
+    # utime + stime de /proc/<pid>/stat; el nombre del proceso puede tener espacios
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            fields = f.read().rsplit(b")", 1)[1].split()
+        return int(fields[11]) + int(fields[12])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class FFmpegSupervisor:
+    """Lleva la cuenta de todos los FFmpeg que arrancan los reproductores.
+
+    Antes de arrancar uno comprueba el límite de procesos y el presupuesto de
+    CPU (medido en /proc cada `SAMPLE_INTERVAL`): `spawn` rechaza al momento
+    con `FFmpegOverloaded` y `admit` espera turno hasta un timeout. Cada
+    muestreo mata los procesos huérfanos: los de fuentes que se han liberado
+    sin `cleanup` y los de reproductores destruidos.
+    Con el cluster cada worker recibe su parte (`share`) de los límites del host.
+    """
+    SAMPLE_INTERVAL = 5.0
+    ADMISSION_POLL = 0.25
+    # Un stream Opus copiado cuesta ~1% de un núcleo y uno decodificado a PCM ~3%
+    PROCESSES_PER_CORE = 24
+    CPU_BUDGET = 0.8
+
+    def __init__(self, max_processes: Optional[int] = None, cpu_budget: Optional[float] = None, share: float = 1.0) -> None:
+        # `share`: fracción del host que le toca a este proceso (1/N con N workers)
+        cores = os.cpu_count() or 1
+        self.max_processes = max_processes or max(1, int(self.PROCESSES_PER_CORE * cores * share))
+        self.cpu_budget = cpu_budget or self.CPU_BUDGET * cores * share
+        self.cpu_usage = 0.0
+        self._tracked: Dict[int, _Tracked] = {}
+        self._starting = 0
+        self._released: "weakref.WeakSet[Any]" = weakref.WeakSet()
+        # Reentrante: `spawn` consulta `running` con el lock ya tomado
+        self._lock = threading.RLock()
+        self._sampled_at = time.monotonic()
+        self._task: Optional[asyncio.Task[None]] = None
+        self._can_sample = os.path.exists(f"/proc/{os.getpid()}/stat")
+
+        FFMPEG_PROCESSES.set_function(lambda: {(): float(self.running)})
+        FFMPEG_CPU.set_function(lambda: {(): self.cpu_usage})
+        FFMPEG_CAPACITY.set(self.max_processes, limit="processes")
+        FFMPEG_CAPACITY.set(self.cpu_budget, limit="cpu_cores")
+
+    @property
+    def running(self) -> int:
+        with self._lock:
+            # Un proceso que ya ha salido no ocupa sitio aunque no se haya muestreado aún
+            for pid in [pid for pid, t in self._tracked.items() if t.process.poll() is not None]:
+                del self._tracked[pid]
+            return len(self._tracked) + self._starting
+
+    def has_capacity(self) -> bool:
+        return self._refusal() is None
+
+    def _refusal(self) -> Optional[str]:
+        if self.running >= self.max_processes:
+            return "processes"
+        if self.cpu_usage >= self.cpu_budget:
+            return "cpu"
+        return None
+
+    async def admit(self, timeout: float) -> None:
+        """Espera hasta `timeout` segundos a que haya sitio para otro FFmpeg."""
+        deadline = time.monotonic() + timeout
+        while True:
+            reason = self._refusal()
+            if reason is None:
+                return
+            if time.monotonic() >= deadline:
+                FFMPEG_REJECTED.inc(reason=reason)
+                raise FFmpegOverloaded(f"Sin capacidad para más audio ({reason})")
+            await asyncio.sleep(self.ADMISSION_POLL)
+
+    def spawn(self, factory: Callable[[], S], owner: Any) -> S:
+        """Crea la fuente con `factory` si hay capacidad y registra su proceso."""
+        with self._lock:
+            reason = "released" if owner in self._released else self._refusal()
+            if reason is not None:
+                FFMPEG_REJECTED.inc(reason=reason)
+                raise FFmpegOverloaded(f"Sin capacidad para más audio ({reason})")
+            self._starting += 1
+        try:
+            source = factory()
+        finally:
+            with self._lock:
+                self._starting -= 1
+        # EffectChain envuelve la fuente de FFmpeg en `original`
+        process = getattr(source, "_process", None) or getattr(getattr(source, "original", None), "_process", None)
+        if process is not None:
+            with self._lock:
+                self._tracked[process.pid] = _Tracked(
+                    process, weakref.ref(source), weakref.ref(owner), _cpu_ticks(process.pid) or 0
+                )
+        return source
+
+    def release(self, owner: Any) -> None:
+        """Cierra los FFmpeg de un reproductor destruido y no le deja arrancar más."""
+        self._released.add(owner)
+        with self._lock:
+            tracked = [t for t in self._tracked.values() if t.owner() is owner]
+        for t in tracked:
+            self._kill(t, "released")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        with self._lock:
+            tracked = list(self._tracked.values())
+        for t in tracked:
+            self._kill(t, "shutdown")
+        self.sample()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.SAMPLE_INTERVAL)
+            try:
+                self.sample()
+            except Exception as e:
+                logger.exception(f"FFmpeg supervisor sample failed: {e}")
+
+    def sample(self) -> None:
+        """Olvida los procesos terminados, mata los huérfanos y mide la CPU."""
+        now = time.monotonic()
+        elapsed, self._sampled_at = now - self._sampled_at, now
+        ticks = 0
+        with self._lock:
+            tracked = list(self._tracked.items())
+        for pid, t in tracked:
+            if t.process.poll() is not None:
+                with self._lock:
+                    self._tracked.pop(pid, None)
+                continue
+            if not t.killed and (t.source() is None or t.owner() is None):
+                self._kill(t, "orphaned")
+                continue
+            current = _cpu_ticks(pid) if self._can_sample else None
+            if current is not None:
+                ticks += max(0, current - t.cpu_ticks)
+                t.cpu_ticks = current
+        if self._can_sample and elapsed > 0:
+            self.cpu_usage = ticks / os.sysconf("SC_CLK_TCK") / elapsed
+
+    def _kill(self, t: _Tracked, reason: str) -> None:
+        if t.killed:
+            return
+        t.killed = True
+        # Deja de contar ya: no hay que esperar al siguiente muestreo para admitir otro
+        with self._lock:
+            self._tracked.pop(t.process.pid, None)
+        FFMPEG_REAPED.inc(reason=reason)
+        source = t.source()
+        logger.debug(f"Killing FFmpeg {t.process.pid} ({reason})")
+        if source is not None:
+            # `cleanup` mata el proceso y espera a que salga
+            source.cleanup()
+            return
+        try:
+            t.process.kill()
+            # Recoge el proceso para que no quede zombi
+            t.process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
@@ -0,0 +1,81 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from music.Database import Database
+
+
+class FavCatalog:
+    """Búsqueda de favoritos para el autocompletado, cacheada en memoria.
+
+    Las consultas de 3 o más caracteres van al índice FTS5 de trigramas; las
+    más cortas (que los trigramas no pueden indexar) se filtran sobre la lista
+    de títulos en memoria. Cualquier alta o baja debe llamar a `invalidate`.
+
+    Los cambios de otros procesos (otros workers del cluster) se detectan antes
+    de servir cada consulta: `PRAGMA data_version` solo cambia cuando otra
+    conexión confirma algo, y entonces se compara la fila de `fav_version`.
+    """
+    MAX_CACHED_QUERIES = 256
+    MIN_FTS_QUERY = 3
+
+    def __init__(self, db: Database) -> None:
+        self.db = db
+        self._titles: Optional[List[Tuple[str, str]]] = None
+        self._results: OrderedDict[str, List[str]] = OrderedDict()
+        self._data_version: Optional[int] = None
+        self._fav_version: Optional[int] = None
+
+    def invalidate(self) -> None:
+        self._titles = None
+        self._results.clear()
+
+    async def titles(self) -> List[str]:
+        await self._refresh()
+        return [title for _, title in await self._load_titles()]
+
+    async def search(self, query: str, limit: int = 25) -> List[str]:
+        await self._refresh()
+        query = " ".join(query.casefold().split())
+        key = f"{limit}:{query}"
+        cached = self._results.get(key)
+        if cached is not None:
+            self._results.move_to_end(key)
+            return cached
+
+        if len(query) < self.MIN_FTS_QUERY:
+            titles = await self._load_titles()
+            prefix = [title for folded, title in titles if folded.startswith(query)]
+            results = prefix[:limit]
+            if len(results) < limit:
+                results += [title for folded, title in titles if query in folded and not folded.startswith(query)][:limit - len(results)]
+        else:
+            rows = await self.db.fetchall(
+                "SELECT fav.title FROM fav_fts JOIN fav ON fav.id = fav_fts.rowid "
+                "WHERE fav_fts MATCH ? ORDER BY rank LIMIT ?",
+                ('"' + query.replace('"', '""') + '"', limit)
+            )
+            results = [row["title"] for row in rows]
+
+        self._results[key] = results
+        while len(self._results) > self.MAX_CACHED_QUERIES:
+            self._results.popitem(last=False)
+        return results
+
+    async def _refresh(self) -> None:
+        row = await self.db.fetchone("PRAGMA data_version")
+        data_version = row[0] if row else None
+        if data_version == self._data_version:
+            return
+        # Otra conexión confirmó algo, no necesariamente en fav
+        self._data_version = data_version
+        row = await self.db.fetchone("SELECT version FROM fav_version")
+        fav_version = row["version"] if row else None
+        if fav_version != self._fav_version:
+            self._fav_version = fav_version
+            self.invalidate()
+
+    async def _load_titles(self) -> List[Tuple[str, str]]:
+        if self._titles is None:
+            rows = await self.db.fetchall("SELECT title FROM fav ORDER BY title COLLATE NOCASE")
+            self._titles = [(row["title"].casefold(), row["title"]) for row in rows]
+        return self._titles
@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Set
+
+from music.Database import Database
+
+logger = logging.getLogger('music')
+
+_UNSAFE = re.compile(r'[^A-Za-z0-9_-]')
+
+
+@dataclass
+class LibraryEntry:
+    id: int
+    extractor: str
+    video_id: str
+    path: str
+    sha256: str
+    size: int
+    mtime: float
+    duration: int
+
+
+@dataclass
+class IntegrityReport:
+    missing: List[str] = field(default_factory=list)
+    orphaned: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    scanned: bool = False  # si se recorrió el disco buscando huérfanos
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Library:
+    """Ficheros de audio indexados por (extractor, ID de vídeo).
+
+    Cada fichero se guarda en `<root>/<extractor>/<id[:2]>/<id>.mp3` y se
+    registra en la tabla `library` con su hash, tamaño y mtime. Los favoritos
+    apuntan a una entrada, así que el mismo vídeo solo se descarga una vez.
+    """
+    EXTENSION = ".mp3"
+
+    def __init__(self, db: Database, root: str) -> None:
+        self.db = db
+        self.root = root
+
+    def path_for(self, extractor: str, video_id: str) -> str:
+        extractor = _UNSAFE.sub('_', extractor.lower())
+        video_id = _UNSAFE.sub('_', video_id)
+        return os.path.join(self.root, extractor, video_id[:2], video_id + self.EXTENSION)
+
+    async def lookup(self, extractor: str, video_id: str) -> Optional[LibraryEntry]:
+        row = await self.db.fetchone(
+            "SELECT * FROM library WHERE extractor = ? AND video_id = ?", (extractor.lower(), video_id)
+        )
+        if row is None:
+            return None
+        entry = LibraryEntry(**dict(row))
+        if not os.path.exists(entry.path):
+            logger.warning(f"Library file missing for {extractor}:{video_id}: {entry.path}")
+            return None
+        return entry
+
+    async def add(self, extractor: str, video_id: str, path: str, duration: int) -> LibraryEntry:
+        """Registra un fichero recién descargado. Si su contenido ya existe en la
+        biblioteca, se borra el nuevo y la entrada apunta al existente."""
+        extractor = extractor.lower()
+        sha256 = await asyncio.to_thread(file_sha256, path)
+        duplicate = await self.db.fetchone("SELECT path FROM library WHERE sha256 = ? LIMIT 1", (sha256,))
+        if duplicate and duplicate["path"] != path and os.path.exists(duplicate["path"]):
+            logger.info(f"Deduplicated {extractor}:{video_id} against {duplicate['path']}")
+            await asyncio.to_thread(os.remove, path)
+            path = duplicate["path"]
+
+        stat = os.stat(path)
+        await self.db.execute(
+            "INSERT INTO library (extractor, video_id, path, sha256, size, mtime, duration) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(extractor, video_id) DO UPDATE SET path = excluded.path, sha256 = excluded.sha256, "
+            "size = excluded.size, mtime = excluded.mtime, duration = excluded.duration",
+            (extractor, video_id, path, sha256, stat.st_size, stat.st_mtime, duration)
+        )
+        row = await self.db.fetchone("SELECT * FROM library WHERE extractor = ? AND video_id = ?", (extractor, video_id))
+        assert row is not None
+        return LibraryEntry(**dict(row))
+
+    async def check(self, scan: bool = False) -> IntegrityReport:
+        """Compara el índice con el disco usando solo stat: únicamente se vuelven
+        a hashear los ficheros cuyo tamaño o mtime no coinciden con el índice.
+
+        Solo se recorre el árbol de `root` buscando ficheros huérfanos si se pide
+        explícitamente con `scan`, porque en bibliotecas grandes es lo más caro.
+        """
+        rows = await self.db.fetchall("SELECT * FROM library")
+        entries = [LibraryEntry(**dict(row)) for row in rows]
+        known: Optional[Set[str]] = None
+        if scan:
+            legacy = await self.db.fetchall("SELECT path FROM fav WHERE library_id IS NULL")
+            known = {os.path.normpath(entry.path) for entry in entries} | {os.path.normpath(row["path"]) for row in legacy}
+        return await asyncio.to_thread(self._check, entries, known)
+
+    def _check(self, entries: List[LibraryEntry], known: Optional[Set[str]]) -> IntegrityReport:
+        report = IntegrityReport()
+        for entry in entries:
+            try:
+                stat = os.stat(entry.path)
+            except FileNotFoundError:
+                report.missing.append(entry.path)
+                continue
+            if (stat.st_size, stat.st_mtime) != (entry.size, entry.mtime) and file_sha256(entry.path) != entry.sha256:
+                report.changed.append(entry.path)
+
+        if known is None:
+            return report
+        report.scanned = True
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.normpath(os.path.join(dirpath, filename))
+                if path not in known:
+                    report.orphaned.append(path)
+        return report
@@ -0,0 +1,48 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger('music')
+
+# Objetivo de sonoridad integrada y techo de pico verdadero para la reproducción
+TARGET_LUFS = -16.0
+PEAK_CEILING_DBTP = -1.0
+
+
+@dataclass
+class Loudness:
+    integrated: float  # LUFS
+    peak: float  # dBTP
+
+    def gain(self, target: float = TARGET_LUFS, ceiling: float = PEAK_CEILING_DBTP) -> float:
+        """Ganancia lineal fija que lleva la pista al objetivo sin pasar del techo de pico."""
+        gain_db = min(target - self.integrated, ceiling - self.peak)
+        return 10 ** (gain_db / 20)
+
+
+async def measure_loudness(path: str) -> Optional[Loudness]:
+    """Mide sonoridad integrada y pico verdadero con una pasada de análisis de loudnorm."""
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-hide_banner", "-nostats", "-i", path,
+        "-af", "loudnorm=print_format=json", "-f", "null", "-",
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        logger.warning(f"Loudness analysis failed for {path} (exit {process.returncode})")
+        return None
+
+    # loudnorm imprime el JSON al final de stderr, tras el resto del log
+    output = stderr.decode(errors="replace")
+    try:
+        stats = json.loads(output[output.rindex("{"):output.rindex("}") + 1])
+        integrated, peak = float(stats["input_i"]), float(stats["input_tp"])
+    except (ValueError, KeyError) as e:
+        logger.warning(f"Could not parse loudness analysis for {path}: {e}")
+        return None
+    # Silencio: loudnorm devuelve -inf, que no sirve para calcular ganancia
+    if integrated == float("-inf") or peak == float("-inf"):
+        return None
+    return Loudness(integrated=integrated, peak=peak)
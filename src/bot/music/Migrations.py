@@ -0,0 +1,124 @@
+# Migraciones del esquema de data/music.db. La versión de cada una es su
+# posición en la lista (empezando en 1) y se guarda en PRAGMA user_version.
+# Nunca se edita una migración ya publicada: se añade una nueva al final.
+MIGRATIONS = [
+    # 1: esquema original (CREATE IF NOT EXISTS para adoptar bases de datos previas)
+    """
+    CREATE TABLE IF NOT EXISTS fav (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        url TEXT NOT NULL,
+        path TEXT NOT NULL,
+        duration INTEGER NOT NULL,
+        UNIQUE(title)
+    );
+    """,
+    # 2: índice de texto completo (trigramas) sobre título y URL de los favoritos
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS fav_fts USING fts5(
+        title, url, content='fav', content_rowid='id', tokenize='trigram'
+    );
+    INSERT INTO fav_fts(fav_fts) VALUES ('rebuild');
+    CREATE TRIGGER IF NOT EXISTS fav_fts_insert AFTER INSERT ON fav BEGIN
+        INSERT INTO fav_fts(rowid, title, url) VALUES (new.id, new.title, new.url);
+    END;
+    CREATE TRIGGER IF NOT EXISTS fav_fts_delete AFTER DELETE ON fav BEGIN
+        INSERT INTO fav_fts(fav_fts, rowid, title, url) VALUES ('delete', old.id, old.title, old.url);
+    END;
+    CREATE TRIGGER IF NOT EXISTS fav_fts_update AFTER UPDATE OF title, url ON fav BEGIN
+        INSERT INTO fav_fts(fav_fts, rowid, title, url) VALUES ('delete', old.id, old.title, old.url);
+        INSERT INTO fav_fts(rowid, title, url) VALUES (new.id, new.title, new.url);
+    END;
+    """,
+    # 3: biblioteca direccionada por extractor + ID de vídeo; un fichero puede
+    # respaldar varios favoritos
+    """
+    CREATE TABLE IF NOT EXISTS library (
+        id INTEGER PRIMARY KEY,
+        extractor TEXT NOT NULL,
+        video_id TEXT NOT NULL,
+        path TEXT NOT NULL,
+        sha256 TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        duration INTEGER NOT NULL,
+        UNIQUE(extractor, video_id)
+    );
+    CREATE INDEX IF NOT EXISTS library_sha256 ON library(sha256);
+    ALTER TABLE fav ADD COLUMN library_id INTEGER REFERENCES library(id);
+    CREATE INDEX IF NOT EXISTS fav_library_id ON fav(library_id);
+    """,
+    # 4: sonoridad integrada (LUFS) y pico verdadero (dBTP) medidos al añadir
+    """
+    ALTER TABLE fav ADD COLUMN loudness REAL;
+    ALTER TABLE fav ADD COLUMN peak REAL;
+    """,
+    # 5: descargas en segundo plano pendientes, para reanudarlas tras un reinicio
+    """
+    CREATE TABLE IF NOT EXISTS downloads (
+        id INTEGER PRIMARY KEY,
+        extractor TEXT NOT NULL,
+        video_id TEXT NOT NULL,
+        url TEXT NOT NULL,
+        path TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        UNIQUE(extractor, video_id)
+    );
+    CREATE TABLE IF NOT EXISTS download_favs (
+        download_id INTEGER NOT NULL REFERENCES downloads(id) ON DELETE CASCADE,
+        title TEXT NOT NULL,
+        url TEXT NOT NULL,
+        UNIQUE(title)
+    );
+    """,
+    # 6: reproducciones por vídeo para promocionar al disco y desalojar (LFU + LRU)
+    """
+    CREATE TABLE IF NOT EXISTS play_stats (
+        extractor TEXT NOT NULL,
+        video_id TEXT NOT NULL,
+        plays INTEGER NOT NULL DEFAULT 0,
+        last_played REAL NOT NULL,
+        PRIMARY KEY (extractor, video_id)
+    );
+    """,
+    # 7: estado de cada reproductor y registro de cambios de su cola, para
+    # retomar la reproducción tras un reinicio
+    """
+    CREATE TABLE IF NOT EXISTS player_state (
+        guild_id INTEGER PRIMARY KEY,
+        kind TEXT NOT NULL,
+        channel_id INTEGER,
+        state TEXT NOT NULL,
+        position REAL NOT NULL DEFAULT 0,
+        current TEXT,
+        updated_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS queue_log (
+        id INTEGER PRIMARY KEY,
+        guild_id INTEGER NOT NULL,
+        op TEXT NOT NULL,
+        entry_id INTEGER,
+        position INTEGER,
+        payload TEXT
+    );
+    CREATE INDEX IF NOT EXISTS queue_log_guild ON queue_log(guild_id, id);
+    """,
+    # 8: contador de cambios en los títulos de favoritos, para que cada worker del
+    # cluster sepa cuándo su catálogo en memoria ha quedado viejo
+    """
+    CREATE TABLE IF NOT EXISTS fav_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO fav_version (id, version) VALUES (1, 0);
+    CREATE TRIGGER IF NOT EXISTS fav_version_insert AFTER INSERT ON fav BEGIN
+        UPDATE fav_version SET version = version + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS fav_version_delete AFTER DELETE ON fav BEGIN
+        UPDATE fav_version SET version = version + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS fav_version_update AFTER UPDATE OF title ON fav BEGIN
+        UPDATE fav_version SET version = version + 1;
+    END;
+    """,
+]
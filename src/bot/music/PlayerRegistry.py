@@ -0,0 +1,65 @@
+import logging
+from typing import Any, Dict, Generic, ItemsView, Iterator, Optional, Protocol, Type, TypeVar
+
+logger = logging.getLogger('music')
+
+
+class _Destroyable(Protocol):
+    def destroy(self) -> None: ...
+
+
+P = TypeVar('P', bound=_Destroyable)
+
+
+class PlayerRegistry(Generic[P]):
+    """Un reproductor por guild, creado bajo demanda y destruido al salir."""
+    __slots__ = ('_players',)
+
+    def __init__(self) -> None:
+        self._players: Dict[int, P] = {}
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    def __contains__(self, guild_id: int) -> bool:
+        return guild_id in self._players
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._players)
+
+    def items(self) -> ItemsView[int, P]:
+        return self._players.items()
+
+    def get(self, guild_id: Optional[int]) -> Optional[P]:
+        if guild_id is None:
+            return None
+        return self._players.get(guild_id)
+
+    def get_or_create(self, guild_id: int, player_type: Type[P], *args: Any) -> P:
+        # Si el guild ya tiene un reproductor de otro tipo se sustituye,
+        # igual que hacía el cog con su único reproductor global.
+        player = self._players.get(guild_id)
+        if player is not None and type(player) is player_type:
+            return player
+        if player is not None:
+            player.destroy()
+        player = player_type(*args)
+        self._players[guild_id] = player
+        logger.debug(f"Created {player_type.__name__} for guild {guild_id} ({len(self._players)} active)")
+        return player
+
+    def remove(self, guild_id: Optional[int]) -> bool:
+        if guild_id is None:
+            return False
+        player = self._players.pop(guild_id, None)
+        if player is None:
+            return False
+        player.destroy()
+        logger.debug(f"Removed player for guild {guild_id} ({len(self._players)} active)")
+        return True
+
+    def destroy_all(self) -> None:
+        players, self._players = self._players, {}
+        for player in players.values():
+            player.destroy()
+        logger.debug(f"Destroyed {len(players)} players")
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from music.Database import Database
+from music.SongQueue import QueueEntry, SongQueue
+
+logger = logging.getLogger('music')
+
+Song = Dict[str, Any]
+
+
+@dataclass
+class SavedPlayer:
+    guild_id: int
+    kind: str
+    channel_id: Optional[int]
+    state: str
+    position: float
+    current: Optional[Song]
+    queue: List[Song] = field(default_factory=list)
+
+
+class QueueStore:
+    """Guarda las colas y el estado de los reproductores para sobrevivir a un reinicio.
+
+    Cada cambio de la cola se añade como una fila a `queue_log` en vez de
+    reescribirla entera; el estado del reproductor (canción actual, posición,
+    canal) es una fila por guild en `player_state`. Al arrancar, `load`
+    reproduce el log de cada guild. Cuando el log crece mucho más que la cola
+    se compacta reescribiendo solo las canciones que quedan.
+
+    Las escrituras pueden llegar desde el hilo de audio de discord.py: se pasan
+    al event loop y se confirman en los lotes de `Database`.
+    """
+    # El log se compacta al pasar de COMPACT_RATIO filas por canción en cola
+    COMPACT_RATIO = 4
+    COMPACT_MIN = 256
+
+    def __init__(self, db: Database, encode: Callable[[Any], Song]) -> None:
+        self.db = db
+        self.encode = encode
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, Tuple[Any, ...]]] = []
+        self._drain: Optional[asyncio.Task[None]] = None
+        self._log_rows: Dict[int, int] = {}
+        self._states: Dict[int, Tuple[Any, ...]] = {}
+        self._closed = False
+
+    def attach(self, guild_id: int, queue: SongQueue[Any]) -> None:
+        """Empieza a registrar los cambios de `queue`, que sustituye a lo guardado del guild."""
+
+        def listener(op: str, entry: Optional[QueueEntry[Any]], index: Optional[int]) -> None:
+            if op == "insert":
+                assert entry is not None
+                self._write(
+                    "INSERT INTO queue_log(guild_id, op, entry_id, position, payload) VALUES (?, ?, ?, ?, ?)",
+                    (guild_id, op, entry.id, index, json.dumps(self.encode(entry.item)))
+                )
+            elif op in ("pop", "move"):
+                assert entry is not None
+                self._write(
+                    "INSERT INTO queue_log(guild_id, op, entry_id, position) VALUES (?, ?, ?, ?)",
+                    (guild_id, op, entry.id, index)
+                )
+            elif op == "shuffle":
+                # El nuevo orden como lista de IDs: sin volver a guardar las canciones
+                self._write(
+                    "INSERT INTO queue_log(guild_id, op, payload) VALUES (?, ?, ?)",
+                    (guild_id, op, json.dumps([e.id for e in queue.entries()]))
+                )
+            else:
+                self._write("INSERT INTO queue_log(guild_id, op) VALUES (?, ?)", (guild_id, op))
+
+            # Se llama dentro del lock de la cola: la compactación ve exactamente
+            # el estado que resulta de este cambio
+            self._log_rows[guild_id] = self._log_rows.get(guild_id, 0) + 1
+            if self._log_rows[guild_id] > max(self.COMPACT_MIN, self.COMPACT_RATIO * len(queue)):
+                self._rewrite(guild_id, queue.entries())
+
+        # Una cola nueva vuelve a numerar sus entradas desde 1: el log anterior sobra
+        self._rewrite(guild_id, queue.listen(listener))
+
+    def detach(self, guild_id: int, queue: SongQueue[Any]) -> None:
+        queue.listen(None)
+        self._log_rows.pop(guild_id, None)
+        self._states.pop(guild_id, None)
+
+    def checkpoint(
+        self, guild_id: int, kind: str, channel_id: Optional[int], state: str, position: float, current: Optional[Any]
+    ) -> None:
+        """Actualiza el estado del reproductor si ha cambiado. Seguro desde cualquier hilo."""
+        current_json = json.dumps(self.encode(current)) if current is not None else None
+        key = (kind, channel_id, state, current_json, round(position) if state == "playing" else None)
+        if self._states.get(guild_id) == key:
+            return
+        self._states[guild_id] = key
+        self._write(
+            """
+            INSERT INTO player_state(guild_id, kind, channel_id, state, position, current, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET kind = excluded.kind, channel_id = excluded.channel_id,
+                state = excluded.state, position = excluded.position, current = excluded.current,
+                updated_at = excluded.updated_at
+            """,
+            (guild_id, kind, channel_id, state, position, current_json, time.time())
+        )
+
+    def forget(self, guild_id: int) -> None:
+        self._states.pop(guild_id, None)
+        self._log_rows.pop(guild_id, None)
+        self._write("DELETE FROM queue_log WHERE guild_id = ?", (guild_id,))
+        self._write("DELETE FROM player_state WHERE guild_id = ?", (guild_id,))
+
+    async def close(self) -> None:
+        """Deja de aceptar cambios y espera a que los pendientes se escriban."""
+        self._closed = True
+        while self._drain is not None or self._pending:
+            if self._drain is None:
+                self._schedule()
+            assert self._drain is not None
+            await asyncio.shield(self._drain)
+
+    async def load(self) -> List[SavedPlayer]:
+        saved = []
+        for row in await self.db.fetchall("SELECT * FROM player_state"):
+            guild_id = row["guild_id"]
+            log = await self.db.fetchall(
+                "SELECT op, entry_id, position, payload FROM queue_log WHERE guild_id = ? ORDER BY id", (guild_id,)
+            )
+            saved.append(SavedPlayer(
+                guild_id=guild_id, kind=row["kind"], channel_id=row["channel_id"], state=row["state"],
+                position=row["position"], current=json.loads(row["current"]) if row["current"] else None,
+                queue=self._replay(log)
+            ))
+        return saved
+
+    @staticmethod
+    def _replay(log: List[Any]) -> List[Song]:
+        # Se reconstruye sobre otra SongQueue para que cada operación siga
+        # costando O(log n) aunque el log tenga decenas de miles de filas
+        queue: SongQueue[Song] = SongQueue()
+        ids: Dict[int, int] = {}
+        for op, entry_id, position, payload in log:
+            if op == "insert":
+                ids[entry_id] = queue.insert(position, json.loads(payload)).id
+            elif op == "pop" and entry_id in ids:
+                queue.remove(ids.pop(entry_id))
+            elif op == "move" and entry_id in ids:
+                queue.move(queue.index_of(ids[entry_id]), position)
+            elif op == "shuffle":
+                shuffled: SongQueue[Song] = SongQueue()
+                for old in json.loads(payload):
+                    entry = queue.get(ids.get(old, -1))
+                    if entry is not None:
+                        ids[old] = shuffled.append(entry.item).id
+                queue = shuffled
+            elif op == "clear":
+                queue.clear()
+                ids.clear()
+        return list(queue)
+
+    def _rewrite(self, guild_id: int, entries: List[QueueEntry[Any]]) -> None:
+        self._write("DELETE FROM queue_log WHERE guild_id = ?", (guild_id,))
+        for index, entry in enumerate(entries):
+            self._write(
+                "INSERT INTO queue_log(guild_id, op, entry_id, position, payload) VALUES (?, ?, ?, ?, ?)",
+                (guild_id, "insert", entry.id, index, json.dumps(self.encode(entry.item)))
+            )
+        self._log_rows[guild_id] = len(entries)
+
+    def _write(self, sql: str, params: Tuple[Any, ...]) -> None:
+        if self._closed:
+            return
+        if self._loop is None:
+            # La primera escritura siempre llega desde el event loop (attach, forget)
+            self._loop = asyncio.get_running_loop()
+        with self._lock:
+            self._pending.append((sql, params))
+            first = len(self._pending) == 1
+        if first:
+            self._loop.call_soon_threadsafe(self._schedule)
+
+    def _schedule(self) -> None:
+        if self._drain is None:
+            self._drain = asyncio.ensure_future(self._flush())
+
+    async def _flush(self) -> None:
+        try:
+            while True:
+                with self._lock:
+                    batch, self._pending = self._pending, []
+                if not batch:
+                    return
+                # `execute` encola en el orden de llamada y lo confirma en un solo lote
+                results = await asyncio.gather(*(self.db.execute(sql, params) for sql, params in batch), return_exceptions=True)
+                for result in results:
+                    if isinstance(result, Exception):
+                        logger.warning(f"Could not persist queue change: {result}")
+        finally:
+            self._drain = None
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+from urllib.parse import parse_qs, urlparse
+
+V = TypeVar('V')
+
+# Margen antes de la caducidad de una URL de googlevideo para no servirla a punto de expirar
+EXPIRY_MARGIN = 60.0
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.casefold().split())
+
+
+def video_key(url: str) -> str:
+    """Clave estable para una URL de YouTube: el ID del vídeo si se puede extraer."""
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or "").removeprefix("www.").removeprefix("m.").removeprefix("music.")
+    if host == "youtu.be":
+        video_id = parsed.path.lstrip("/").split("/")[0]
+    elif host == "youtube.com":
+        if parsed.path.startswith(("/shorts/", "/live/", "/embed/")):
+            video_id = parsed.path.split("/")[2]
+        else:
+            video_id = parse_qs(parsed.query).get("v", [""])[0]
+    else:
+        video_id = ""
+    return f"youtube:{video_id}" if video_id else url.strip()
+
+
+def stream_expiry(stream_url: str) -> Optional[float]:
+    """Timestamp `expire` incrustado en las URLs firmadas de googlevideo."""
+    parsed = urlparse(stream_url)
+    if not (parsed.hostname or "").endswith("googlevideo.com"):
+        return None
+    expire = parse_qs(parsed.query).get("expire")
+    if not expire:
+        # Algunas URLs llevan los parámetros en el path: /videoplayback/expire/<ts>/...
+        parts = parsed.path.split("/")
+        if "expire" in parts and parts.index("expire") + 1 < len(parts):
+            expire = [parts[parts.index("expire") + 1]]
+    try:
+        return float(expire[0]) if expire else None
+    except ValueError:
+        return None
+
+
+class SongCache(Generic[V]):
+    """Caché LRU con TTL por entrada que agrupa las cargas concurrentes de una misma clave."""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 1800.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: OrderedDict[Hashable, Tuple[float, V]] = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future[Optional[V]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+    def get(self, key: Hashable) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: V, expires_at: Optional[float] = None) -> None:
+        expires = time.time() + self.ttl
+        if expires_at is not None:
+            expires = min(expires, expires_at - EXPIRY_MARGIN)
+        if expires <= time.time():
+            return
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Optional[V]]],
+        expires_at: Callable[[V], Optional[float]] = lambda _: None,
+    ) -> Optional[V]:
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        # La carga corre en su propia tarea y cada llamante espera protegido: si se
+        # cancela uno (el que la empezó incluido), los demás siguen esperándola
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            inflight = asyncio.create_task(self._load(key, loader, expires_at))
+            inflight.add_done_callback(_consume_exception)
+            self._inflight[key] = inflight
+        return await asyncio.shield(inflight)
+
+    async def _load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Optional[V]]],
+        expires_at: Callable[[V], Optional[float]],
+    ) -> Optional[V]:
+        try:
+            value = await loader()
+        finally:
+            del self._inflight[key]
+        if value is not None:
+            self.put(key, value, expires_at(value))
+        return value
+
+
+def _consume_exception(task: "asyncio.Future[Any]") -> None:
+    # Evitar el aviso de "exception was never retrieved" si todos dejaron de esperar
+    if not task.cancelled():
+        task.exception()
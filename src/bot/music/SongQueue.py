@@ -0,0 +1,298 @@
+import itertools
+import random
+import threading
+from typing import Callable, Dict, Generic, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class QueueEntry(Generic[T]):
+    """Una posición de la cola: ID estable, la canción y los enlaces del treap."""
+    __slots__ = ("id", "item", "_left", "_right", "_parent", "_size", "_priority")
+
+    def __init__(self, entry_id: int, item: T) -> None:
+        self.id = entry_id
+        self.item = item
+        self._left: Optional[QueueEntry[T]] = None
+        self._right: Optional[QueueEntry[T]] = None
+        self._parent: Optional[QueueEntry[T]] = None
+        self._size = 1
+        self._priority = random.random()
+
+    def __repr__(self) -> str:
+        return f"QueueEntry(id={self.id}, item={self.item!r})"
+
+
+# (operación, entrada afectada, posición): "insert", "pop", "move", "shuffle" o "clear"
+QueueListener = Callable[[str, Optional[QueueEntry[T]], Optional[int]], None]
+
+
+def _size(node: Optional[QueueEntry[T]]) -> int:
+    return node._size if node else 0
+
+
+def _update(node: QueueEntry[T]) -> None:
+    left, right = node._left, node._right
+    node._size = 1 + (left._size if left else 0) + (right._size if right else 0)
+    if left:
+        left._parent = node
+    if right:
+        right._parent = node
+
+
+def _merge(a: Optional[QueueEntry[T]], b: Optional[QueueEntry[T]]) -> Optional[QueueEntry[T]]:
+    # Todos los nodos de `a` van antes que los de `b`
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a._priority > b._priority:
+        a._right = _merge(a._right, b)
+        _update(a)
+        return a
+    b._left = _merge(a, b._left)
+    _update(b)
+    return b
+
+
+def _split(node: Optional[QueueEntry[T]], count: int) -> Tuple[Optional[QueueEntry[T]], Optional[QueueEntry[T]]]:
+    # Los `count` primeros nodos a la izquierda, el resto a la derecha
+    if node is None:
+        return None, None
+    if _size(node._left) >= count:
+        left, right = _split(node._left, count)
+        node._left = right
+        _update(node)
+        return left, node
+    left, right = _split(node._right, count - _size(node._left) - 1)
+    node._right = left
+    _update(node)
+    return node, right
+
+
+def _detach(*roots: Optional[QueueEntry[T]]) -> None:
+    for root in roots:
+        if root:
+            root._parent = None
+
+
+class SongQueue(Generic[T]):
+    """Cola de reproducción indexada para colas de decenas de miles de canciones.
+
+    Es un treap implícito: cada entrada conoce el tamaño de su subárbol, así que
+    acceder, insertar, quitar o mover por posición cuesta O(log n), y con el
+    puntero al padre se calcula la posición de una entrada por su ID también
+    en O(log n). Cada entrada tiene un ID estable que no cambia al mover o
+    barajar. Barajar reordena los nodos existentes en O(n) sin copiar canciones.
+    Es segura entre hilos: el hilo de audio de discord.py saca canciones
+    mientras el event loop añade o reordena. El listener recibe cada cambio
+    dentro del lock, así que lo ve en el mismo orden en que se aplica.
+    """
+
+    def __init__(self) -> None:
+        self._root: Optional[QueueEntry[T]] = None
+        self._entries: Dict[int, QueueEntry[T]] = {}
+        self._ids = itertools.count(1)
+        self._duration = 0
+        self._lock = threading.RLock()
+        self._listener: Optional[QueueListener[T]] = None
+
+    def __len__(self) -> int:
+        return _size(self._root)
+
+    def __bool__(self) -> bool:
+        return self._root is not None
+
+    def __iter__(self) -> Iterator[T]:
+        return (entry.item for entry in self.entries())
+
+    def __getitem__(self, index: int) -> T:
+        return self.entry_at(index).item
+
+    @property
+    def total_duration(self) -> int:
+        """Suma de las duraciones, mantenida al añadir y quitar."""
+        return self._duration
+
+    def entries(self, start: int = 0, stop: Optional[int] = None) -> List[QueueEntry[T]]:
+        """Entradas de `start` a `stop` (sin incluir) en O(log n + k)."""
+        with self._lock:
+            stop = len(self) if stop is None else min(stop, len(self))
+            if start >= stop:
+                return []
+            result = []
+            node: Optional[QueueEntry[T]] = self._entry_at(start)
+            while node is not None and len(result) < stop - start:
+                result.append(node)
+                node = self._successor(node)
+            return result
+
+    def listen(self, listener: Optional[QueueListener[T]]) -> List[QueueEntry[T]]:
+        """Cambia el listener y devuelve el contenido en ese mismo instante."""
+        with self._lock:
+            self._listener = listener
+            return self.entries()
+
+    def entry_at(self, index: int) -> QueueEntry[T]:
+        with self._lock:
+            return self._entry_at(index)
+
+    def get(self, entry_id: int) -> Optional[QueueEntry[T]]:
+        return self._entries.get(entry_id)
+
+    def index_of(self, entry_id: int) -> int:
+        with self._lock:
+            node = self._entries.get(entry_id)
+            if node is None:
+                raise KeyError(entry_id)
+            index = _size(node._left)
+            while node._parent is not None:
+                parent = node._parent
+                if node is parent._right:
+                    index += _size(parent._left) + 1
+                node = parent
+            return index
+
+    def append(self, item: T) -> QueueEntry[T]:
+        return self.insert(len(self), item)
+
+    def insert(self, index: int, item: T) -> QueueEntry[T]:
+        with self._lock:
+            entry = QueueEntry(next(self._ids), item)
+            index = max(0, min(index, len(self)))
+            self._insert_entry(index, entry)
+            self._entries[entry.id] = entry
+            self._duration += getattr(item, "duration", 0) or 0
+            self._notify("insert", entry, index)
+            return entry
+
+    def pop(self, index: int = 0) -> Optional[T]:
+        """Quita y devuelve la canción en `index`, o None si no existe."""
+        with self._lock:
+            if not 0 <= index < len(self):
+                return None
+            entry = self._pop_entry(index)
+            del self._entries[entry.id]
+            self._duration -= getattr(entry.item, "duration", 0) or 0
+            self._notify("pop", entry, index)
+            return entry.item
+
+    def popleft(self) -> Optional[T]:
+        return self.pop(0)
+
+    def peek(self) -> Optional[T]:
+        with self._lock:
+            return self._entry_at(0).item if self._root else None
+
+    def remove(self, entry_id: int) -> Optional[T]:
+        with self._lock:
+            if entry_id not in self._entries:
+                return None
+            return self.pop(self.index_of(entry_id))
+
+    def move(self, source: int, destination: int) -> Optional[T]:
+        """Mueve la canción de `source` a `destination` conservando su ID."""
+        with self._lock:
+            if not 0 <= source < len(self):
+                return None
+            entry = self._pop_entry(source)
+            destination = max(0, min(destination, len(self)))
+            self._insert_entry(destination, entry)
+            self._notify("move", entry, destination)
+            return entry.item
+
+    def shuffle(self, rng: Optional[random.Random] = None) -> None:
+        with self._lock:
+            nodes = self.entries()
+            (rng or random).shuffle(nodes)
+            self._root = self._build(nodes)
+            self._notify("shuffle", None, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._root = None
+            self._entries.clear()
+            self._duration = 0
+            self._notify("clear", None, None)
+
+    def _notify(self, op: str, entry: Optional[QueueEntry[T]], index: Optional[int]) -> None:
+        if self._listener is not None:
+            self._listener(op, entry, index)
+
+    def _entry_at(self, index: int) -> QueueEntry[T]:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("queue index out of range")
+        node = self._root
+        while node is not None:
+            left = _size(node._left)
+            if index < left:
+                node = node._left
+            elif index == left:
+                return node
+            else:
+                index -= left + 1
+                node = node._right
+        raise IndexError("queue index out of range")
+
+    @staticmethod
+    def _successor(node: QueueEntry[T]) -> Optional[QueueEntry[T]]:
+        if node._right is not None:
+            node = node._right
+            while node._left is not None:
+                node = node._left
+            return node
+        while node._parent is not None and node is node._parent._right:
+            node = node._parent
+        return node._parent
+
+    def _insert_entry(self, index: int, entry: QueueEntry[T]) -> None:
+        entry._left = entry._right = entry._parent = None
+        entry._size = 1
+        left, right = _split(self._root, index)
+        _detach(left, right)
+        self._root = _merge(_merge(left, entry), right)
+        _detach(self._root)
+
+    def _pop_entry(self, index: int) -> QueueEntry[T]:
+        left, rest = _split(self._root, index)
+        entry, right = _split(rest, 1)
+        _detach(left, right)
+        self._root = _merge(left, right)
+        _detach(self._root)
+        assert entry is not None
+        entry._left = entry._right = entry._parent = None
+        entry._size = 1
+        return entry
+
+    @staticmethod
+    def _build(nodes: List[QueueEntry[T]]) -> Optional[QueueEntry[T]]:
+        # Árbol cartesiano en O(n) con una pila: el orden en memoria es el de
+        # `nodes` y las prioridades (aleatorias) siguen cumpliendo el heap
+        stack: List[QueueEntry[T]] = []
+        for node in nodes:
+            node._left = node._right = node._parent = None
+            last = None
+            while stack and stack[-1]._priority < node._priority:
+                last = stack.pop()
+            node._left = last
+            if stack:
+                stack[-1]._right = node
+            stack.append(node)
+        root = stack[0] if stack else None
+
+        # Tamaños y padres de abajo arriba (postorden iterativo)
+        order: List[QueueEntry[T]] = []
+        pending = [root] if root else []
+        while pending:
+            node = pending.pop()
+            order.append(node)
+            if node._left:
+                pending.append(node._left)
+            if node._right:
+                pending.append(node._right)
+        for node in reversed(order):
+            _update(node)
+        _detach(root)
+        return root
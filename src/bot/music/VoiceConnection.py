@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+import discord
+
+logger = logging.getLogger('music')
+
+
+class VoiceConnectionError(Exception):
+    pass
+
+
+class VoiceConnection:
+    """Conexión de voz de un reproductor.
+
+    Si ya hay una conexión viva en el servidor se reutiliza (con `move_to` si
+    el canal es otro) en vez de desconectar y repetir el handshake de voz, que
+    cuesta en torno a un segundo y corta la canción en curso. Una sesión caída
+    se cierra y se vuelve a abrir; si conectar falla, los reintentos esperan
+    con backoff exponencial, también entre llamadas seguidas.
+    """
+    CONNECT_TIMEOUT = 10.0
+    ATTEMPTS = 3
+    BACKOFF_MIN = 1.0
+    BACKOFF_MAX = 30.0
+    # Desconexiones en curso por guild: `connect` las espera antes de reutilizar
+    # guild.voice_client, que sigue vivo hasta que terminan
+    _closing: Dict[int, "asyncio.Task[None]"] = {}
+
+    def __init__(self) -> None:
+        self.client: Optional[discord.VoiceClient] = None
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def connect(self, channel: discord.VoiceChannel) -> discord.VoiceClient:
+        # Dos comandos a la vez no deben abrir dos conexiones
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            closing = self._closing.get(channel.guild.id)
+            if closing is not None:
+                await asyncio.wait([closing])
+            client = self.client or channel.guild.voice_client
+            if client is not None and client.is_connected():
+                if client.channel is None or client.channel.id != channel.id:
+                    logger.debug(f"Moving voice connection to {channel}")
+                    await client.move_to(channel)
+                self.client = client  # type: ignore[assignment]
+                return self.client  # type: ignore[return-value]
+
+            if client is not None:
+                logger.info(f"Voice session in {channel.guild} dropped, reconnecting")
+                await client.disconnect(force=True)
+            self.client = None
+            return await self._connect(channel)
+
+    async def _connect(self, channel: discord.VoiceChannel) -> discord.VoiceClient:
+        for attempt in range(1, self.ATTEMPTS + 1):
+            delay = self._retry_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                self.client = await channel.connect(timeout=self.CONNECT_TIMEOUT, reconnect=True)
+            except (asyncio.TimeoutError, discord.ClientException, discord.HTTPException, discord.ConnectionClosed) as e:
+                self._backoff = min(self.BACKOFF_MAX, max(self.BACKOFF_MIN, self._backoff * 2))
+                self._retry_at = time.monotonic() + self._backoff
+                logger.warning(f"Voice connect to {channel} failed (attempt {attempt}/{self.ATTEMPTS}): {e!r}; retrying in {self._backoff:.1f}s")
+                # Una conexión a medias se queda en guild.voice_client y bloquea la siguiente
+                if channel.guild.voice_client is not None:
+                    await channel.guild.voice_client.disconnect(force=True)
+                continue
+            self._backoff = 0.0
+            self._retry_at = 0.0
+            logger.info(f"Connected to voice channel {channel}")
+            return self.client
+        raise VoiceConnectionError("No se pudo conectar al canal de voz")
+
+    def detach(self) -> None:
+        """Suelta la conexión sin cerrarla para que la reutilice otro reproductor del guild."""
+        client, self.client = self.client, None
+        if client is not None:
+            client.stop()
+
+    def close(self) -> None:
+        """Cierra la conexión. Sin event loop (p. ej. desde `__del__`) solo se limpia."""
+        client, self.client = self.client, None
+        if client is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            client.cleanup()
+            return
+        guild_id = client.guild.id
+        task = loop.create_task(client.disconnect(force=True))
+        self._closing[guild_id] = task
+
+        def done(task: "asyncio.Task[None]") -> None:
+            if self._closing.get(guild_id) is task:
+                del self._closing[guild_id]
+        task.add_done_callback(done)
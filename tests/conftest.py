@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos del bot se importan como en producción, desde src/bot
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "bot"))
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, List, Tuple, TypeVar
+
+import pytest
+
+from music.Database import Database
+from music.DownloadManager import DownloadJob, DownloadManager
+from music.Library import Library, LibraryEntry
+
+T = TypeVar('T')
+
+
+def run(coro: Callable[[], Awaitable[T]]) -> T:
+    return asyncio.run(coro())
+
+
+class Message:
+    def __init__(self) -> None:
+        self.contents: List[str] = []
+
+    async def edit(self, content: str) -> None:
+        self.contents.append(content)
+
+
+@pytest.fixture
+def paths(tmp_path: Any) -> Tuple[str, str]:
+    return str(tmp_path / "music.db"), str(tmp_path / "music")
+
+
+async def claim_download(db: Database, library: Library, video_id: str) -> None:
+    """Lo que hace otro worker al empezar a descargar: registrar la fila."""
+    await db.execute(
+        "INSERT INTO downloads (extractor, video_id, url, path, created_at) VALUES (?, ?, ?, ?, ?)",
+        ("youtube", video_id, "u", library.path_for("youtube", video_id), time.time())
+    )
+
+
+async def finish_download(db: Database, library: Library, video_id: str) -> LibraryEntry:
+    """Lo que hace otro worker al terminar: fichero en la biblioteca y fila borrada."""
+    path = library.path_for("youtube", video_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"mp3")
+    entry = await library.add("youtube", video_id, path, 180)
+    await db.execute("DELETE FROM downloads WHERE extractor = ? AND video_id = ?", ("youtube", video_id))
+    return entry
+
+
+def test_download_in_another_worker_completes_from_its_library_entry(paths: Tuple[str, str]) -> None:
+    db_path, root = paths
+
+    async def scenario() -> None:
+        worker, other = Database(db_path), Database(db_path)
+        await worker.open()
+        await other.open()
+        completed: List[Tuple[DownloadJob, LibraryEntry]] = []
+
+        async def on_complete(job: DownloadJob, entry: LibraryEntry) -> None:
+            completed.append((job, entry))
+
+        try:
+            other_library = Library(other, root)
+            await claim_download(other, other_library, "abc")
+
+            # Este worker no llega a usar yt-dlp: la descarga es del otro
+            manager = DownloadManager(worker, None, Library(worker, root), on_complete)  # type: ignore[arg-type]
+            manager.PROGRESS_INTERVAL = 0.01
+            message = Message()
+            job = await manager.submit("YouTube", "abc", "u", "Canción", message)  # type: ignore[arg-type]
+            assert job.remote
+            assert manager.get("youtube", "abc") is job
+            await asyncio.sleep(0.05)
+            assert not completed
+
+            entry = await finish_download(other, other_library, "abc")
+            assert job.task is not None
+            await asyncio.wait_for(job.task, 1.0)
+
+            assert [(j.requests, e.id) for j, e in completed] == [([("Canción", "u")], entry.id)]
+            assert len(manager) == 0
+            assert message.contents == ["⬇️ Descargando en otro proceso..."]
+            # La fila del otro worker no se toca ni se le cuelgan peticiones
+            assert await worker.fetchall("SELECT * FROM download_favs") == []
+        finally:
+            await worker.close()
+            await other.close()
+
+    run(scenario)
+
+
+def test_failed_download_in_another_worker_is_reported(paths: Tuple[str, str]) -> None:
+    db_path, root = paths
+
+    async def scenario() -> None:
+        worker, other = Database(db_path), Database(db_path)
+        await worker.open()
+        await other.open()
+
+        async def on_complete(job: DownloadJob, entry: LibraryEntry) -> None:
+            raise AssertionError("no debería completarse")
+
+        try:
+            await claim_download(other, Library(other, root), "abc")
+            manager = DownloadManager(worker, None, Library(worker, root), on_complete)  # type: ignore[arg-type]
+            manager.PROGRESS_INTERVAL = 0.01
+            message = Message()
+            job = await manager.submit("youtube", "abc", "u", "Canción", message)  # type: ignore[arg-type]
+
+            await other.execute("DELETE FROM downloads WHERE video_id = ?", ("abc",))
+            assert job.task is not None
+            await asyncio.wait_for(job.task, 1.0)
+
+            assert message.contents[-1].startswith("❌")
+            assert len(manager) == 0
+        finally:
+            await worker.close()
+            await other.close()
+
+    run(scenario)
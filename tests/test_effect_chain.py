@@ -0,0 +1,63 @@
+from typing import List
+
+import discord
+import numpy as np
+from discord.opus import Encoder
+
+from music.EffectChain import INT16_MAX, SAMPLES, EffectChain
+
+
+class Tone(discord.AudioSource):
+    """Onda cuadrada a fondo de escala: cada instante tiene el mismo valor absoluto."""
+
+    def __init__(self, amplitude: int = INT16_MAX) -> None:
+        pattern = np.array([amplitude, amplitude, -amplitude, -amplitude], dtype=np.int16)
+        self.data = np.tile(pattern, SAMPLES // len(pattern)).tobytes()
+
+    def read(self) -> bytes:
+        return self.data
+
+
+def play(chain: EffectChain, frames: int) -> np.ndarray:
+    out: List[np.ndarray] = []
+    for _ in range(frames):
+        out.append(np.frombuffer(bytes(chain.read()), dtype=np.int16).astype(np.int32))
+    return np.concatenate(out)
+
+
+def test_unity_gain_passes_audio_through() -> None:
+    source = Tone()
+    chain = EffectChain(source, volume=1.0)
+    assert chain.read() is source.data
+
+
+def test_fade_above_unity_is_limited_without_frame_sawtooth() -> None:
+    chain = EffectChain(Tone(), volume=1.0)
+    chain.fade_to(2.0, 200)
+    out = np.abs(play(chain, 20))
+
+    threshold = EffectChain.LIMITER_THRESHOLD
+    assert out.max() <= threshold + 1
+    # La entrada ya supera el umbral: durante todo el fundido la salida se queda
+    # pegada a él, sin caídas al empezar cada frame
+    assert out.min() >= threshold - 1
+
+
+def test_limiter_releases_smoothly_after_lowering_volume() -> None:
+    chain = EffectChain(Tone(), volume=2.0)
+    play(chain, 5)
+    chain.volume = 1.0
+    out = np.abs(play(chain, 15))
+
+    per_instant = out[::Encoder.CHANNELS]
+    steps = np.diff(per_instant)
+    assert steps.min() >= 0
+    # Recuperación repartida por muestra: ningún salto brusco entre frames
+    assert steps.max() <= INT16_MAX * EffectChain.LIMITER_RELEASE / Encoder.SAMPLES_PER_FRAME + 1
+    assert per_instant[-1] == INT16_MAX
+
+
+def test_quiet_audio_is_amplified_untouched_by_the_limiter() -> None:
+    chain = EffectChain(Tone(amplitude=1000), volume=2.0)
+    out = np.abs(play(chain, 3))
+    assert (out == 2000).all()
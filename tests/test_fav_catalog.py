@@ -0,0 +1,90 @@
+import asyncio
+from typing import Any, Awaitable, Callable, TypeVar
+
+import pytest
+
+from music.Database import Database
+from music.FavCatalog import FavCatalog
+
+T = TypeVar('T')
+
+
+def run(coro: Callable[[], Awaitable[T]]) -> T:
+    return asyncio.run(coro())
+
+
+async def add_fav(db: Database, title: str) -> None:
+    await db.execute("INSERT INTO fav (title, url, path, duration) VALUES (?, ?, ?, ?)", (title, "u", "/p", 0))
+
+
+@pytest.fixture
+def db_path(tmp_path: Any) -> str:
+    return str(tmp_path / "music.db")
+
+
+def test_local_writes_are_seen_after_invalidate(db_path: str) -> None:
+    async def scenario() -> None:
+        db = Database(db_path)
+        await db.open()
+        try:
+            catalog = FavCatalog(db)
+            await add_fav(db, "Daft Punk - One More Time")
+            assert await catalog.search("daft") == ["Daft Punk - One More Time"]
+            await add_fav(db, "Daft Punk - Around the World")
+            catalog.invalidate()
+            assert len(await catalog.search("daft")) == 2
+        finally:
+            await db.close()
+
+    run(scenario)
+
+
+def test_changes_from_another_worker_reach_the_catalog(db_path: str) -> None:
+    async def scenario() -> None:
+        # Dos workers del cluster: cada uno con su conexión y su catálogo
+        worker, other = Database(db_path), Database(db_path)
+        await worker.open()
+        await other.open()
+        try:
+            catalog = FavCatalog(worker)
+            await add_fav(worker, "Rosalía - Malamente")
+            assert await catalog.titles() == ["Rosalía - Malamente"]
+            assert await catalog.search("ro") == ["Rosalía - Malamente"]
+
+            await add_fav(other, "Rosalía - Despechá")
+            assert await catalog.titles() == ["Rosalía - Despechá", "Rosalía - Malamente"]
+            assert len(await catalog.search("ro")) == 2
+            assert await catalog.search("despe") == ["Rosalía - Despechá"]
+
+            await other.execute("DELETE FROM fav WHERE title = ?", ("Rosalía - Malamente",))
+            assert await catalog.titles() == ["Rosalía - Despechá"]
+            assert await catalog.search("mala") == []
+        finally:
+            await worker.close()
+            await other.close()
+
+    run(scenario)
+
+
+def test_unrelated_writes_from_another_worker_keep_the_cache(db_path: str) -> None:
+    async def scenario() -> None:
+        worker, other = Database(db_path), Database(db_path)
+        await worker.open()
+        await other.open()
+        try:
+            catalog = FavCatalog(worker)
+            await add_fav(worker, "Synthwave Mix")
+            await catalog.search("synth")
+            cached = catalog._results.copy()
+
+            await other.execute(
+                "INSERT INTO play_stats (extractor, video_id, plays, last_played) VALUES (?, ?, ?, ?)",
+                ("youtube", "abc", 1, 0.0)
+            )
+            await catalog.search("synth")
+            assert catalog._results == cached
+        finally:
+            await worker.close()
+            await other.close()
+
+    run(scenario)
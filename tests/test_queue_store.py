@@ -0,0 +1,140 @@
+import asyncio
+import random
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, List, TypeVar
+
+import pytest
+
+from music.Database import Database
+from music.QueueStore import QueueStore
+from music.SongQueue import SongQueue
+
+T = TypeVar('T')
+
+
+@dataclass
+class Track:
+    title: str
+    url: str
+    duration: int = 0
+
+
+def run(coro: Callable[[], Awaitable[T]]) -> T:
+    return asyncio.run(coro())
+
+
+async def reopen(path: str) -> List[Any]:
+    db = Database(path)
+    await db.open()
+    try:
+        return await QueueStore(db, asdict).load()
+    finally:
+        await db.close()
+
+
+@pytest.fixture
+def db_path(tmp_path: Any) -> str:
+    return str(tmp_path / "music.db")
+
+
+def test_round_trip_restores_queue_and_current_song(db_path: str) -> None:
+    async def write() -> List[Track]:
+        db = Database(db_path)
+        await db.open()
+        store = QueueStore(db, asdict)
+        queue: SongQueue[Track] = SongQueue()
+        store.attach(1, queue)
+
+        tracks = [Track(f"t{i}", f"https://youtu.be/{i}", 60 + i) for i in range(12)]
+        for track in tracks:
+            queue.append(track)
+        current = queue.popleft()
+        queue.insert(2, Track("next", "https://youtu.be/next"))
+        queue.move(5, 0)
+        queue.remove(queue.entry_at(3).id)
+        queue.shuffle(random.Random(7))
+        store.checkpoint(1, "stream", 42, "playing", 31.5, current)
+
+        await store.close()
+        await db.close()
+        return list(queue)
+
+    expected = run(write)
+    saved = run(lambda: reopen(db_path))
+
+    assert len(saved) == 1
+    player = saved[0]
+    assert (player.guild_id, player.kind, player.channel_id, player.state) == (1, "stream", 42, "playing")
+    assert player.position == pytest.approx(31.5)
+    assert player.current == asdict(Track("t0", "https://youtu.be/0", 60))
+    assert player.queue == [asdict(track) for track in expected]
+
+
+def test_compaction_keeps_the_log_short_and_replayable(db_path: str) -> None:
+    async def write() -> List[Track]:
+        db = Database(db_path)
+        await db.open()
+        store = QueueStore(db, asdict)
+        store.COMPACT_MIN = 16
+        queue: SongQueue[Track] = SongQueue()
+        store.attach(1, queue)
+
+        rng = random.Random(3)
+        for i in range(400):
+            if len(queue) < 5 or rng.random() < 0.5:
+                queue.append(Track(f"t{i}", f"https://youtu.be/{i}"))
+            elif rng.random() < 0.5:
+                queue.popleft()
+            else:
+                queue.move(rng.randrange(len(queue)), rng.randrange(len(queue)))
+        store.checkpoint(1, "download", None, "stopped", 0.0, None)
+
+        await store.close()
+        rows = await db.fetchone("SELECT COUNT(*) AS n FROM queue_log WHERE guild_id = 1")
+        assert rows is not None and rows["n"] <= max(store.COMPACT_MIN, store.COMPACT_RATIO * len(queue)) + 1
+        await db.close()
+        return list(queue)
+
+    expected = run(write)
+    saved = run(lambda: reopen(db_path))
+
+    assert saved[0].current is None
+    assert saved[0].queue == [asdict(track) for track in expected]
+
+
+def test_checkpoint_skips_unchanged_state(db_path: str) -> None:
+    async def write() -> int:
+        db = Database(db_path)
+        await db.open()
+        store = QueueStore(db, asdict)
+        store.attach(1, SongQueue())
+        current = Track("a", "https://youtu.be/a")
+        before = len(store._pending)
+        # La posición se redondea al segundo: 10.2 y 10.4 son el mismo estado
+        store.checkpoint(1, "stream", 42, "playing", 10.2, current)
+        store.checkpoint(1, "stream", 42, "playing", 10.4, current)
+        store.checkpoint(1, "stream", 42, "paused", 10.4, current)
+        writes = len(store._pending) - before
+        await store.close()
+        await db.close()
+        return writes
+
+    assert run(write) == 2
+
+
+def test_forget_drops_the_guild(db_path: str) -> None:
+    async def write() -> None:
+        db = Database(db_path)
+        await db.open()
+        store = QueueStore(db, asdict)
+        queue: SongQueue[Track] = SongQueue()
+        store.attach(1, queue)
+        queue.append(Track("a", "https://youtu.be/a"))
+        store.checkpoint(1, "stream", 42, "playing", 0.0, None)
+        store.detach(1, queue)
+        store.forget(1)
+        await store.close()
+        await db.close()
+
+    run(write)
+    assert run(lambda: reopen(db_path)) == []
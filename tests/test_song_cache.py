@@ -0,0 +1,119 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, TypeVar
+
+import pytest
+
+from music.SongCache import SongCache
+
+T = TypeVar('T')
+
+
+def run(coro: Callable[[], Awaitable[T]]) -> T:
+    return asyncio.run(coro())
+
+
+class Loader:
+    """Carga que no termina hasta que el test la libera."""
+
+    def __init__(self, value: Optional[str] = "stream") -> None:
+        self.value = value
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> Optional[str]:
+        self.calls += 1
+        await self.release.wait()
+        return self.value
+
+
+def test_concurrent_callers_share_one_load() -> None:
+    async def scenario() -> List[Optional[str]]:
+        cache: SongCache[str] = SongCache()
+        loader = Loader()
+        tasks = [asyncio.create_task(cache.get_or_load("a", loader)) for _ in range(3)]
+        await asyncio.sleep(0)
+        loader.release.set()
+        results = await asyncio.gather(*tasks)
+        assert loader.calls == 1
+        assert (cache.misses, cache.coalesced) == (1, 2)
+        return results
+
+    assert run(scenario) == ["stream"] * 3
+
+
+def test_cancelling_the_leader_does_not_cancel_followers() -> None:
+    async def scenario() -> None:
+        cache: SongCache[str] = SongCache()
+        loader = Loader()
+        leader = asyncio.create_task(cache.get_or_load("a", loader))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_load("a", loader))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        loader.release.set()
+
+        assert await follower == "stream"
+        assert loader.calls == 1
+        # La carga terminó aunque quien la empezó ya no esperase: queda en caché
+        assert cache.get("a") == "stream"
+
+    run(scenario)
+
+
+def test_cancelling_a_follower_does_not_cancel_the_leader() -> None:
+    async def scenario() -> None:
+        cache: SongCache[str] = SongCache()
+        loader = Loader()
+        leader = asyncio.create_task(cache.get_or_load("a", loader))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_load("a", loader))
+        await asyncio.sleep(0)
+
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        loader.release.set()
+
+        assert await leader == "stream"
+
+    run(scenario)
+
+
+def test_errors_reach_every_caller_and_are_not_cached() -> None:
+    async def scenario() -> None:
+        cache: SongCache[str] = SongCache()
+        calls = 0
+
+        async def failing() -> Optional[str]:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0)
+            raise RuntimeError("yt-dlp")
+
+        results = await asyncio.gather(
+            cache.get_or_load("a", failing), cache.get_or_load("a", failing), return_exceptions=True
+        )
+        assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+        assert calls == 1
+
+        loader = Loader()
+        loader.release.set()
+        assert await cache.get_or_load("a", loader) == "stream"
+        assert loader.calls == 1
+
+    run(scenario)
+
+
+def test_none_results_are_not_cached() -> None:
+    async def scenario() -> None:
+        cache: SongCache[str] = SongCache()
+        loader = Loader(value=None)
+        loader.release.set()
+        assert await cache.get_or_load("a", loader) is None
+        assert await cache.get_or_load("a", loader) is None
+        assert loader.calls == 2
+
+    run(scenario)
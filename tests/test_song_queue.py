@@ -0,0 +1,182 @@
+import random
+from dataclasses import dataclass
+from typing import List
+
+import pytest
+
+from music.SongQueue import SongQueue
+
+
+@dataclass
+class Item:
+    name: str
+    duration: int = 0
+
+
+def contents(queue: SongQueue[Item]) -> List[Item]:
+    return list(queue)
+
+
+def test_append_and_index() -> None:
+    queue: SongQueue[Item] = SongQueue()
+    items = [Item(f"s{i}", i) for i in range(10)]
+    for item in items:
+        queue.append(item)
+
+    assert len(queue) == 10
+    assert contents(queue) == items
+    assert [queue[i] for i in range(10)] == items
+    assert queue[-1] == items[-1]
+    assert queue.total_duration == sum(range(10))
+    with pytest.raises(IndexError):
+        queue[10]
+
+
+def test_peek_and_popleft() -> None:
+    queue: SongQueue[Item] = SongQueue()
+    assert queue.peek() is None
+    assert queue.popleft() is None
+
+    a, b = Item("a", 3), Item("b", 4)
+    queue.append(a)
+    queue.append(b)
+    assert queue.peek() is a
+    assert queue.popleft() is a
+    assert queue.peek() is b
+    assert queue.total_duration == 4
+
+
+def test_insert_clamps_position() -> None:
+    queue: SongQueue[Item] = SongQueue()
+    a, b, c = Item("a"), Item("b"), Item("c")
+    queue.insert(5, a)
+    queue.insert(-3, b)
+    queue.insert(1, c)
+    assert contents(queue) == [b, c, a]
+
+
+def test_ids_are_stable_across_moves_and_shuffles() -> None:
+    queue: SongQueue[Item] = SongQueue()
+    entries = [queue.append(Item(f"s{i}")) for i in range(50)]
+
+    queue.move(0, 49)
+    queue.shuffle(random.Random(3))
+    for entry in entries:
+        assert queue.get(entry.id) is entry
+        assert queue[queue.index_of(entry.id)] is entry.item
+
+
+def test_remove_by_id() -> None:
+    queue: SongQueue[Item] = SongQueue()
+    entries = [queue.append(Item(f"s{i}", 1)) for i in range(5)]
+
+    assert queue.remove(entries[2].id) is entries[2].item
+    assert queue.remove(entries[2].id) is None
+    assert [item.name for item in queue] == ["s0", "s1", "s3", "s4"]
+    assert queue.total_duration == 4
+    with pytest.raises(KeyError):
+        queue.index_of(entries[2].id)
+
+
+def test_move_out_of_range_is_ignored() -> None:
+    queue: SongQueue[Item] = SongQueue()
+    items = [Item(f"s{i}") for i in range(3)]
+    for item in items:
+        queue.append(item)
+
+    assert queue.move(3, 0) is None
+    assert queue.move(-1, 0) is None
+    assert queue.move(0, 99) is items[0]
+    assert contents(queue) == [items[1], items[2], items[0]]
+
+
+def test_shuffle_keeps_every_item() -> None:
+    queue: SongQueue[Item] = SongQueue()
+    items = [Item(f"s{i}") for i in range(200)]
+    for item in items:
+        queue.append(item)
+
+    queue.shuffle(random.Random(1))
+    shuffled = contents(queue)
+    assert shuffled != items
+    assert sorted(shuffled, key=lambda item: item.name) == sorted(items, key=lambda item: item.name)
+
+    expected = list(items)
+    random.Random(1).shuffle(expected)
+    assert shuffled == expected
+
+
+def test_entries_slice() -> None:
+    queue: SongQueue[Item] = SongQueue()
+    items = [Item(f"s{i}") for i in range(25)]
+    for item in items:
+        queue.append(item)
+
+    assert [entry.item for entry in queue.entries(10, 20)] == items[10:20]
+    assert [entry.item for entry in queue.entries(20, 40)] == items[20:]
+    assert queue.entries(30, 40) == []
+
+
+def test_listener_sees_each_change() -> None:
+    queue: SongQueue[Item] = SongQueue()
+    events = []
+    queue.append(Item("before"))
+    snapshot = queue.listen(lambda op, entry, index: events.append((op, entry.item.name if entry else None, index)))
+    assert [entry.item.name for entry in snapshot] == ["before"]
+
+    queue.append(Item("a"))
+    queue.move(1, 0)
+    queue.popleft()
+    queue.shuffle()
+    queue.clear()
+    assert events == [("insert", "a", 1), ("move", "a", 0), ("pop", "a", 0), ("shuffle", None, None), ("clear", None, None)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_operations_match_list(seed: int) -> None:
+    rng = random.Random(seed)
+    queue: SongQueue[Item] = SongQueue()
+    model: List[Item] = []
+    counter = 0
+
+    for _ in range(2000):
+        op = rng.choice(["append", "insert", "pop", "popleft", "move", "remove", "shuffle", "peek"])
+        if op in ("append", "insert"):
+            counter += 1
+            item = Item(f"s{counter}", rng.randint(1, 600))
+            if op == "append":
+                queue.append(item)
+                model.append(item)
+            else:
+                index = rng.randint(0, len(model))
+                queue.insert(index, item)
+                model.insert(index, item)
+        elif op == "pop":
+            index = rng.randint(0, len(model))
+            expected = model.pop(index) if index < len(model) else None
+            assert queue.pop(index) is expected
+        elif op == "popleft":
+            expected = model.pop(0) if model else None
+            assert queue.popleft() is expected
+        elif op == "move" and model:
+            source, destination = rng.randrange(len(model)), rng.randrange(len(model))
+            item = model.pop(source)
+            model.insert(destination, item)
+            assert queue.move(source, destination) is item
+        elif op == "remove" and model:
+            index = rng.randrange(len(model))
+            entry = queue.entry_at(index)
+            assert queue.remove(entry.id) is model.pop(index)
+        elif op == "shuffle" and rng.random() < 0.05:
+            shuffle_seed = rng.random()
+            queue.shuffle(random.Random(shuffle_seed))
+            random.Random(shuffle_seed).shuffle(model)
+        elif op == "peek":
+            assert queue.peek() is (model[0] if model else None)
+
+        assert len(queue) == len(model)
+        assert queue.total_duration == sum(item.duration for item in model)
+
+    assert contents(queue) == model
+    for index, entry in enumerate(queue.entries()):
+        assert queue.index_of(entry.id) == index